@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any
+
+from .browser_governor import has_memory_for_browser, is_process_running, read_start_time
+from .log import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from datetime import datetime
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+# Routine browser use is postponed when a check-in's header refresh is due within this many
+# seconds, as logging into an account can keep the browser busy for minutes
+CHECK_IN_GUARD_SECS = 10 * 60
+
+# The number of upcoming check-ins that can be registered at once is sized from the number of
+# monitors, as an account or reservation can have several flights to check in for. Check-ins that
+# don't fit still get priority once they are waiting for the browser
+MIN_REGISTERED_CHECK_INS = 256
+REGISTERED_CHECK_INS_PER_MONITOR = 16
+
+# The maximum number of processes (or threads) that can wait for a browser with a priority at
+# once. Waiters that don't fit still wait, but routine use doesn't yield to them
+MAX_WAITERS = 256
+
+# How often waiters check whether they can use the browser. Waiters poll instead of waiting on a
+# shared condition, as a process killed while waiting on a condition leaves it broken for every
+# other process
+ACQUIRE_POLL_INTERVAL_SECS = 1
+
+# How often jobs deferred by a quiet window check whether the window ended early (e.g. its
+# check-in was stopped)
+WAIT_POLL_INTERVAL_SECS = 30
+
+logger = get_logger(__name__)
+
+
+class BrowserPriority(IntEnum):
+    CHECK_IN = 0
+    ROUTINE = 1
+
+
+class BrowserArbiter:
+    """
+    Decides who can use a browser next. There are a fixed number of browser slots, each of which
+    runs one isolated browser instance at a time, so the arbiter acts like a counting semaphore.
+
+    Header refreshes for an upcoming check-in always go first. Routine browser use by monitors
+    waits while a check-in is waiting for a browser or while a registered check-in's header
+    refresh is due soon.
+
+    The arbiter also knows when every scheduled check-in happens. Within the quiet window around a
+    check-in, routine browser use waits and monitors defer their other routine work (e.g.
+    retrieving reservations and checking fares) until the window is over.
+
+    Using the arbiter as a context manager acquires a browser slot without any priority, just like
+    a regular lock.
+
+    The process holding each slot and every process waiting with a priority are recorded, so
+    slots and waits left behind by a process that was killed or crashed can be cleaned up (see
+    release_orphaned_slots). The arbiter's lock is only held briefly and never while waiting, so
+    a process killed at any point can't block the others.
+    """
+
+    def __init__(self, num_slots: int = 1, quiet_window: int = 0, num_monitors: int = 0) -> None:
+        self.lock = multiprocessing.Lock()
+        self.quiet_window = quiet_window
+        max_check_ins = max(
+            MIN_REGISTERED_CHECK_INS, num_monitors * REGISTERED_CHECK_INS_PER_MONITOR
+        )
+
+        # Every value below is only accessed while holding the lock
+        self.slots_in_use = multiprocessing.Array("b", num_slots, lock=False)
+        # The process ID and start time of each slot's owner. A start time of 0 is unknown
+        self.slot_owner_pids = multiprocessing.Array("i", num_slots, lock=False)
+        self.slot_owner_start_times = multiprocessing.Array("q", num_slots, lock=False)
+
+        # The process ID, start time, and priority of every waiter. A process ID of 0 is an empty
+        # slot
+        self.waiter_pids = multiprocessing.Array("i", MAX_WAITERS, lock=False)
+        self.waiter_start_times = multiprocessing.Array("q", MAX_WAITERS, lock=False)
+        self.waiter_priorities = multiprocessing.Array("b", MAX_WAITERS, lock=False)
+
+        # Timestamps of when each registered check-in refreshes its headers. 0 is an empty slot
+        self.check_in_refresh_times = multiprocessing.Array("d", max_check_ins, lock=False)
+
+        # Timestamps of every registered check-in, for the quiet window. 0 is an empty slot
+        self.check_in_times = multiprocessing.Array("d", max_check_ins, lock=False)
+
+        # Wait statistics for each priority
+        self.num_acquired = multiprocessing.Array("i", len(BrowserPriority), lock=False)
+        self.total_wait_time = multiprocessing.Array("d", len(BrowserPriority), lock=False)
+        self.num_deferred = multiprocessing.Value("i", 0, lock=False)
+
+        # Slots acquired by using the arbiter as a context manager, keyed by thread. This is local
+        # to each process
+        self.held_slots = {}
+
+    def __enter__(self) -> None:
+        self.held_slots[threading.get_ident()] = self.acquire()
+
+    def __exit__(self, *args: object) -> None:
+        self.release(self.held_slots.pop(threading.get_ident()))
+
+    @contextmanager
+    def use(self, priority: BrowserPriority) -> Iterator[int]:
+        """Use a browser slot. The slot is yielded so its browser instance can be isolated."""
+        slot = self.acquire(priority)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def acquire(self, priority: BrowserPriority | None = None) -> int:
+        """Wait until a browser slot can be used and return the slot"""
+        logger.debug("Waiting to use a browser (priority: %s)", self._get_priority_name(priority))
+        start_time = time.time()
+        owner_pid = os.getpid()
+        owner_start_time = read_start_time(owner_pid) or 0
+
+        waiter = None
+        with self.lock:
+            if priority is not None:
+                waiter = self._add_waiter(priority, owner_pid, owner_start_time)
+
+            if priority == BrowserPriority.ROUTINE and self._get_quiet_window_end() is not None:
+                self._record_deferral("browser use")
+
+        try:
+            slot = self._try_acquire(priority, owner_pid, owner_start_time)
+            while slot is None:
+                time.sleep(ACQUIRE_POLL_INTERVAL_SECS)
+                slot = self._try_acquire(priority, owner_pid, owner_start_time)
+        finally:
+            if waiter is not None:
+                with self.lock:
+                    self._remove_waiter(waiter)
+
+        wait_time = time.time() - start_time
+        with self.lock:
+            if priority is not None:
+                self.num_acquired[priority] += 1
+                self.total_wait_time[priority] += wait_time
+
+        logger.debug("Acquired browser slot %d after waiting %.1f seconds", slot, wait_time)
+        logger.debug("Browser wait stats: %s", self.get_stats())
+        return slot
+
+    def release(self, slot: int = 0) -> None:
+        with self.lock:
+            self._free_slot(slot)
+
+        logger.debug("Released browser slot %d", slot)
+
+    def release_orphaned_slots(self) -> int:
+        """
+        Release every slot and remove every waiter whose process no longer exists (e.g. it was
+        stopped with SIGTERM or crashed while using or waiting for the browser). Processes can
+        only be found through /proc, so this must only be used on systems with it. Returns the
+        number of slots released.
+        """
+        num_released = 0
+        num_removed = 0
+        with self.lock:
+            for slot, in_use in enumerate(self.slots_in_use):
+                start_time = self.slot_owner_start_times[slot] or None
+                if in_use and not is_process_running(self.slot_owner_pids[slot], start_time):
+                    self._free_slot(slot)
+                    num_released += 1
+
+            for waiter, pid in enumerate(self.waiter_pids):
+                start_time = self.waiter_start_times[waiter] or None
+                if pid != 0 and not is_process_running(pid, start_time):
+                    self._remove_waiter(waiter)
+                    num_removed += 1
+
+        if num_released > 0 or num_removed > 0:
+            logger.debug(
+                "Released %d browser slots and removed %d waiters of stopped processes",
+                num_released,
+                num_removed,
+            )
+
+        return num_released
+
+    def register_check_in(self, refresh_time: datetime) -> int | None:
+        """
+        Register when an upcoming check-in will refresh its headers so routine browser use is
+        postponed around that time. Returns the registration's slot, or None if every slot is
+        taken.
+        """
+        timestamp = refresh_time.timestamp()
+        with self.lock:
+            for slot, registered_time in enumerate(self.check_in_refresh_times):
+                if registered_time == 0 or self._is_stale(registered_time):
+                    self.check_in_refresh_times[slot] = timestamp
+                    return slot
+
+        logger.warning(
+            "Unable to register check-in. All %d slots are taken, so routine browser use won't "
+            "make way for its header refresh",
+            len(self.check_in_refresh_times),
+        )
+        return None
+
+    def unregister_check_in(self, slot: int | None, refresh_time: datetime) -> None:
+        if slot is None:
+            return
+
+        with self.lock:
+            # The slot might have been reused if the registration was stale
+            if self.check_in_refresh_times[slot] == refresh_time.timestamp():
+                self.check_in_refresh_times[slot] = 0
+
+    def register_check_in_time(self, checkin_time: datetime) -> int | None:
+        """
+        Register when a check-in happens so routine work is deferred within the quiet window
+        around it. Returns the registration's slot, or None if every slot is taken.
+        """
+        if self.quiet_window <= 0:
+            return None
+
+        timestamp = checkin_time.timestamp()
+        with self.lock:
+            for slot, registered_time in enumerate(self.check_in_times):
+                if registered_time == 0 or self._is_quiet_window_over(registered_time):
+                    self.check_in_times[slot] = timestamp
+                    return slot
+
+        logger.warning(
+            "Unable to register check-in time. All %d slots are taken, so routine work won't be "
+            "deferred around it",
+            len(self.check_in_times),
+        )
+        return None
+
+    def unregister_check_in_time(self, slot: int | None, checkin_time: datetime) -> None:
+        if slot is None:
+            return
+
+        with self.lock:
+            # The slot might have been reused once the quiet window was over
+            if self.check_in_times[slot] == checkin_time.timestamp():
+                self.check_in_times[slot] = 0
+
+    def wait_for_quiet_window(self, job: str) -> None:
+        """Defer a routine job until no check-in's quiet window is in progress"""
+        with self.lock:
+            quiet_window_end = self._get_quiet_window_end()
+            if quiet_window_end is None:
+                return
+
+            self._record_deferral(job)
+
+        while quiet_window_end is not None:
+            timeout = min(quiet_window_end - time.time(), WAIT_POLL_INTERVAL_SECS)
+            time.sleep(max(timeout, 0))
+            with self.lock:
+                quiet_window_end = self._get_quiet_window_end()
+
+        logger.debug("Check-in quiet window is over. Resuming %s", job)
+
+    def get_stats(self) -> JSON:
+        stats = {}
+        with self.lock:
+            for priority in BrowserPriority:
+                num_acquired = self.num_acquired[priority]
+                stats[self._get_priority_name(priority)] = {
+                    "waiting": self._count_waiters(priority),
+                    "acquired": num_acquired,
+                    "average_wait_time": self.total_wait_time[priority] / max(num_acquired, 1),
+                }
+
+            stats["deferred"] = self.num_deferred.value
+
+        return stats
+
+    def _can_acquire(self, priority: BrowserPriority | None) -> bool:
+        if self._get_free_slot() is None:
+            return False
+
+        if not has_memory_for_browser(sum(self.slots_in_use)):
+            return False
+
+        if priority != BrowserPriority.ROUTINE:
+            return True
+
+        # Routine use yields to check-ins that are waiting, will be soon, or are in progress
+        return (
+            self._count_waiters(BrowserPriority.CHECK_IN) == 0
+            and not self._is_check_in_due_soon()
+            and self._get_quiet_window_end() is None
+        )
+
+    def _try_acquire(
+        self, priority: BrowserPriority | None, owner_pid: int, owner_start_time: int
+    ) -> int | None:
+        """Take a free slot if it can be used and return it. Otherwise, return None"""
+        with self.lock:
+            if not self._can_acquire(priority):
+                return None
+
+            slot = self._get_free_slot()
+            self.slots_in_use[slot] = True
+            self.slot_owner_pids[slot] = owner_pid
+            self.slot_owner_start_times[slot] = owner_start_time
+            return slot
+
+    def _add_waiter(self, priority: BrowserPriority, pid: int, start_time: int) -> int | None:
+        """Record a waiter and return its slot, or None if every slot is taken"""
+        for waiter, waiter_pid in enumerate(self.waiter_pids):
+            if waiter_pid == 0:
+                self.waiter_pids[waiter] = pid
+                self.waiter_start_times[waiter] = start_time
+                self.waiter_priorities[waiter] = priority
+                return waiter
+
+        logger.warning("Unable to record browser waiter. All %d slots are taken", MAX_WAITERS)
+        return None
+
+    def _remove_waiter(self, waiter: int) -> None:
+        self.waiter_pids[waiter] = 0
+        self.waiter_start_times[waiter] = 0
+        self.waiter_priorities[waiter] = 0
+
+    def _count_waiters(self, priority: BrowserPriority) -> int:
+        return sum(
+            1
+            for waiter, pid in enumerate(self.waiter_pids)
+            if pid != 0 and self.waiter_priorities[waiter] == priority
+        )
+
+    def _free_slot(self, slot: int) -> None:
+        self.slots_in_use[slot] = False
+        self.slot_owner_pids[slot] = 0
+        self.slot_owner_start_times[slot] = 0
+
+    def _get_free_slot(self) -> int | None:
+        for slot, in_use in enumerate(self.slots_in_use):
+            if not in_use:
+                return slot
+
+        return None
+
+    def _is_check_in_due_soon(self) -> bool:
+        current_time = time.time()
+        for refresh_time in self.check_in_refresh_times:
+            if refresh_time == 0 or self._is_stale(refresh_time):
+                continue
+
+            if refresh_time - current_time <= CHECK_IN_GUARD_SECS:
+                return True
+
+        return False
+
+    def _is_stale(self, refresh_time: float) -> bool:
+        """A registration is stale if its check-in should have refreshed its headers long ago"""
+        return time.time() - refresh_time > CHECK_IN_GUARD_SECS
+
+    def _get_quiet_window_end(self) -> float | None:
+        """Return when the quiet windows in progress end, or None if no window is in progress"""
+        current_time = time.time()
+        quiet_window_end = None
+        for checkin_time in self.check_in_times:
+            if checkin_time == 0 or abs(checkin_time - current_time) > self.quiet_window:
+                continue
+
+            quiet_window_end = max(quiet_window_end or 0, checkin_time + self.quiet_window)
+
+        return quiet_window_end
+
+    def _is_quiet_window_over(self, checkin_time: float) -> bool:
+        return time.time() - checkin_time > self.quiet_window
+
+    def _record_deferral(self, job: str) -> None:
+        """Must be called while holding the lock"""
+        self.num_deferred.value += 1
+        logger.debug(
+            "Deferring %s during a check-in quiet window. %d jobs deferred in total",
+            job,
+            self.num_deferred.value,
+        )
+
+    def _get_priority_name(self, priority: BrowserPriority | None) -> str:
+        return "none" if priority is None else priority.name.lower()
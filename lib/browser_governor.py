@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import json
+import os
+import signal
+import stat
+import tempfile
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .log import get_logger
+from .utils import atomic_write_json
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from sbvirtualdisplay import Display
+    from seleniumbase import Driver
+
+    from .browser_arbiter import BrowserArbiter
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+PROC_DIRECTORY = "/proc"
+
+# Another browser is only started while at least this much memory is available, unless no
+# browsers are running
+MEMORY_PER_BROWSER = 512 * 1024 * 1024
+
+# How often jobs waiting for memory check again if nothing notifies them
+MEMORY_POLL_INTERVAL_SECS = 5
+
+# Every running browser is registered here by the process that started it, so browsers left
+# behind by a process that was killed or crashed can be found by any other process. The directory
+# is per user so other users can't plant records of processes to kill. Windows has no user IDs,
+# but its temporary directory is already per user
+REGISTRY_DIRECTORY_NAME = "auto-southwest-check-in"
+if hasattr(os, "getuid"):
+    REGISTRY_DIRECTORY_NAME += f"-{os.getuid()}"
+BROWSER_REGISTRY_DIRECTORY = (
+    Path(tempfile.gettempdir()) / REGISTRY_DIRECTORY_NAME / "running_browsers"
+)
+
+REAP_INTERVAL_SECS = 5 * 60
+
+# Name of the thread the reaper runs in
+REAPER_NAME = "BrowserReaper"
+
+# SIGKILL is not available on Windows
+KILL_SIGNAL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+logger = get_logger(__name__)
+
+
+def get_process_tree_memory(pid: int) -> int | None:
+    """
+    Return the resident memory (in bytes) of a process and all of its descendants. A browser runs
+    many processes (e.g. one per renderer), so only looking at the main process would miss most
+    of the memory. Returns None if memory usage can't be read (e.g. /proc is not available).
+    """
+    pids = get_process_tree(pid)
+    if pids is None:
+        return None
+
+    return get_processes_memory(pids)
+
+
+def get_process_tree(pid: int) -> list[int] | None:
+    """
+    Return the process and all of its descendants. Returns None if the processes can't be read
+    (e.g. /proc is not available).
+    """
+    try:
+        pids = [int(entry) for entry in os.listdir(PROC_DIRECTORY) if entry.isdigit()]
+    except OSError:
+        return None
+
+    children = {}
+    for process_id in pids:
+        parent_id = _read_parent_pid(process_id)
+        if parent_id is not None:
+            children.setdefault(parent_id, []).append(process_id)
+
+    tree = []
+    remaining = [pid]
+    while len(remaining) > 0:
+        process_id = remaining.pop()
+        tree.append(process_id)
+        remaining.extend(children.get(process_id, []))
+
+    return tree
+
+
+def get_processes_memory(pids: list[int]) -> int:
+    """Return the total resident memory (in bytes) of the processes"""
+    return sum(_read_resident_memory(pid) for pid in pids)
+
+
+def get_available_memory() -> int | None:
+    """Return the memory (in bytes) available for new processes, or None if it can't be read"""
+    try:
+        with open(f"{PROC_DIRECTORY}/meminfo") as meminfo_file:
+            for line in meminfo_file:
+                if line.startswith("MemAvailable:"):
+                    # The value is in kB
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return None
+
+
+def has_memory_for_browser(num_running: int) -> bool:
+    """
+    Check if another browser can be started without running the host out of memory. A browser can
+    always be started when none are running so nothing waits forever.
+    """
+    if num_running == 0:
+        return True
+
+    available_memory = get_available_memory()
+    if available_memory is None or available_memory >= MEMORY_PER_BROWSER:
+        return True
+
+    logger.debug(
+        "Only %d MB of memory available with %d browsers running. Waiting to start a browser",
+        available_memory // (1024 * 1024),
+        num_running,
+    )
+    return False
+
+
+def register_browser(driver: Driver, display: Display | None = None) -> None:
+    """
+    Record the processes of a browser that was just started: the driver, the browser, and its
+    virtual display (if it has its own). Long-lived displays shared by browser slots aren't
+    registered as they outlive every browser.
+    """
+    pids = _get_browser_pids(driver, display)
+    if len(pids) == 0:
+        return
+
+    owner_pid = os.getpid()
+    record = {
+        "owner_pid": owner_pid,
+        "owner_start_time": read_start_time(owner_pid),
+        # Start times are kept so a process ID reused by an unrelated process is never killed
+        "processes": {str(pid): read_start_time(pid) for pid in pids},
+    }
+    _write_record(_get_record_path(pids), record)
+
+
+def unregister_browser(driver: Driver, display: Display | None = None) -> None:
+    pids = _get_browser_pids(driver, display)
+    if len(pids) > 0:
+        _remove_record(_get_record_path(pids))
+
+
+def reap_orphaned_browsers() -> int:
+    """
+    Kill the processes of every registered browser whose owner process no longer exists (e.g. it
+    was stopped with SIGTERM or crashed while using the browser). Returns the memory reclaimed (in
+    bytes).
+    """
+    if not _is_registry_directory_private():
+        return 0
+
+    num_reaped = 0
+    reclaimed_memory = 0
+    for record_path in BROWSER_REGISTRY_DIRECTORY.glob("*.json"):
+        record = _read_record(record_path)
+        if record is not None and is_process_running(
+            record["owner_pid"], record.get("owner_start_time")
+        ):
+            continue
+
+        if record is not None:
+            num_reaped += 1
+            reclaimed_memory += _kill_processes(record["processes"])
+
+        _remove_record(record_path)
+
+    if num_reaped > 0:
+        logger.debug(
+            "Reaped %d orphaned browsers, reclaiming %d MB of memory",
+            num_reaped,
+            reclaimed_memory // (1024 * 1024),
+        )
+
+    return reclaimed_memory
+
+
+class BrowserReaper:
+    """
+    Periodically reaps browsers orphaned by processes that were killed or crashed. Runs in a
+    daemon thread of the main process, which outlives every monitor and check-in process.
+
+    If an arbiter is given, the browser slots held by those processes are released as well.
+    """
+
+    def __init__(
+        self, arbiter: BrowserArbiter | None = None, interval: int = REAP_INTERVAL_SECS
+    ) -> None:
+        self.arbiter = arbiter
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.total_reclaimed_memory = 0
+
+    def start(self) -> None:
+        logger.debug("Reaping orphaned browsers every %d seconds", self.interval)
+        thread = threading.Thread(target=self._run, name=REAPER_NAME, daemon=True)
+        thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def _run(self) -> None:
+        # Browsers left behind by a previous run are reaped right away
+        while True:
+            try:
+                self.total_reclaimed_memory += reap_orphaned_browsers()
+                if self.arbiter is not None:
+                    self.arbiter.release_orphaned_slots()
+            except Exception as err:
+                logger.exception("Unexpected error while reaping browsers: %s", repr(err))
+
+            if self.stop_event.wait(self.interval):
+                return
+
+
+def _get_browser_pids(driver: Driver, display: Display | None) -> list[int]:
+    service_process = getattr(getattr(driver, "service", None), "process", None)
+    pids = [
+        getattr(service_process, "pid", None),
+        getattr(driver, "browser_pid", None),
+        getattr(display, "pid", None),
+    ]
+    return [pid for pid in pids if isinstance(pid, int)]
+
+
+def _get_record_path(pids: list[int]) -> Path:
+    return BROWSER_REGISTRY_DIRECTORY / f"{os.getpid()}-{pids[0]}.json"
+
+
+def _read_parent_pid(pid: int) -> int | None:
+    try:
+        with open(f"{PROC_DIRECTORY}/{pid}/stat") as stat_file:
+            # The process name can contain spaces, so only parse what comes after it
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        return int(fields[1])
+    except (OSError, IndexError, ValueError):
+        # The process exited while reading
+        return None
+
+
+def _read_resident_memory(pid: int) -> int:
+    try:
+        with open(f"{PROC_DIRECTORY}/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    # The value is in kB
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return 0
+
+
+def read_start_time(pid: int) -> int | None:
+    """Return when the process started (in clock ticks since boot) or None if it isn't running"""
+    try:
+        with open(f"{PROC_DIRECTORY}/{pid}/stat") as stat_file:
+            # The process name can contain spaces, so only parse what comes after it
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        return int(fields[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def is_process_running(pid: int, start_time: int | None) -> bool:
+    """
+    Check if the process is still running. Without a start time, any process with the ID counts,
+    so this must never be used to decide whether a process is safe to kill.
+    """
+    current_start_time = read_start_time(pid)
+    if current_start_time is None:
+        return False
+
+    # A different start time means the process ID was reused by another process
+    return start_time is None or current_start_time == start_time
+
+
+def _kill_processes(processes: dict[str, int | None]) -> int:
+    """
+    Kill the processes and all of their descendants. Returns the memory they were using. A process
+    is only killed if its recorded start time matches, so a reused process ID is never killed.
+    """
+    pids = set()
+    for pid, start_time in processes.items():
+        if start_time is not None and read_start_time(int(pid)) == start_time:
+            pids.update(get_process_tree(int(pid)) or [int(pid)])
+
+    reclaimed_memory = get_processes_memory(list(pids))
+    for pid in pids:
+        try:
+            os.kill(pid, KILL_SIGNAL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    return reclaimed_memory
+
+
+def _create_registry_directory() -> bool:
+    """Create the registry directory if it doesn't exist. Returns whether it is safe to use"""
+    try:
+        BROWSER_REGISTRY_DIRECTORY.parent.mkdir(mode=0o700, exist_ok=True)
+        BROWSER_REGISTRY_DIRECTORY.mkdir(mode=0o700, exist_ok=True)
+    except OSError as e:
+        logger.debug("Failed to create the browser registry: %s", e)
+        return False
+
+    return _is_registry_directory_private()
+
+
+def _is_registry_directory_private() -> bool:
+    # Whoever controls the parent directory can replace the registry, so it is checked as well
+    return all(
+        _is_private(directory, stat.S_ISDIR)
+        for directory in (BROWSER_REGISTRY_DIRECTORY.parent, BROWSER_REGISTRY_DIRECTORY)
+    )
+
+
+def _is_private(path: Path, is_expected_type: Callable[[int], bool]) -> bool:
+    """
+    Check that the path is of the expected type (not a symlink), is owned by the current user, and
+    can't be accessed by other users. Always True on Windows, which has no owners or modes to check.
+    """
+    if not hasattr(os, "getuid"):
+        return True
+
+    try:
+        path_stat = os.lstat(path)
+    except OSError:
+        return False
+
+    if (
+        not is_expected_type(path_stat.st_mode)
+        or path_stat.st_uid != os.getuid()
+        or path_stat.st_mode & 0o077 != 0
+    ):
+        logger.warning("Ignoring %s as other users can access it", path)
+        return False
+
+    return True
+
+
+def _read_record(record_path: Path) -> JSON | None:
+    if not _is_private(record_path, stat.S_ISREG):
+        return None
+
+    try:
+        with open(record_path) as record_file:
+            record = json.load(record_file)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(record, dict) or "owner_pid" not in record or "processes" not in record:
+        return None
+
+    return record
+
+
+def _write_record(record_path: Path, record: JSON) -> None:
+    if not _create_registry_directory():
+        return
+
+    try:
+        atomic_write_json(record_path, record)
+    except OSError as e:
+        logger.debug("Failed to register browser: %s", e)
+
+
+def _remove_record(record_path: Path) -> None:
+    try:
+        os.remove(record_path)
+    except OSError:
+        pass
@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from enum import Enum
+from typing import TYPE_CHECKING, Any
+
+from .browser_governor import MEMORY_POLL_INTERVAL_SECS, has_memory_for_browser
+from .browser_session import BrowserSession
+from .log import get_logger
+from .reservation_monitor import AccountMonitor, ReservationMonitor
+from .utils import DriverTimeoutError, LoginError
+from .webdriver import WebDriver
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+    from .config import AccountConfig, ReservationConfig
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+# Roughly how much memory a browser and its worker process use. Used to size the pool to the
+# host's memory when the number of workers is set to "auto"
+MEMORY_PER_WORKER = 1024 * 1024 * 1024
+
+# Name of the browser worker processes
+WORKER_NAME = "BrowserWorker"
+SUPERVISOR_NAME = "BrowserWorkerSupervisor"
+
+# How long a requester waits for its job's result, including the time spent in the queue. Jobs
+# that are still queued after this time are skipped as nobody is waiting for them anymore
+JOB_TIMEOUT_SECS = 20 * 60
+
+# How often workers that exited (e.g. crashed or were killed) are replaced
+SUPERVISE_INTERVAL_SECS = 10
+
+logger = get_logger(__name__)
+
+
+def get_auto_num_workers() -> int:
+    """
+    Size the pool to the host: one worker per CPU core, but no more workers than the host's
+    memory can hold browsers for. At least one worker is always used.
+    """
+    num_workers = os.cpu_count() or 1
+
+    try:
+        total_memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        num_workers = min(num_workers, total_memory // MEMORY_PER_WORKER)
+    except (AttributeError, ValueError, OSError):
+        # os.sysconf is not available on Windows
+        logger.debug("Unable to determine host memory. Sizing browser pool by CPU cores only")
+
+    return max(num_workers, 1)
+
+
+# Switch to StrEnum when Python 3.10 support is dropped
+class BrowserJobType(str, Enum):
+    REFRESH_HEADERS = "refresh_headers"
+    GET_RESERVATIONS = "get_reservations"
+
+
+class BrowserJob:
+    """
+    A job sent to a browser worker. The result is sent back through reply_conn, which is the
+    sending end of a pipe that only the requester is receiving from.
+    """
+
+    def __init__(
+        self,
+        job_type: BrowserJobType,
+        config: AccountConfig | ReservationConfig,
+        reply_conn: Connection,
+        first_name: str | None = None,
+        last_name: str | None = None,
+    ) -> None:
+        self.job_type = job_type
+        self.config = config
+        self.reply_conn = reply_conn
+        self.first_name = first_name
+        self.last_name = last_name
+        self.submitted_at = time.time()
+
+
+class BrowserPool:
+    """
+    A bounded pool of worker processes that run every browser job (refreshing headers and logging
+    into accounts). Jobs are taken from a single queue, so no more browsers than workers are ever
+    running at the same time.
+
+    The pool is created in the main process and is shared with every monitor and check-in process
+    when they are started.
+
+    If session_max_uses is greater than 0, each worker keeps its browser running between jobs
+    (see BrowserSession) and recycles it after that many jobs.
+
+    Workers that exit are replaced by a supervisor thread in the main process. A job lost with its
+    worker is reported to the requester as a DriverTimeoutError once JOB_TIMEOUT_SECS pass.
+    """
+
+    def __init__(
+        self, num_workers: int, session_max_uses: int = 0, session_max_memory_growth: int = 0
+    ) -> None:
+        self.num_workers = num_workers
+        self.session_max_uses = session_max_uses
+        self.session_max_memory_growth = session_max_memory_growth
+        self.job_queue = multiprocessing.Queue()
+
+        # Statistics shared between every process using the pool
+        self.queue_depth = multiprocessing.Value("i", 0)
+        self.jobs_completed = multiprocessing.Value("i", 0)
+        self.total_wait_time = multiprocessing.Value("d", 0.0)
+        self.total_job_duration = multiprocessing.Value("d", 0.0)
+        # Jobs currently using a browser. Used to hold back jobs while the host is low on memory
+        self.running_jobs = multiprocessing.Value("i", 0)
+        # Whether each browser slot's worker is counted in running_jobs, so the count can be
+        # corrected when a worker exits in the middle of a job
+        self.busy_slots = multiprocessing.Array("b", num_workers)
+
+    def start(self) -> None:
+        logger.debug("Starting browser pool with %d workers", self.num_workers)
+        workers = [self._start_worker(browser_slot) for browser_slot in range(self.num_workers)]
+
+        # The workers are only kept by the supervisor so the pool can still be shared with other
+        # processes
+        thread = threading.Thread(
+            target=self._supervise_workers, args=(workers,), name=SUPERVISOR_NAME, daemon=True
+        )
+        thread.start()
+
+    def refresh_headers(self, config: AccountConfig | ReservationConfig) -> JSON:
+        """Refresh headers in a browser worker and return the new headers"""
+        result = self._submit(BrowserJobType.REFRESH_HEADERS, config)
+        return result["headers"]
+
+    def get_reservations(self, account_monitor: AccountMonitor) -> list[JSON]:
+        """
+        Log into the account in a browser worker and return its reservations. The headers and the
+        account name produced by the login are set the same way the webdriver sets them.
+        """
+        result = self._submit(
+            BrowserJobType.GET_RESERVATIONS,
+            account_monitor.config,
+            account_monitor.first_name,
+            account_monitor.last_name,
+        )
+
+        account_monitor.checkin_scheduler.headers = result["headers"]
+        account_monitor.first_name = result["first_name"]
+        account_monitor.last_name = result["last_name"]
+        return result["reservations"]
+
+    def get_stats(self) -> JSON:
+        jobs_completed = self.jobs_completed.value
+        return {
+            "queue_depth": self.queue_depth.value,
+            "jobs_completed": jobs_completed,
+            "average_wait_time": self.total_wait_time.value / max(jobs_completed, 1),
+            "average_job_duration": self.total_job_duration.value / max(jobs_completed, 1),
+        }
+
+    def _submit(
+        self,
+        job_type: BrowserJobType,
+        config: AccountConfig | ReservationConfig,
+        first_name: str | None = None,
+        last_name: str | None = None,
+    ) -> JSON:
+        """Submit a job and wait for its result. Errors from the job are raised here."""
+        receive_conn, send_conn = multiprocessing.Pipe(duplex=False)
+        job = BrowserJob(job_type, config, send_conn, first_name, last_name)
+
+        with self.queue_depth.get_lock():
+            self.queue_depth.value += 1
+
+        logger.debug("Submitting %s job to browser pool", job_type.value)
+        self.job_queue.put(job)
+
+        try:
+            # The sending end must stay open until the reply is received as the worker retrieves
+            # it from this process
+            if not receive_conn.poll(JOB_TIMEOUT_SECS):
+                timeout_err = DriverTimeoutError(
+                    f"Timeout waiting for the browser pool to finish the {job_type.value} job"
+                )
+                logger.debug(timeout_err)
+                raise timeout_err
+
+            error, result = receive_conn.recv()
+        finally:
+            receive_conn.close()
+            send_conn.close()
+
+        logger.debug("Browser pool stats: %s", self.get_stats())
+        if error is not None:
+            raise error
+
+        return result
+
+    def _start_worker(self, browser_slot: int) -> multiprocessing.Process:
+        # Workers are daemons so they are stopped once the main process exits. Each worker uses
+        # its own browser slot so its browser is isolated from the other workers'
+        process = multiprocessing.Process(
+            target=self._run_worker, args=(browser_slot,), name=WORKER_NAME, daemon=True
+        )
+        process.start()
+        return process
+
+    def _supervise_workers(self, workers: list[multiprocessing.Process]) -> None:
+        while True:
+            time.sleep(SUPERVISE_INTERVAL_SECS)
+            try:
+                self._replace_exited_workers(workers)
+            except Exception as err:
+                logger.exception(
+                    "Unexpected error while supervising browser workers: %s", repr(err)
+                )
+
+    def _replace_exited_workers(self, workers: list[multiprocessing.Process]) -> None:
+        for browser_slot, process in enumerate(workers):
+            if process.is_alive():
+                continue
+
+            logger.warning(
+                "Browser worker using browser slot %d exited with code %s. Starting a new worker",
+                browser_slot,
+                process.exitcode,
+            )
+            with self.running_jobs.get_lock():
+                if self.busy_slots[browser_slot]:
+                    self.busy_slots[browser_slot] = 0
+                    self.running_jobs.value -= 1
+
+            workers[browser_slot] = self._start_worker(browser_slot)
+
+    def _run_worker(self, browser_slot: int) -> None:
+        logger.debug("Browser worker started using browser slot %d", browser_slot)
+        session = None
+        if self.session_max_uses > 0:
+            session = BrowserSession(self.session_max_uses, self.session_max_memory_growth)
+
+        try:
+            while True:
+                job = self.job_queue.get()
+                self._run_job(job, browser_slot, session)
+        except KeyboardInterrupt:
+            # The requester is stopped by the interrupt as well, so there is nobody to reply to
+            pass
+        finally:
+            if session is not None:
+                session.close()
+
+    def _run_job(
+        self, job: BrowserJob, browser_slot: int, session: BrowserSession | None = None
+    ) -> None:
+        started_at = time.time()
+        wait_time = started_at - job.submitted_at
+        with self.queue_depth.get_lock():
+            self.queue_depth.value -= 1
+
+        if wait_time > JOB_TIMEOUT_SECS:
+            logger.debug(
+                "Skipping %s job as it waited %.1f seconds and its requester stopped waiting",
+                job.job_type.value,
+                wait_time,
+            )
+            job.reply_conn.close()
+            return
+
+        logger.debug("Running %s job after waiting %.1f seconds", job.job_type.value, wait_time)
+        self._wait_for_memory(browser_slot)
+
+        error = result = None
+        try:
+            result = self._perform_job(job, browser_slot, session)
+        except (DriverTimeoutError, LoginError) as err:
+            error = err
+        except Exception as err:
+            logger.exception("Unexpected error in browser worker: %s", repr(err))
+            # The original error might not be picklable, so send a generic error instead
+            error = DriverTimeoutError(f"Browser job failed: {err!r}")
+        finally:
+            with self.running_jobs.get_lock():
+                self.busy_slots[browser_slot] = 0
+                self.running_jobs.value -= 1
+
+        if error is not None and session is not None:
+            # The browser might be left in any state after a failed job, so start a new one
+            session.close()
+
+        job_duration = time.time() - started_at
+        with self.jobs_completed.get_lock():
+            self.jobs_completed.value += 1
+            self.total_wait_time.value += wait_time
+            self.total_job_duration.value += job_duration
+
+        logger.debug("Finished %s job in %.1f seconds", job.job_type.value, job_duration)
+        try:
+            job.reply_conn.send((error, result))
+        except OSError:
+            # The requester timed out and closed its end of the pipe
+            logger.debug("Requester of the %s job stopped waiting for it", job.job_type.value)
+        finally:
+            job.reply_conn.close()
+
+    def _wait_for_memory(self, browser_slot: int) -> None:
+        """Wait until the host has enough memory for another browser, then count this job"""
+        while True:
+            with self.running_jobs.get_lock():
+                if has_memory_for_browser(self.running_jobs.value):
+                    self.busy_slots[browser_slot] = 1
+                    self.running_jobs.value += 1
+                    return
+
+            time.sleep(MEMORY_POLL_INTERVAL_SECS)
+
+    def _perform_job(
+        self, job: BrowserJob, browser_slot: int, session: BrowserSession | None = None
+    ) -> JSON:
+        if job.job_type == BrowserJobType.REFRESH_HEADERS:
+            reservation_monitor = ReservationMonitor(job.config)
+            webdriver = WebDriver(reservation_monitor.checkin_scheduler, browser_slot, session)
+            webdriver.set_headers()
+            return {"headers": reservation_monitor.checkin_scheduler.headers}
+
+        account_monitor = AccountMonitor(job.config, None)
+        account_monitor.first_name = job.first_name
+        account_monitor.last_name = job.last_name
+
+        webdriver = WebDriver(account_monitor.checkin_scheduler, browser_slot, session)
+        reservations = webdriver.get_reservations(account_monitor)
+        return {
+            "headers": account_monitor.checkin_scheduler.headers,
+            "reservations": reservations,
+            "first_name": account_monitor.first_name,
+            "last_name": account_monitor.last_name,
+        }
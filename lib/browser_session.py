@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from selenium.common.exceptions import WebDriverException
+
+from .browser_governor import get_process_tree_memory, unregister_browser
+from .log import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from sbvirtualdisplay import Display
+    from seleniumbase import Driver
+
+logger = get_logger(__name__)
+
+
+class BrowserSession:
+    """
+    A long-lived browser kept running between jobs in a browser worker. Starting a browser is the
+    most expensive part of every job, so the same browser is reused and its cookies and storage
+    are cleared after each job instead. Nothing from an account login is kept for the next job.
+
+    The browser is health-checked before each use and recycled (quit and started again on the
+    next use) after max_uses jobs or once its memory grows by more than max_memory_growth bytes
+    since it was started. A max_memory_growth of 0 disables the memory check.
+    """
+
+    def __init__(self, max_uses: int, max_memory_growth: int) -> None:
+        self.max_uses = max_uses
+        self.max_memory_growth = max_memory_growth
+
+        self.driver = None
+        self.display = None
+        self.num_uses = 0
+        self.initial_memory = None
+
+    def get_driver(self, start_browser: Callable[[], tuple[Driver, Display | None]]) -> Driver:
+        """
+        Return the running browser. A new browser is started with start_browser if there is no
+        browser running or the running browser is unhealthy.
+        """
+        if self.driver is not None and not self._is_healthy():
+            logger.debug("Browser session is unhealthy. Starting a new browser")
+            self.close()
+
+        if self.driver is None:
+            self.driver, self.display = start_browser()
+            self.num_uses = 0
+            self.initial_memory = self._get_memory()
+        else:
+            logger.debug("Reusing browser session (used %d times)", self.num_uses)
+
+        return self.driver
+
+    def release(self) -> None:
+        """Clear the browser's state after a job and recycle the browser if needed"""
+        self.num_uses += 1
+        try:
+            self._clear_state()
+        except WebDriverException as err:
+            logger.debug("Failed to clear browser session state. Recycling browser: %s", err)
+            self.close()
+            return
+
+        if self._should_recycle():
+            self.close()
+
+    def close(self) -> None:
+        if self.driver is None:
+            return
+
+        logger.debug("Closing browser session after %d uses", self.num_uses)
+        try:
+            self.driver.quit()
+        except WebDriverException as err:
+            logger.debug("Error quitting browser session: %s", err)
+
+        unregister_browser(self.driver, self.display)
+
+        if self.display is not None:
+            self.display.stop()
+
+        self.driver = None
+        self.display = None
+
+    def _is_healthy(self) -> bool:
+        try:
+            self.driver.execute_script("return true")
+        except WebDriverException:
+            return False
+
+        return True
+
+    def _clear_state(self) -> None:
+        self.driver.clear_cdp_listeners()
+        self.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        self.driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+
+    def _should_recycle(self) -> bool:
+        if self.max_uses > 0 and self.num_uses >= self.max_uses:
+            logger.debug("Recycling browser session after %d uses", self.num_uses)
+            return True
+
+        memory = self._get_memory()
+        if self.max_memory_growth > 0 and memory is not None and self.initial_memory is not None:
+            memory_growth = memory - self.initial_memory
+            logger.debug("Browser session memory grew by %d MB", memory_growth // (1024 * 1024))
+            if memory_growth > self.max_memory_growth:
+                logger.debug("Recycling browser session due to memory growth")
+                return True
+
+        return False
+
+    def _get_memory(self) -> int | None:
+        browser_pid = getattr(self.driver, "browser_pid", None)
+        if browser_pid is None:
+            return None
+
+        return get_process_tree_memory(browser_pid)
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import json
+import math
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .log import get_logger
+from .stagger_planner import get_monitor_key
+from .utils import CheckFaresOption, atomic_write_json
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from datetime import datetime
+
+    from .config import AccountConfig, GlobalConfig, ReservationConfig
+    from .cycle_cost import CycleCost
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# The measured cost of every monitor's cycles, kept between runs of the script so the first plan
+# is already based on measurements
+BUDGET_STATE_FILE = Path(tempfile.gettempdir()) / "auto-southwest-check-in" / "budget_state.json"
+
+# Estimated cost of monitors that have not completed a cycle yet
+DEFAULT_CYCLE_REQUESTS = 5
+DEFAULT_FARE_CHECK_REQUESTS = 5
+DEFAULT_CYCLE_BROWSER_SESSIONS = 1
+
+# Weight of the newest measurement in the moving average of each cost
+COST_SMOOTHING = 0.3
+
+# Monitors with a flight departing within this time get a larger share of the budget, up to
+# MAX_URGENCY_WEIGHT times the share of a monitor without upcoming flights
+URGENCY_HORIZON_SECS = 7 * SECONDS_PER_DAY
+MAX_URGENCY_WEIGHT = 10
+
+# Fares are checked at least once every this many cycles. Once skipping fare checks isn't
+# enough to stay within the budget, the retrieval interval is lengthened instead
+MAX_FARE_CHECK_EVERY = 4
+
+logger = get_logger(__name__)
+
+
+class BudgetPlanner:
+    """
+    Keeps every monitor within a host-wide daily budget of Southwest API requests and browser
+    sessions.
+
+    Every monitor records the measured cost of each cycle. To plan a monitor's schedule, the
+    budget is split between all running monitors: monitors needing less than their share get what
+    they need and the rest is shared by weight, so monitors with flights departing soon get more.
+    A monitor over its share skips fare checks first and then checks less often than its retrieval
+    interval. Plans never check more often than configured.
+
+    Monitors that stop (e.g. no more flights are scheduled) are removed from the plan, so their
+    share goes to the remaining monitors. Monitors no longer in the configuration are removed when
+    the planner is created.
+    """
+
+    def __init__(
+        self, global_config: GlobalConfig, configs: list[AccountConfig | ReservationConfig]
+    ) -> None:
+        self.request_budget = global_config.daily_request_budget
+        self.browser_session_budget = global_config.daily_browser_session_budget
+
+        # What each monitor wants if it hasn't recorded a cycle yet
+        self.default_intervals = {}
+        self.checks_fares = {}
+        for config in configs:
+            monitor_key = get_monitor_key(config)
+            self.default_intervals[monitor_key] = config.retrieval_interval
+            self.checks_fares[monitor_key] = config.check_fares != CheckFaresOption.NO
+
+        monitors = read_budget_state()
+        monitors = {
+            monitor_key: monitor
+            for monitor_key, monitor in monitors.items()
+            if monitor_key in self.default_intervals
+        }
+        for monitor in monitors.values():
+            monitor.pop("stopped", None)
+
+        write_budget_state(monitors)
+        logger.debug(
+            "Planning %d monitors within a daily budget of %d requests and %d browser sessions",
+            len(self.default_intervals),
+            self.request_budget,
+            self.browser_session_budget,
+        )
+
+    def record_cycle(
+        self,
+        config: AccountConfig | ReservationConfig,
+        cycle_cost: CycleCost,
+        retrieval_interval: int,
+        next_departure: datetime | None,
+    ) -> None:
+        """
+        Record the measured cost of a cycle, the retrieval interval the monitor wants, and when
+        its nearest flight departs
+        """
+        monitor_key = get_monitor_key(config)
+        monitors = read_budget_state()
+        monitor = monitors.setdefault(monitor_key, {})
+
+        _update_average(monitor, "cycle_requests", cycle_cost.requests)
+        _update_average(monitor, "cycle_browser_sessions", cycle_cost.browser_sessions)
+        if cycle_cost.checked_fares:
+            _update_average(monitor, "fare_check_requests", cycle_cost.fare_check_requests)
+
+        monitor["retrieval_interval"] = retrieval_interval
+        monitor["next_departure"] = None if next_departure is None else next_departure.timestamp()
+        monitor.pop("stopped", None)
+        write_budget_state(monitors)
+
+    def remove_monitor(self, config: AccountConfig | ReservationConfig) -> None:
+        monitor_key = get_monitor_key(config)
+        monitors = read_budget_state()
+        monitors.setdefault(monitor_key, {})["stopped"] = True
+        write_budget_state(monitors)
+        logger.debug("Removed monitor from the budget plan")
+
+    def get_plan(self, config: AccountConfig | ReservationConfig) -> tuple[int, int]:
+        """
+        Return the retrieval interval (in seconds) the monitor should use at least and how many
+        cycles apart it should check fares
+        """
+        monitor_key = get_monitor_key(config)
+        monitors = self._get_running_monitors()
+        monitor = monitors.get(monitor_key, self._get_default_monitor(monitor_key))
+        wanted_interval = monitor["retrieval_interval"]
+        if wanted_interval <= 0:
+            return wanted_interval, 1
+
+        retrieval_interval = wanted_interval
+        fare_check_every = 1
+        if self.request_budget > 0:
+            allocations = allocate_budget(self.request_budget, monitors, _get_daily_requests)
+            retrieval_interval, fare_check_every = _plan_requests(
+                monitor, allocations.get(monitor_key, 0)
+            )
+
+        if self.browser_session_budget > 0:
+            allocations = allocate_budget(
+                self.browser_session_budget,
+                monitors,
+                lambda other: _get_cycles_per_day(other) * other["cycle_browser_sessions"],
+            )
+            allocation = allocations.get(monitor_key, 0)
+            browser_sessions = monitor["cycle_browser_sessions"]
+            if browser_sessions > 0:
+                browser_interval = SECONDS_PER_DAY * browser_sessions / max(allocation, 1e-9)
+                retrieval_interval = max(retrieval_interval, math.ceil(browser_interval))
+
+        if (retrieval_interval, fare_check_every) != (wanted_interval, 1):
+            logger.debug(
+                "Using a retrieval interval of %d seconds and checking fares every %d cycles to "
+                "stay within the daily budget",
+                retrieval_interval,
+                fare_check_every,
+            )
+
+        return retrieval_interval, fare_check_every
+
+    def _get_running_monitors(self) -> dict[str, JSON]:
+        """Return every configured monitor that hasn't stopped, filling in missing estimates"""
+        recorded_monitors = read_budget_state()
+        monitors = {}
+        for monitor_key in self.default_intervals:
+            monitor = self._get_default_monitor(monitor_key)
+            monitor.update(recorded_monitors.get(monitor_key, {}))
+            if not monitor.get("stopped", False):
+                monitors[monitor_key] = monitor
+
+        return monitors
+
+    def _get_default_monitor(self, monitor_key: str) -> JSON:
+        return {
+            "cycle_requests": DEFAULT_CYCLE_REQUESTS,
+            "cycle_browser_sessions": DEFAULT_CYCLE_BROWSER_SESSIONS,
+            "fare_check_requests": DEFAULT_FARE_CHECK_REQUESTS,
+            "retrieval_interval": self.default_intervals.get(monitor_key, SECONDS_PER_DAY),
+            "next_departure": None,
+            "checks_fares": self.checks_fares.get(monitor_key, True),
+        }
+
+
+def allocate_budget(
+    budget: float, monitors: dict[str, JSON], get_need: Callable[[JSON], float]
+) -> dict[str, float]:
+    """
+    Split the budget between the monitors by weight. Monitors that need less than their share get
+    what they need, and what they don't use is split between the others.
+    """
+    weights = {
+        monitor_key: get_urgency_weight(monitor) for monitor_key, monitor in monitors.items()
+    }
+    needs = {monitor_key: get_need(monitor) for monitor_key, monitor in monitors.items()}
+
+    # If the monitor needing the least for its weight doesn't fit in its share, none of the
+    # others do either
+    remaining = sorted(monitors, key=lambda monitor_key: needs[monitor_key] / weights[monitor_key])
+    allocations = {}
+    while len(remaining) > 0:
+        total_weight = sum(weights[monitor_key] for monitor_key in remaining)
+        monitor_key = remaining[0]
+        share = budget * weights[monitor_key] / total_weight
+        if needs[monitor_key] > share:
+            for other_key in remaining:
+                allocations[other_key] = budget * weights[other_key] / total_weight
+            break
+
+        allocations[monitor_key] = needs[monitor_key]
+        budget -= needs[monitor_key]
+        remaining.pop(0)
+
+    return allocations
+
+
+def get_urgency_weight(monitor: JSON) -> float:
+    next_departure = monitor.get("next_departure")
+    if next_departure is None:
+        return 1
+
+    time_to_departure = max(next_departure - time.time(), 1)
+    return min(max(URGENCY_HORIZON_SECS / time_to_departure, 1), MAX_URGENCY_WEIGHT)
+
+
+def read_budget_state() -> dict[str, JSON]:
+    try:
+        with open(BUDGET_STATE_FILE) as state_file:
+            monitors = json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+    return monitors if isinstance(monitors, dict) else {}
+
+
+def write_budget_state(monitors: dict[str, JSON]) -> None:
+    """
+    If two processes write at the same time, one of the measurements might be lost, which only
+    affects the estimates slightly.
+    """
+    try:
+        atomic_write_json(BUDGET_STATE_FILE, monitors)
+    except OSError as e:
+        logger.debug("Failed to write budget state: %s", e)
+
+
+def _update_average(monitor: JSON, name: str, value: float) -> None:
+    if name not in monitor:
+        monitor[name] = value
+    else:
+        monitor[name] = COST_SMOOTHING * value + (1 - COST_SMOOTHING) * monitor[name]
+
+
+def _get_cycles_per_day(monitor: JSON) -> float:
+    return SECONDS_PER_DAY / max(monitor["retrieval_interval"], 1)
+
+
+def _get_fare_check_requests(monitor: JSON) -> float:
+    return monitor["fare_check_requests"] if monitor["checks_fares"] else 0
+
+
+def _get_daily_requests(monitor: JSON) -> float:
+    cycle_requests = monitor["cycle_requests"] + _get_fare_check_requests(monitor)
+    return _get_cycles_per_day(monitor) * cycle_requests
+
+
+def _plan_requests(monitor: JSON, allocation: float) -> tuple[int, int]:
+    """
+    Fit the monitor's requests into its allocation, first by skipping fare checks and then by
+    lengthening the retrieval interval
+    """
+    retrieval_interval = monitor["retrieval_interval"]
+    if _get_daily_requests(monitor) <= allocation:
+        return retrieval_interval, 1
+
+    cycles_per_day = _get_cycles_per_day(monitor)
+    cycle_requests = monitor["cycle_requests"]
+    fare_check_requests = _get_fare_check_requests(monitor)
+    fares_allocation = allocation - cycles_per_day * cycle_requests
+    if fare_check_requests > 0 and fares_allocation > 0:
+        fare_check_every = math.ceil(cycles_per_day * fare_check_requests / fares_allocation)
+        if fare_check_every <= MAX_FARE_CHECK_EVERY:
+            return retrieval_interval, fare_check_every
+
+    fare_check_every = MAX_FARE_CHECK_EVERY if fare_check_requests > 0 else 1
+    average_cycle_requests = cycle_requests + fare_check_requests / fare_check_every
+    allowed_cycles = max(allocation, 1e-9) / max(average_cycle_requests, 1e-9)
+    retrieval_interval = max(retrieval_interval, math.ceil(SECONDS_PER_DAY / allowed_cycles))
+    return retrieval_interval, fare_check_every
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from .log import get_logger
+from .utils import get_current_time
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from datetime import datetime
+
+# The maximum number of check-ins (and header refreshes) that run at the same time
+MAX_CONCURRENT_JOBS = 16
+
+logger = get_logger(__name__)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_checkin_engine() -> CheckInEngine:
+    """Return the check-in engine for the current process, starting it if necessary"""
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = CheckInEngine()
+            _engine.start()
+
+        return _engine
+
+
+class Timer:
+    """
+    A job scheduled in the check-in engine. Cancelling a timer only marks it as cancelled, so it
+    is skipped once it is due instead of being removed from the heap.
+    """
+
+    def __init__(self, engine: CheckInEngine, job: Callable[[], None]) -> None:
+        self.engine = engine
+        self.job = job
+        self.started = False
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.engine.cancel(self)
+
+
+class CheckInEngine:
+    """
+    Runs every pending check-in of the process as a timer in a single asyncio event loop, instead
+    of starting a separate process that sleeps until each check-in.
+
+    Timers are kept in a heap ordered by when they are due. The event loop sleeps until the
+    earliest timer is due and then dispatches every timer that is due to a thread pool, so
+    check-ins that are due at the same time run concurrently.
+    """
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="CheckIn"
+        )
+        self.thread = threading.Thread(target=self._run, name="CheckInEngine", daemon=True)
+
+        # Heap of (due time in loop time, sequence number, timer). The sequence number keeps
+        # timers that are due at the same time in the order they were scheduled
+        self.timers = []
+        self.sequence = itertools.count()
+        # Created in the event loop's thread as older Python versions bind events on creation
+        self.wakeup = None
+
+        # Keeps track of scheduled and running timers so callers can wait for all of them
+        self.pending_timers = 0
+        self.idle = threading.Condition()
+
+    def start(self) -> None:
+        logger.debug("Starting check-in engine")
+        self.thread.start()
+
+    def call_at(
+        self, due_time: datetime, job: Callable[[], None], current_time: datetime | None = None
+    ) -> Timer:
+        """
+        Run the job at the due time. This can be called from any thread as the timer is added
+        to the heap by the event loop. The current time can be passed in if the caller already
+        fetched it.
+        """
+        if current_time is None:
+            current_time = get_current_time()
+
+        timer = Timer(self, job)
+        delay = (due_time - current_time).total_seconds()
+        with self.idle:
+            self.pending_timers += 1
+
+        self.loop.call_soon_threadsafe(self._push_timer, delay, timer)
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        """Cancel a timer. A timer that has already started running is not stopped."""
+        with self.idle:
+            if timer.started or timer.cancelled:
+                return
+
+            timer.cancelled = True
+            self.pending_timers -= 1
+            self.idle.notify_all()
+
+    def wait_until_idle(self) -> None:
+        """Block until every scheduled timer has either run or been cancelled"""
+        with self.idle:
+            self.idle.wait_for(lambda: self.pending_timers == 0)
+
+    def _push_timer(self, delay: float, timer: Timer) -> None:
+        due_time = self.loop.time() + max(delay, 0)
+        heapq.heappush(self.timers, (due_time, next(self.sequence), timer))
+
+        # Timers added before the engine starts are picked up when it starts
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._run_timers())
+
+    async def _run_timers(self) -> None:
+        self.wakeup = asyncio.Event()
+
+        while True:
+            self.wakeup.clear()
+            self._dispatch_due_timers()
+
+            timeout = None
+            if len(self.timers) > 0:
+                timeout = self.timers[0][0] - self.loop.time()
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            # asyncio.TimeoutError is not an alias of TimeoutError before Python 3.11
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch_due_timers(self) -> None:
+        current_time = self.loop.time()
+        while len(self.timers) > 0 and self.timers[0][0] <= current_time:
+            _, _, timer = heapq.heappop(self.timers)
+
+            with self.idle:
+                if timer.cancelled:
+                    logger.debug("Skipping cancelled timer")
+                    continue
+
+                timer.started = True
+
+            self.loop.run_in_executor(self.executor, self._run_timer, timer)
+
+    def _run_timer(self, timer: Timer) -> None:
+        try:
+            timer.job()
+        except Exception as err:
+            logger.exception("Unexpected error in check-in engine: %s", repr(err))
+        finally:
+            self._finish_timer()
+
+    def _finish_timer(self) -> None:
+        with self.idle:
+            self.pending_timers -= 1
+            self.idle.notify_all()
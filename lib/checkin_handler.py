@@ -4,12 +4,15 @@ import os
 import signal
 import time
 from datetime import datetime, timedelta
-from multiprocessing import Lock, Process
+from multiprocessing import Process
 from typing import TYPE_CHECKING, Any
 
+from .browser_arbiter import BrowserPriority
+from .checkin_engine import get_checkin_engine
 from .log import get_logger
 from .utils import (
     AirportCheckInError,
+    CheckInEngineOption,
     DriverTimeoutError,
     RequestError,
     get_current_time,
@@ -36,14 +39,18 @@ class CheckInHandler:
     """
     Handles checking in for a single flight.
 
-    Sleeps until the flight's check-in time and then attempts the check in.
+    Sleeps until the flight's check-in time and then attempts the check in. With the asyncio
+    check-in engine, timers in the engine are used instead of a sleeping process.
     """
 
-    def __init__(self, checkin_scheduler: CheckInScheduler, flight: Flight, lock: Lock) -> None:
+    def __init__(self, checkin_scheduler: CheckInScheduler, flight: Flight) -> None:
         self.checkin_scheduler = checkin_scheduler
         self.flight = flight
-        self.lock = lock
         self.pid = None
+        self.timer = None
+        self.stopped = False
+        self.check_in_registration = None
+        self.quiet_window_registration = None
 
         self.notification_handler = checkin_scheduler.notification_handler
         self.first_name = checkin_scheduler.reservation_monitor.first_name
@@ -51,6 +58,15 @@ class CheckInHandler:
 
     def schedule_check_in(self) -> None:
         logger.debug("Scheduling check-in for current flight")
+        # The time is only fetched once so the registrations and timers agree with each other
+        current_time = get_current_time()
+        self._register_check_in(current_time)
+
+        check_in_engine = self.checkin_scheduler.reservation_monitor.config.check_in_engine
+        if check_in_engine == CheckInEngineOption.ASYNCIO:
+            self._schedule_timer(current_time)
+            return
+
         process = Process(target=self._set_check_in)
         process.start()
         self.pid = process.pid
@@ -62,6 +78,15 @@ class CheckInHandler:
         be pickled (necessary when using multiprocessing's 'spawn' start method).
         """
         logger.debug("Stopping check-in for current flight")
+        self._unregister_check_in()
+        self._unregister_check_in_time()
+
+        if self.timer is not None:
+            # Cancelling the timer is enough as nothing is sleeping in another process
+            self.stopped = True
+            self.timer.cancel()
+            logger.debug("Check-in timer successfully cancelled")
+            return
 
         try:
             logger.debug("Killing process with PID %d", self.pid)
@@ -76,9 +101,77 @@ class CheckInHandler:
 
         logger.debug("Process with PID %d successfully terminated", self.pid)
 
-    def _set_check_in(self) -> None:
+    def _get_checkin_time(self) -> datetime:
         # Check-in is 24 hours before the flight departs
-        checkin_time = self.flight.departure_time - timedelta(days=1)
+        return self.flight.departure_time - timedelta(days=1)
+
+    def _register_check_in(self, current_time: datetime) -> None:
+        """
+        Let the browser arbiter know when the headers will be refreshed before this check-in so
+        routine browser use is postponed around that time. The check-in time is registered as
+        well so routine work is deferred during the check-in's quiet window.
+        """
+        checkin_time = self._get_checkin_time()
+        browser_arbiter = self.checkin_scheduler.reservation_monitor.lock
+        if checkin_time > current_time:
+            slot = browser_arbiter.register_check_in_time(checkin_time)
+            self.quiet_window_registration = (slot, checkin_time)
+
+        refresh_time = checkin_time - timedelta(minutes=30)
+        if refresh_time <= current_time:
+            # The headers won't be refreshed before the check-in
+            return
+
+        slot = browser_arbiter.register_check_in(refresh_time)
+        self.check_in_registration = (slot, refresh_time)
+
+    def _unregister_check_in_time(self) -> None:
+        """
+        Only needed when the check-in is stopped. Otherwise, the registration expires once the
+        quiet window after the check-in is over
+        """
+        if self.quiet_window_registration is None:
+            return
+
+        browser_arbiter = self.checkin_scheduler.reservation_monitor.lock
+        browser_arbiter.unregister_check_in_time(*self.quiet_window_registration)
+        self.quiet_window_registration = None
+
+    def _unregister_check_in(self) -> None:
+        if self.check_in_registration is None:
+            return
+
+        browser_arbiter = self.checkin_scheduler.reservation_monitor.lock
+        browser_arbiter.unregister_check_in(*self.check_in_registration)
+        self.check_in_registration = None
+
+    def _schedule_timer(self, current_time: datetime) -> None:
+        """
+        Schedule the check-in as a timer in the check-in engine. If the check-in is more than
+        thirty minutes away, a timer to refresh the headers is scheduled first.
+        """
+        checkin_time = self._get_checkin_time()
+        refresh_time = checkin_time - timedelta(minutes=30)
+        engine = get_checkin_engine()
+
+        if refresh_time > current_time:
+            logger.debug("Scheduling header refresh thirty minutes before check-in")
+            self.timer = engine.call_at(
+                refresh_time, self._refresh_and_schedule_check_in, current_time
+            )
+        else:
+            self.timer = engine.call_at(checkin_time, self._check_in, current_time)
+
+    def _refresh_and_schedule_check_in(self) -> None:
+        self._refresh_headers()
+
+        if not self.stopped:
+            # The time is fetched again after refreshing so the check-in is not delayed
+            engine = get_checkin_engine()
+            self.timer = engine.call_at(self._get_checkin_time(), self._check_in)
+
+    def _set_check_in(self) -> None:
+        checkin_time = self._get_checkin_time()
 
         try:
             self._wait_for_check_in(checkin_time)
@@ -100,25 +193,25 @@ class CheckInHandler:
         if sleep_time > 0:
             logger.debug("Sleeping until thirty minutes before check-in...")
             self._safe_sleep(sleep_time)
-
-            # Lock to ensure multiple checkin handlers aren't refreshing headers
-            # at the same time (the webdriver doesn't work well with concurrency)
-            logger.debug("Acquiring lock...")
-            with self.lock:
-                logger.debug("Lock acquired")
-                try:
-                    self.checkin_scheduler.refresh_headers()
-                except DriverTimeoutError:
-                    logger.debug("Timeout while refreshing headers before check-in")
-                    self.notification_handler.timeout_before_checkin(self.flight)
-
-            logger.debug("Lock released")
+            self._refresh_headers()
             current_time = get_current_time()
 
         sleep_time = (checkin_time - current_time).total_seconds()
         logger.debug("Sleeping until check-in: %d seconds...", sleep_time)
         time.sleep(sleep_time)
 
+    def _refresh_headers(self) -> None:
+        # The scheduler locks the webdriver, so the lock must not be acquired here as well
+        try:
+            self.checkin_scheduler.refresh_headers(
+                BrowserPriority.CHECK_IN, self._get_checkin_time()
+            )
+        except DriverTimeoutError:
+            logger.debug("Timeout while refreshing headers before check-in")
+            self.notification_handler.timeout_before_checkin(self.flight)
+        finally:
+            self._unregister_check_in()
+
     def _safe_sleep(self, total_sleep_time: float) -> None:
         """
         If the total sleep time is too long, an overflow error could occur.
@@ -1,22 +1,41 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from datetime import timedelta
 from typing import TYPE_CHECKING, Any
 
+from .browser_arbiter import BrowserPriority
 from .checkin_handler import CheckInHandler
+from .cycle_cost import record_browser_session
 from .flight import Flight
 from .log import get_logger
+from .reservation_cache import get_cache_key
 from .utils import RequestError, get_current_time, make_request
 from .webdriver import WebDriver
 
 if TYPE_CHECKING:
+    from datetime import datetime
+
     from .reservation_monitor import ReservationMonitor
 
 VIEW_RESERVATION_URL = "mobile-air-booking/v1/mobile-air-booking/page/view-reservation/"
+# A cheap request that needs valid headers. Used to check if headers still work before launching a
+# browser to refresh them
+HEADERS_PROBE_URL = "mobile-air-booking/v1/mobile-air-booking/feature/shopping-details"
 logger = get_logger(__name__)
 
 FLIGHT_IN_PAST_CODE = 400520413
 
+# Status codes that mean the headers are no longer valid
+INVALID_HEADERS_STATUS_CODES = {401, 403}
+
+# Flights departing within this window of the previous flight on a reservation are same-day flights
+SAME_DAY_WINDOW = timedelta(hours=24)
+
+# The maximum number of reservations that are retrieved at the same time
+MAX_RETRIEVAL_WORKERS = 5
+
 
 class CheckInScheduler:
     """
@@ -32,22 +51,144 @@ class CheckInScheduler:
         self.flights = []
         self.checkin_handlers = []
 
-    def process_reservations(self, confirmation_numbers: list[str]) -> None:
+    def process_reservations(
+        self,
+        confirmation_numbers: list[str],
+        unchanged_confirmation_numbers: set[str] | None = None,
+    ) -> None:
         """
         Flights from all confirmation numbers are retrieved. Then, any new
         flights are scheduled and any flights now longer found are removed.
+
+        Reservations in unchanged_confirmation_numbers are not retrieved again. Instead, the
+        flights already scheduled for them are reused.
+
+        Reservations are retrieved concurrently, but the results are merged in the same order
+        as the confirmation numbers so scheduling behaves the same as retrieving them one by one.
         """
+        unchanged_confirmation_numbers = unchanged_confirmation_numbers or set()
+        retrieving = [
+            num for num in confirmation_numbers if num not in unchanged_confirmation_numbers
+        ]
+        logger.debug(
+            "Retrieving %d reservations (%d unchanged reservations skipped)",
+            len(retrieving),
+            len(confirmation_numbers) - len(retrieving),
+        )
+
+        retrieved_flights = {}
+        if len(retrieving) > 0:
+            max_workers = min(len(retrieving), MAX_RETRIEVAL_WORKERS)
+            # Each retrieval runs in a copy of this thread's context so its requests count towards
+            # the cost of the monitor's current cycle
+            contexts = [copy_context() for _ in retrieving]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # map() yields results in the order the confirmation numbers were submitted
+                results = executor.map(
+                    lambda context, number: context.run(self._get_flights_safely, number),
+                    contexts,
+                    retrieving,
+                )
+                retrieved_flights = dict(zip(retrieving, results))
+
         flights = []
+        current_time = None
         for confirmation_number in confirmation_numbers:
-            flights.extend(self._get_flights(confirmation_number))
+            if confirmation_number in retrieved_flights:
+                flights.extend(retrieved_flights[confirmation_number])
+            else:
+                current_time = current_time or get_current_time()
+                flights.extend(self._get_upcoming_flights(confirmation_number, current_time))
 
         logger.debug("%d total flights were found", len(flights))
+        self._set_same_day_flights(flights)
         self._update_scheduled_flights(flights)
 
-    def refresh_headers(self) -> None:
+    def refresh_headers(
+        self,
+        priority: BrowserPriority = BrowserPriority.ROUTINE,
+        checkin_time: datetime | None = None,
+    ) -> None:
+        """
+        Refresh the headers for the current session. Routine refreshes reuse headers another
+        monitor refreshed recently, or older headers if a probe shows they still work. Refreshes
+        before a check-in (when checkin_time is given) only reuse headers refreshed for a check-in
+        in the same window, so every check-in due around the same time shares one refresh.
+        """
         logger.debug("Refreshing headers for current session")
-        webdriver = WebDriver(self)
-        webdriver.set_headers()
+        header_store = self.reservation_monitor.header_store
+        if header_store is None:
+            self.headers = self._fetch_headers(priority)
+        elif checkin_time is not None:
+            window = self.reservation_monitor.config.check_in_refresh_window
+            self.headers = header_store.get_for_check_in(
+                checkin_time, window, lambda: self._fetch_headers(priority)
+            )
+        elif priority == BrowserPriority.CHECK_IN:
+            self.headers = self._fetch_headers(priority)
+            header_store.store(self.headers)
+        else:
+            self.headers = header_store.get(
+                lambda: self._fetch_headers(priority), self._are_headers_valid
+            )
+
+    def _fetch_headers(self, priority: BrowserPriority) -> dict[str, Any]:
+        """Launch a browser to get new headers"""
+        record_browser_session()
+        browser_pool = self.reservation_monitor.browser_pool
+
+        # Wait for a free browser slot. Each slot runs an isolated browser instance so browsers
+        # running at the same time don't conflict. With the browser pool, the slot is only used to
+        # decide who gets a worker next, as the worker runs its own browser instance
+        with self.reservation_monitor.lock.use(priority) as browser_slot:
+            if browser_pool is not None:
+                return browser_pool.refresh_headers(self.reservation_monitor.config)
+
+            webdriver = WebDriver(self, browser_slot)
+            webdriver.set_headers()
+
+        return self.headers
+
+    def _are_headers_valid(self, headers: dict[str, Any]) -> bool:
+        """
+        Probe the headers with a cheap request. Only a successful response means the headers are
+        valid, as any other response doesn't prove they still work.
+        """
+        try:
+            make_request("GET", HEADERS_PROBE_URL, headers, {}, max_attempts=1, random_sleep=False)
+        except RequestError as err:
+            logger.debug("Header probe failed: %s", err)
+            return False
+
+        return True
+
+    def _get_flights_safely(self, confirmation_number: str) -> list[Flight]:
+        """
+        Retrieve the flights for a single reservation without letting an unexpected error stop the
+        retrieval of the other reservations. If an error occurs, the flights that are already
+        scheduled for the reservation and have not departed are kept so their check-ins are not
+        cancelled.
+        """
+        try:
+            return self._get_flights(confirmation_number)
+        except Exception as err:
+            logger.exception("Unexpected error while retrieving reservation: %s", repr(err))
+            return self._get_upcoming_flights(confirmation_number, get_current_time())
+
+    def _get_scheduled_flights(self, confirmation_number: str) -> list[Flight]:
+        return [
+            flight for flight in self.flights if flight.confirmation_number == confirmation_number
+        ]
+
+    def _get_upcoming_flights(
+        self, confirmation_number: str, current_time: datetime
+    ) -> list[Flight]:
+        """Get the scheduled flights for a reservation that have not departed yet"""
+        return [
+            flight
+            for flight in self._get_scheduled_flights(confirmation_number)
+            if flight.departure_time > current_time
+        ]
 
     def _get_flights(self, confirmation_number: str) -> list[Flight]:
         """Get all flights booked on a single reservation"""
@@ -64,7 +205,6 @@ class CheckInScheduler:
             flight = Flight(flight_info, reservation_info, confirmation_number)
 
             if flight.departure_time > current_utc_time:
-                self._set_same_day_flight(flight, flights)
                 flights.append(flight)
 
         return flights
@@ -77,10 +217,27 @@ class CheckInScheduler:
         }
         site = VIEW_RESERVATION_URL + confirmation_number
 
+        def request_reservation() -> dict[str, Any]:
+            return make_request("POST", site, self.headers, info)
+
         try:
             logger.debug("Retrieving reservation information")
-            response = make_request("POST", site, self.headers, info)
+            reservation_cache = self.reservation_monitor.reservation_cache
+            if reservation_cache is None:
+                response = request_reservation()
+            else:
+                cache_key = get_cache_key(
+                    confirmation_number,
+                    self.reservation_monitor.first_name,
+                    self.reservation_monitor.last_name,
+                )
+                response = reservation_cache.get(cache_key, request_reservation)
         except RequestError as err:
+            header_store = self.reservation_monitor.header_store
+            if header_store is not None and err.status_code in INVALID_HEADERS_STATUS_CODES:
+                # The headers might have come from the store, so other monitors shouldn't use them
+                header_store.invalidate(self.headers)
+
             # Don't send a notification if flights have already been scheduled and all flights
             # from this reservation are old. This is how old flights are removed.
             if len(self.flights) == 0 or err.southwest_code != FLIGHT_IN_PAST_CODE:
@@ -94,12 +251,35 @@ class CheckInScheduler:
         logger.debug("Successfully retrieved reservation information")
         return response["viewReservationViewPage"]
 
-    def _set_same_day_flight(self, flight: Flight, previous_flights: list[Flight]) -> None:
-        for prev_flight in previous_flights:
-            if flight.departure_time - prev_flight.departure_time <= timedelta(hours=24):
+    def _set_same_day_flights(self, flights: list[Flight]) -> None:
+        """
+        Sweep through the flights from every reservation in order of departure and mark a flight
+        as same-day if it departs within 24 hours of the previous flight on its reservation.
+        Since the flights are sorted, only the previous flight needs to be compared.
+
+        Connecting flights booked under different confirmation numbers are detected too, but they
+        are not marked as same-day flights. Each reservation is checked in separately, so its
+        check-in never includes flights from the other reservation.
+        """
+        previous_departures = {}
+        previous_flight = None
+        for flight in sorted(flights, key=lambda flight: flight.departure_time):
+            previous_departure = previous_departures.get(flight.confirmation_number)
+            flight.is_same_day = (
+                previous_departure is not None
+                and flight.departure_time - previous_departure <= SAME_DAY_WINDOW
+            )
+
+            if flight.is_same_day:
                 logger.debug("Flight is on the same day")
-                flight.is_same_day = True
-                break
+            elif (
+                previous_flight is not None
+                and flight.departure_time - previous_flight.departure_time <= SAME_DAY_WINDOW
+            ):
+                logger.debug("Flight connects with a flight on another reservation")
+
+            previous_departures[flight.confirmation_number] = flight.departure_time
+            previous_flight = flight
 
     def _update_scheduled_flights(self, flights: list[Flight]) -> None:
         """
@@ -130,7 +310,7 @@ class CheckInScheduler:
     def _schedule_flights(self, flights: list[Flight]) -> None:
         logger.debug("Scheduling %d flights for check-in", len(flights))
         for flight in flights:
-            checkin_handler = CheckInHandler(self, flight, self.reservation_monitor.lock)
+            checkin_handler = CheckInHandler(self, flight)
             checkin_handler.schedule_check_in()
 
             self.flights.append(flight)
@@ -7,7 +7,13 @@ from pathlib import Path
 from typing import Any
 
 from .log import get_logger
-from .utils import CheckFaresOption, NotificationLevel, is_truthy
+from .utils import (
+    BrowserLoadProfile,
+    CheckFaresOption,
+    CheckInEngineOption,
+    NotificationLevel,
+    is_truthy,
+)
 
 # Type alias for JSON
 JSON = dict[str, Any]
@@ -27,10 +33,18 @@ class ConfigError(Exception):
 class Config:
     def __init__(self) -> None:
         # Default values are set
+        self.browser_load_profile = BrowserLoadProfile.FULL
         self.browser_path = None
         self.check_fares = CheckFaresOption.SAME_FLIGHT
+        self.check_in_engine = CheckInEngineOption.PROCESS
+        self.check_in_refresh_window = 5 * 60
+        self.driver_cache_ttl = 24 * 60 * 60
+        self.full_resync_interval = 24 * 60 * 60
         self.notifications = []
+        self.persist_login_session = False
         self.retrieval_interval = 24 * 60 * 60
+        # A list of (seconds before departure, retrieval interval in seconds) tuples
+        self.retrieval_interval_tiers = []
 
         # Account and reservation-specific configs (parsed in _parse_config, but not merged into
         # the global configuration).
@@ -65,9 +79,16 @@ class Config:
         Merging notification configs is done separately as an account or reservation config will
         use both globally configured notifications and account/reservation-specific notifications.
         """
+        self.browser_load_profile = global_config.browser_load_profile
         self.browser_path = global_config.browser_path
         self.check_fares = global_config.check_fares
+        self.check_in_engine = global_config.check_in_engine
+        self.check_in_refresh_window = global_config.check_in_refresh_window
+        self.driver_cache_ttl = global_config.driver_cache_ttl
+        self.full_resync_interval = global_config.full_resync_interval
+        self.persist_login_session = global_config.persist_login_session
         self.retrieval_interval = global_config.retrieval_interval
+        self.retrieval_interval_tiers = global_config.retrieval_interval_tiers
 
     def merge_notification_config(self, merging_config: Config) -> None:
         """
@@ -101,6 +122,20 @@ class Config:
 
             logger.debug("Setting check fares to %s", repr(self.check_fares))
 
+        if "full_resync_interval" in config:
+            self.full_resync_interval = config["full_resync_interval"]
+            logger.debug("Setting full resync interval to %s hours", self.full_resync_interval)
+
+            if (
+                not isinstance(self.full_resync_interval, int)
+                or isinstance(self.full_resync_interval, bool)
+                or self.full_resync_interval < 0
+            ):
+                raise ConfigError("'full_resync_interval' must be a non-negative integer")
+
+            # Convert hours to seconds
+            self.full_resync_interval *= 3600
+
         if "healthchecks_url" in config:
             self.healthchecks_url = config["healthchecks_url"]
 
@@ -109,6 +144,13 @@ class Config:
 
             logger.debug("A Healthchecks URL has been provided")
 
+        if "persist_login_session" in config:
+            self.persist_login_session = config["persist_login_session"]
+            logger.debug("Setting persist login session to %s", self.persist_login_session)
+
+            if not isinstance(self.persist_login_session, bool):
+                raise ConfigError("'persist_login_session' must be a boolean")
+
         if "retrieval_interval" in config:
             self.retrieval_interval = config["retrieval_interval"]
             logger.debug("Setting retrieval interval to %s hours", self.retrieval_interval)
@@ -126,6 +168,15 @@ class Config:
             # Convert hours to seconds
             self.retrieval_interval *= 3600
 
+        if "retrieval_interval_tiers" in config:
+            tiers = config["retrieval_interval_tiers"]
+
+            if not isinstance(tiers, list):
+                raise ConfigError("'retrieval_interval_tiers' must be a list")
+
+            self.retrieval_interval_tiers = self._parse_retrieval_interval_tiers(tiers)
+            logger.debug("Using %d retrieval interval tiers", len(self.retrieval_interval_tiers))
+
         if "notifications" in config:
             notifications = config["notifications"]
 
@@ -134,6 +185,28 @@ class Config:
 
             self._create_notification_config(notifications)
 
+    def _parse_retrieval_interval_tiers(self, tiers: list[JSON]) -> list[tuple[int, int]]:
+        """
+        Parse each tier into a tuple of (seconds before departure, retrieval interval in seconds).
+        The tiers are sorted so the tier closest to departure comes first.
+        """
+        parsed_tiers = []
+        for tier in tiers:
+            if not isinstance(tier, dict):
+                raise ConfigError("Every retrieval interval tier must be a dictionary")
+
+            for key in ["departure_within", "interval"]:
+                if key not in tier:
+                    raise ConfigError(f"'{key}' must be in every retrieval interval tier")
+
+                if not isinstance(tier[key], int) or tier[key] < 1:
+                    raise ConfigError(f"'{key}' in retrieval interval tier must be at least 1")
+
+            # Convert hours to seconds
+            parsed_tiers.append((tier["departure_within"] * 3600, tier["interval"] * 3600))
+
+        return sorted(parsed_tiers)
+
     def _create_notification_config(self, notifications: list[JSON]) -> None:
         logger.debug("Creating configurations for %d notifications", len(notifications))
         for notification_json in notifications:
@@ -147,6 +220,13 @@ class GlobalConfig(Config):
     def __init__(self) -> None:
         super().__init__()
         self.accounts = []
+        self.browser_instances = 1
+        self.browser_session_max_memory_growth = 512 * 1024 * 1024
+        self.browser_session_max_uses = 0
+        self.browser_workers = 0
+        self.check_in_quiet_window = 2 * 60
+        self.daily_browser_session_budget = 0
+        self.daily_request_budget = 0
         self.reservations = []
 
     def initialize(self) -> None:
@@ -296,6 +376,132 @@ class GlobalConfig(Config):
             if not isinstance(self.browser_path, str):
                 raise ConfigError("'browser_path' must be a string")
 
+        if "browser_load_profile" in config:
+            load_profile = config["browser_load_profile"]
+
+            try:
+                self.browser_load_profile = BrowserLoadProfile(load_profile)
+            except ValueError as err:
+                raise ConfigError(f"'{load_profile}' is not a valid browser load profile") from err
+
+            logger.debug("Setting browser load profile to %s", repr(self.browser_load_profile))
+
+        if "check_in_engine" in config:
+            check_in_engine = config["check_in_engine"]
+
+            try:
+                self.check_in_engine = CheckInEngineOption(check_in_engine)
+            except ValueError as err:
+                raise ConfigError(f"'{check_in_engine}' is not a valid check-in engine") from err
+
+            logger.debug("Setting check-in engine to %s", repr(self.check_in_engine))
+
+        if "check_in_refresh_window" in config:
+            self.check_in_refresh_window = config["check_in_refresh_window"]
+            logger.debug(
+                "Setting check-in refresh window to %s minutes", self.check_in_refresh_window
+            )
+
+            if (
+                not isinstance(self.check_in_refresh_window, int)
+                or isinstance(self.check_in_refresh_window, bool)
+                or self.check_in_refresh_window < 0
+            ):
+                raise ConfigError("'check_in_refresh_window' must be a non-negative integer")
+
+            # Convert minutes to seconds
+            self.check_in_refresh_window *= 60
+
+        if "driver_cache_ttl" in config:
+            self.driver_cache_ttl = config["driver_cache_ttl"]
+            logger.debug("Setting driver cache TTL to %s hours", self.driver_cache_ttl)
+
+            if (
+                not isinstance(self.driver_cache_ttl, int)
+                or isinstance(self.driver_cache_ttl, bool)
+                or self.driver_cache_ttl < 0
+            ):
+                raise ConfigError("'driver_cache_ttl' must be a non-negative integer")
+
+            # Convert hours to seconds
+            self.driver_cache_ttl *= 3600
+
+        if "browser_workers" in config:
+            self.browser_workers = config["browser_workers"]
+            logger.debug("Setting browser workers to %s", self.browser_workers)
+
+            is_valid_int = (
+                isinstance(self.browser_workers, int)
+                and not isinstance(self.browser_workers, bool)
+                and self.browser_workers >= 0
+            )
+            if not is_valid_int and self.browser_workers != "auto":
+                raise ConfigError("'browser_workers' must be a non-negative integer or 'auto'")
+
+        if "browser_session_max_uses" in config:
+            self.browser_session_max_uses = config["browser_session_max_uses"]
+            logger.debug("Setting browser session max uses to %s", self.browser_session_max_uses)
+
+            if (
+                not isinstance(self.browser_session_max_uses, int)
+                or isinstance(self.browser_session_max_uses, bool)
+                or self.browser_session_max_uses < 0
+            ):
+                raise ConfigError("'browser_session_max_uses' must be a non-negative integer")
+
+        if "browser_session_max_memory_growth" in config:
+            max_memory_growth = config["browser_session_max_memory_growth"]
+            logger.debug("Setting browser session max memory growth to %s MB", max_memory_growth)
+
+            if (
+                not isinstance(max_memory_growth, int)
+                or isinstance(max_memory_growth, bool)
+                or max_memory_growth < 0
+            ):
+                raise ConfigError(
+                    "'browser_session_max_memory_growth' must be a non-negative integer"
+                )
+
+            # Convert MB to bytes
+            self.browser_session_max_memory_growth = max_memory_growth * 1024 * 1024
+
+        if "browser_instances" in config:
+            self.browser_instances = config["browser_instances"]
+            logger.debug("Setting browser instances to %s", self.browser_instances)
+
+            if (
+                not isinstance(self.browser_instances, int)
+                or isinstance(self.browser_instances, bool)
+                or self.browser_instances < 1
+            ):
+                raise ConfigError("'browser_instances' must be a positive integer")
+
+        if "check_in_quiet_window" in config:
+            self.check_in_quiet_window = config["check_in_quiet_window"]
+            logger.debug("Setting check-in quiet window to %s minutes", self.check_in_quiet_window)
+
+            if (
+                not isinstance(self.check_in_quiet_window, int)
+                or isinstance(self.check_in_quiet_window, bool)
+                or self.check_in_quiet_window < 0
+            ):
+                raise ConfigError("'check_in_quiet_window' must be a non-negative integer")
+
+            # Convert minutes to seconds
+            self.check_in_quiet_window *= 60
+
+        for budget_key in ["daily_request_budget", "daily_browser_session_budget"]:
+            if budget_key not in config:
+                continue
+
+            budget = config[budget_key]
+            logger.debug("Setting %s to %s", budget_key.replace("_", " "), budget)
+
+            if not isinstance(budget, int) or isinstance(budget, bool) or budget < 0:
+                raise ConfigError(f"'{budget_key}' must be a non-negative integer")
+
+            setattr(self, budget_key, budget)
+
         if "accounts" in config:
             accounts = config["accounts"]
 
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class CycleCost:
+    """The Southwest API requests and browser sessions used by one cycle of a monitor"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.browser_sessions = 0
+        self.fare_check_requests = 0
+        self.checked_fares = False
+        self.checking_fares = False
+
+
+# The cost of the cycle the current monitor is running, if it is being measured
+current_cycle_cost: ContextVar[CycleCost | None] = ContextVar("current_cycle_cost", default=None)
+
+
+@contextmanager
+def measure_cycle() -> Iterator[CycleCost]:
+    cycle_cost = CycleCost()
+    token = current_cycle_cost.set(cycle_cost)
+    try:
+        yield cycle_cost
+    finally:
+        current_cycle_cost.reset(token)
+
+
+@contextmanager
+def measure_fare_checks() -> Iterator[None]:
+    """Count the requests made while checking fares separately from the rest of the cycle"""
+    cycle_cost = current_cycle_cost.get()
+    if cycle_cost is None:
+        yield
+        return
+
+    cycle_cost.checking_fares = True
+    try:
+        yield
+    finally:
+        cycle_cost.checking_fares = False
+        cycle_cost.checked_fares = True
+
+
+def record_request() -> None:
+    cycle_cost = current_cycle_cost.get()
+    if cycle_cost is None:
+        return
+
+    if cycle_cost.checking_fares:
+        cycle_cost.fare_check_requests += 1
+    else:
+        cycle_cost.requests += 1
+
+
+def record_browser_session() -> None:
+    cycle_cost = current_cycle_cost.get()
+    if cycle_cost is not None:
+        cycle_cost.browser_sessions += 1
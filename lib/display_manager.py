@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import threading
+import time
+
+from .log import get_logger
+
+DISPLAY_SIZE = (1440, 1880)
+COLOR_DEPTH = 24
+
+XVFB_PROGRAM = "Xvfb"
+
+# How long to wait for a started X server to accept connections
+DISPLAY_START_TIMEOUT_SECS = 10
+DISPLAY_START_POLL_INTERVAL_SECS = 0.1
+
+# How long a stopped X server has to exit before it is killed
+DISPLAY_STOP_TIMEOUT_SECS = 5
+
+# Each browser slot uses its own display. The display number is offset from this by the slot
+BASE_DISPLAY_NUMBER = 1100
+
+# Every running X server writes its process ID to a lock file for its display number
+X_LOCK_FILE = "/tmp/.X{}-lock"
+
+logger = get_logger(__name__)
+
+_display_manager = None
+_display_manager_lock = threading.Lock()
+
+
+def get_display_manager() -> DisplayManager:
+    """Return the display manager for the current process"""
+    global _display_manager
+
+    with _display_manager_lock:
+        if _display_manager is None:
+            _display_manager = DisplayManager()
+
+        return _display_manager
+
+
+def get_display_number(browser_slot: int) -> int:
+    return BASE_DISPLAY_NUMBER + browser_slot
+
+
+def is_display_running(display_number: int) -> bool:
+    """
+    Check if an X server is running on the display. The lock file is checked instead of the
+    Display object so displays started by another process (e.g. the main process) are found too.
+    """
+    try:
+        with open(X_LOCK_FILE.format(display_number)) as lock_file:
+            pid = int(lock_file.read().strip())
+    except (OSError, ValueError):
+        return False
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        # The X server exited without removing its lock file
+        return False
+    except PermissionError:
+        # The process exists but is owned by another user
+        return True
+
+    return True
+
+
+class SlotDisplay:
+    """
+    A virtual display (an Xvfb server) with a fixed display number. sbvirtualdisplay always chooses
+    the display number itself and its choice is not coordinated between processes, so browsers
+    started at the same time could share a display. Xvfb is started directly instead.
+    """
+
+    def __init__(self, display_number: int, size: tuple[int, int] = DISPLAY_SIZE) -> None:
+        self.display_number = display_number
+        self.size = size
+        self.process = None
+
+    @property
+    def pid(self) -> int | None:
+        return None if self.process is None else self.process.pid
+
+    def get_command(self) -> list[str]:
+        width, height = self.size
+        return [
+            XVFB_PROGRAM,
+            f":{self.display_number}",
+            "-screen",
+            "0",
+            f"{width}x{height}x{COLOR_DEPTH}",
+            "-nolisten",
+            "tcp",
+            "-br",
+        ]
+
+    def start(self) -> None:
+        """Start the X server and wait until it is running or it exits"""
+        self.process = subprocess.Popen(
+            self.get_command(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+        deadline = time.monotonic() + DISPLAY_START_TIMEOUT_SECS
+        while self.is_alive() and time.monotonic() < deadline:
+            if is_display_running(self.display_number):
+                return
+
+            time.sleep(DISPLAY_START_POLL_INTERVAL_SECS)
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self) -> None:
+        if self.process is None:
+            return
+
+        self.process.terminate()
+        try:
+            self.process.wait(DISPLAY_STOP_TIMEOUT_SECS)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class DisplayManager:
+    """
+    Keeps a long-lived virtual display running for each browser slot. Displays are started once
+    (when the script starts) and leased to every browser using the slot, instead of each browser
+    starting and stopping its own display. A display is only restarted when its X server is no
+    longer running.
+
+    Displays are shared with child processes through their display number, so a display started
+    in the main process can be leased in any monitor, check-in, or browser worker process.
+    """
+
+    def __init__(self) -> None:
+        # Display number -> display started by this process
+        self.displays = {}
+        self.lock = threading.Lock()
+
+    def start_displays(self, num_slots: int) -> None:
+        logger.debug("Starting %d virtual displays", num_slots)
+        for browser_slot in range(num_slots):
+            self.lease(browser_slot)
+
+    def lease(self, browser_slot: int) -> int:
+        """
+        Return the display number for the browser slot, starting or restarting its display if it
+        isn't running. Only one browser uses a slot at a time, so the display never needs to be
+        returned.
+        """
+        display_number = get_display_number(browser_slot)
+        with self.lock:
+            if is_display_running(display_number):
+                logger.debug("Reusing virtual display :%d", display_number)
+                return display_number
+
+            self._start_display(display_number)
+
+        return display_number
+
+    def _start_display(self, display_number: int) -> None:
+        try:
+            old_display = self.displays.pop(display_number, None)
+            if old_display is not None:
+                logger.debug("Virtual display :%d is unhealthy. Restarting it", display_number)
+                old_display.stop()
+
+            display = SlotDisplay(display_number)
+            display.start()
+            self.displays[display_number] = display
+
+            if display.is_alive():
+                logger.debug("Started virtual display :%d successfully", display_number)
+            else:
+                logger.debug("Started virtual display :%d but is not active", display_number)
+        except Exception as e:
+            logger.debug("Failed to start display :%d: %s", display_number, e)
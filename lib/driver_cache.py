@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from seleniumbase.core import detect_b_ver
+
+from .log import get_logger
+from .utils import atomic_write_json
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+# Shared by every process (and every run of the script) on the host
+DRIVER_CACHE_FILE = Path(tempfile.gettempdir()) / "auto-southwest-check-in" / "driver_cache.json"
+
+logger = get_logger(__name__)
+
+
+def get_browser_fingerprint(browser_path: str | None) -> str | None:
+    """
+    Identify the browser binary by its path, modification time, and size. These change whenever
+    the browser is updated, so a new fingerprint means the driver needs to be resolved again.
+    Returns None if the browser binary can't be found.
+    """
+    if browser_path is None:
+        # Find the browser the same way the webdriver does when no path is configured
+        try:
+            browser_path = detect_b_ver.get_binary_location("google-chrome", chromium_ok=True)
+        except Exception as e:
+            logger.debug("Unable to locate browser binary: %s", e)
+            return None
+
+    try:
+        stat = os.stat(browser_path)
+    except (OSError, TypeError):
+        return None
+
+    return f"{os.path.realpath(browser_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class DriverCache:
+    """
+    An on-disk cache of the driver resolved for each browser binary. While an entry is fresh, the
+    driver already downloaded is used as is, so the browser starts without checking for a matching
+    driver (which needs network access).
+
+    An entry is revalidated once the browser binary changes (e.g. the browser updated) or the TTL
+    expires. A TTL of 0 disables the cache.
+
+    Every process reads and writes the same file. Writes replace the file atomically, so a process
+    never reads a partially written cache. If two processes write at the same time, one of the
+    entries might be lost, which only means the driver is resolved once more.
+    """
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        self.cache_file = DRIVER_CACHE_FILE
+
+    def get(self, browser_path: str | None) -> JSON | None:
+        """Return the cached resolution for the browser if it is still valid"""
+        if self.ttl <= 0:
+            return None
+
+        fingerprint = get_browser_fingerprint(browser_path)
+        if fingerprint is None:
+            return None
+
+        entry = self._read().get(fingerprint)
+        if entry is None:
+            logger.debug("No cached driver for the browser binary")
+            return None
+
+        if time.time() - entry.get("resolved_at", 0) >= self.ttl:
+            logger.debug("Cached driver has expired")
+            return None
+
+        logger.debug("Using cached driver for browser %s", entry.get("browser_version"))
+        return entry
+
+    def store(self, browser_path: str | None, browser_version: str, driver_version: str) -> None:
+        if self.ttl <= 0:
+            return
+
+        fingerprint = get_browser_fingerprint(browser_path)
+        if fingerprint is None:
+            return
+
+        entries = self._read()
+        entries[fingerprint] = {
+            "browser_version": browser_version,
+            "driver_version": driver_version,
+            "resolved_at": time.time(),
+        }
+        self._write(entries)
+        logger.debug("Cached driver %s for browser %s", driver_version, browser_version)
+
+    def invalidate(self, browser_path: str | None) -> None:
+        fingerprint = get_browser_fingerprint(browser_path)
+        entries = self._read()
+        if entries.pop(fingerprint, None) is not None:
+            self._write(entries)
+            logger.debug("Invalidated cached driver")
+
+    def _read(self) -> JSON:
+        try:
+            with open(self.cache_file) as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+        return entries if isinstance(entries, dict) else {}
+
+    def _write(self, entries: JSON) -> None:
+        try:
+            atomic_write_json(self.cache_file, entries)
+        except OSError as e:
+            logger.debug("Failed to write driver cache: %s", e)
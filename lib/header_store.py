@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import multiprocessing
+import time
+from typing import TYPE_CHECKING, Any
+
+from .in_flight import InFlightRequests
+from .log import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from datetime import datetime
+    from multiprocessing.managers import SyncManager
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+# How long refreshed headers can be reused by other monitors before a browser is launched again
+HEADERS_TTL_SECS = 10 * 60
+
+# How long refreshes wait for another monitor's refresh before launching their own browser. This
+# includes the time the refresh waits for a browser slot
+REFRESH_TIMEOUT_SECS = 5 * 60
+
+# The store holds the latest headers from any refresh and, for every check-in window, the
+# headers from the latest refresh before a check-in in that window
+HEADERS_KEY = "headers"
+CHECK_IN_HEADERS_KEY = "check_in_headers"
+
+# Check-ins are due soon, so they stop waiting for another check-in's refresh much sooner
+CHECK_IN_REFRESH_TIMEOUT_SECS = 2 * 60
+
+logger = get_logger(__name__)
+
+
+def get_check_in_key(window_idx: int) -> str:
+    """Return the key the headers refreshed for a check-in in the window are stored under"""
+    return f"{CHECK_IN_HEADERS_KEY}:{window_idx}"
+
+
+class HeaderStore:
+    """
+    A host-wide store of the most recently refreshed headers, shared between every monitor and
+    check-in process. Monitors reuse the stored headers while they are fresh instead of launching
+    a browser to refresh their own.
+
+    Concurrent refreshes are coalesced: the first refresh launches a browser and every other
+    refresh waits for it and then uses the stored headers (see InFlightRequests). No lock is held
+    while refreshing, so a refresh that is killed or stuck never blocks the other monitors.
+
+    Header refreshes before a check-in are grouped: check-ins due within a window of each other
+    use the headers from the group's first refresh, so only one browser is launched for the group.
+    Time is split into windows and each window is coalesced on its own, so check-ins in other
+    windows refresh at the same time instead of waiting for the group.
+
+    Expired headers are probed with a cheap request before a browser is launched. If they still
+    work, they are reused for another TTL.
+
+    Only headers from loading the check-in page are stored. Headers from logging into an account
+    are specific to that account, so they are never shared.
+
+    If no manager is given, a regular dictionary is used. This is only safe when every monitor
+    runs in the same process (e.g. with the asyncio check-in engine).
+    """
+
+    def __init__(self, manager: SyncManager | None, ttl: int = HEADERS_TTL_SECS) -> None:
+        self.ttl = ttl
+
+        # HEADERS_KEY -> (time the headers were refreshed, headers)
+        # Check-in window key -> (time of the check-in the headers were refreshed for, headers)
+        self.entries = {} if manager is None else manager.dict()
+        self.in_flight = InFlightRequests(manager, REFRESH_TIMEOUT_SECS)
+        # Separate from routine refreshes so check-ins never wait for them
+        self.check_in_in_flight = InFlightRequests(manager, CHECK_IN_REFRESH_TIMEOUT_SECS)
+
+        # Probe statistics shared between every process using the store
+        self.num_probes = multiprocessing.Value("i", 0)
+        self.num_valid_probes = multiprocessing.Value("i", 0)
+
+    def get(self, refresh: Callable[[], JSON], probe: Callable[[JSON], bool] | None = None) -> JSON:
+        """
+        Return the stored headers if they have not expired. Expired headers are reused if the
+        probe says they are still valid. Otherwise, refresh the headers and store them. Failed
+        refreshes are not stored.
+        """
+
+        def probe_or_refresh() -> JSON:
+            entry = self.entries.get(HEADERS_KEY)
+            if entry is not None and probe is not None and self._probe(entry[1], probe):
+                # Restart the TTL so the headers aren't probed again on every refresh
+                self.entries[HEADERS_KEY] = (time.time(), entry[1])
+                return entry[1]
+
+            headers = refresh()
+            self.store(headers)
+            return headers
+
+        return self.in_flight.get(HEADERS_KEY, self._get_fresh_headers, probe_or_refresh)
+
+    def get_for_check_in(
+        self, checkin_time: datetime, window: int, refresh: Callable[[], JSON]
+    ) -> JSON:
+        """
+        Return the headers refreshed for another check-in due within the window (in seconds) of
+        this check-in. Otherwise, refresh the headers and store them for the check-ins after this
+        one. Check-ins refreshing at the same time wait for the first refresh to finish.
+        """
+        timestamp = checkin_time.timestamp()
+        window_idx = int(timestamp // max(window, 1))
+
+        def get_group_headers() -> JSON | None:
+            # Check-ins close to the edge of a window can share headers with the next window
+            for idx in (window_idx, window_idx - 1, window_idx + 1):
+                entry = self.entries.get(get_check_in_key(idx))
+                if entry is not None and abs(timestamp - entry[0]) <= window:
+                    logger.debug("Using headers refreshed for a check-in in the same window")
+                    return entry[1]
+
+            return None
+
+        def refresh_for_group() -> JSON:
+            headers = refresh()
+            if len(headers) > 0:
+                self._evict_check_in_entries(window)
+                self.entries[get_check_in_key(window_idx)] = (timestamp, headers)
+
+            self.store(headers)
+            return headers
+
+        return self.check_in_in_flight.get(
+            get_check_in_key(window_idx), get_group_headers, refresh_for_group
+        )
+
+    def _get_fresh_headers(self) -> JSON | None:
+        entry = self.entries.get(HEADERS_KEY)
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            logger.debug("Using stored headers from %.1f seconds ago", time.time() - entry[0])
+            return entry[1]
+
+        return None
+
+    def get_stats(self) -> JSON:
+        num_probes = self.num_probes.value
+        num_valid_probes = self.num_valid_probes.value
+        return {
+            "probes": num_probes,
+            # Every valid probe is a browser launch that was saved
+            "browser_launches_saved": num_valid_probes,
+            "hit_rate": num_valid_probes / max(num_probes, 1),
+        }
+
+    def _probe(self, headers: JSON, probe: Callable[[JSON], bool]) -> bool:
+        is_valid = probe(headers)
+
+        with self.num_probes.get_lock():
+            self.num_probes.value += 1
+        if is_valid:
+            with self.num_valid_probes.get_lock():
+                self.num_valid_probes.value += 1
+
+        logger.debug("Expired headers are %s", "still valid" if is_valid else "no longer valid")
+        logger.debug("Header probe stats: %s", self.get_stats())
+        return is_valid
+
+    def invalidate(self, headers: JSON) -> None:
+        """
+        Remove the headers from the store after they were rejected. Headers refreshed since then
+        are kept.
+        """
+        for key, entry in list(self.entries.items()):
+            if entry[1] == headers:
+                self.entries.pop(key, None)
+                logger.debug("Removed rejected headers from the store")
+
+    def _evict_check_in_entries(self, window: int) -> None:
+        """Remove the headers of check-in windows that are over"""
+        current_time = time.time()
+        for key, entry in list(self.entries.items()):
+            if key.startswith(CHECK_IN_HEADERS_KEY) and current_time - entry[0] > window:
+                self.entries.pop(key, None)
+
+    def store(self, headers: JSON) -> None:
+        """Store newly refreshed headers so other monitors can reuse them"""
+        if len(headers) == 0:
+            return
+
+        self.entries[HEADERS_KEY] = (time.time(), headers)
+        logger.debug("Stored refreshed headers")
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, TypeVar
+
+from .browser_governor import is_process_running, read_start_time
+from .log import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from multiprocessing.managers import SyncManager
+
+T = TypeVar("T")
+
+# How often processes waiting for another process's request check whether it finished
+POLL_INTERVAL_SECS = 1
+
+# The lock is only held for a few dictionary lookups, so not getting it in this time means its
+# holder was killed while holding it
+LOCK_TIMEOUT_SECS = 10
+
+logger = get_logger(__name__)
+
+
+class InFlightRequests:
+    """
+    Coalesces concurrent requests for the same key between processes without holding a lock while
+    requesting. The first process to miss marks the key as in flight with its process ID and start
+    time, makes the request, and removes the mark once the result is stored. Every other process
+    polls until the result is stored or the mark is removed (e.g. the request failed) and then
+    looks again.
+
+    A mark is taken over once its process no longer exists or its request has been running for
+    longer than the timeout, so a process that was killed or is stuck never blocks the others.
+
+    If no manager is given, a regular dictionary is used. This is only safe when every caller runs
+    in the same process (e.g. with the asyncio check-in engine).
+    """
+
+    def __init__(self, manager: SyncManager | None, timeout: float) -> None:
+        self.timeout = timeout
+
+        # Key -> (process ID, process start time, thread ID, time the request started)
+        self.marks = {} if manager is None else manager.dict()
+        self.lock = multiprocessing.Lock()
+
+    def get(self, key: str, get_result: Callable[[], T | None], request: Callable[[], T]) -> T:
+        """
+        Return the result from get_result if there is one. Otherwise, make the request unless
+        another process is already making it. The request must store its result so get_result
+        returns it.
+        """
+        owner_pid = os.getpid()
+        mark = (owner_pid, read_start_time(owner_pid) or 0, threading.get_ident(), 0.0)
+        while True:
+            if not self.lock.acquire(timeout=LOCK_TIMEOUT_SECS):
+                logger.warning("Timeout waiting for the in-flight lock. Requesting without it")
+                return request()
+
+            try:
+                result = get_result()
+                if result is not None:
+                    return result
+
+                current_mark = self.marks.get(key)
+                if current_mark is None or self._is_abandoned(current_mark):
+                    mark = (*mark[:3], time.time())
+                    self.marks[key] = mark
+                    break
+            finally:
+                self.lock.release()
+
+            time.sleep(POLL_INTERVAL_SECS)
+
+        try:
+            return request()
+        finally:
+            # The mark might have been taken over if the request took too long
+            if self.marks.get(key) == mark:
+                self.marks.pop(key, None)
+
+    def _is_abandoned(self, mark: tuple[int, int, int, float]) -> bool:
+        pid, start_time, _, started_at = mark
+        if time.time() - started_at > self.timeout:
+            logger.debug("Taking over a request that has been running for too long")
+            return True
+
+        # Without a start time (e.g. /proc is not available), only the timeout is used
+        if start_time != 0 and not is_process_running(pid, start_time):
+            logger.debug("Taking over a request of a process that no longer exists")
+            return True
+
+        return False
@@ -5,13 +5,25 @@ from __future__ import annotations
 import multiprocessing
 import os
 import sys
+import threading
 
 import requests
 
 from lib import log
 
+from .browser_arbiter import BrowserArbiter
+from .browser_governor import PROC_DIRECTORY, BrowserReaper
+from .browser_pool import BrowserPool, get_auto_num_workers
+from .budget_planner import BudgetPlanner
+from .checkin_engine import get_checkin_engine
 from .config import IS_DOCKER, GlobalConfig, ReservationConfig
-from .reservation_monitor import AccountMonitor, ReservationMonitor
+from .display_manager import get_display_manager
+from .header_store import HeaderStore
+from .phase_timings import print_phase_timings
+from .reservation_cache import ReservationCache
+from .reservation_monitor import MONITOR_NAME, AccountMonitor, ReservationMonitor
+from .stagger_planner import StaggerPlanner
+from .utils import CheckInEngineOption
 
 IP_TIMEZONE_URL = "https://ipinfo.io/timezone"
 LOG_FILE = "logs/auto-southwest-check-in.log"
@@ -56,18 +68,95 @@ def pluralize(word: str, count: int) -> str:
     return word if count == 1 else word + "s"
 
 
-def set_up_accounts(config: GlobalConfig, lock: multiprocessing.Lock) -> None:
+def set_up_displays(num_slots: int) -> None:
+    """
+    Start a long-lived virtual display for each browser slot in Docker so browsers don't have to
+    start their own. The displays are started before any child process so every process can use
+    them
+    """
+    if IS_DOCKER:
+        get_display_manager().start_displays(num_slots)
+
+
+def set_up_browser_reaper(lock: BrowserArbiter) -> None:
+    """
+    Reap browsers and release browser slots left behind by processes that were killed or
+    crashed. Processes can only be found through /proc, so this is skipped on systems without it
+    (e.g. Windows)
+    """
+    if os.path.isdir(PROC_DIRECTORY):
+        BrowserReaper(lock).start()
+
+
+def set_up_browser_pool(config: GlobalConfig) -> BrowserPool | None:
+    if config.browser_workers == 0:
+        logger.debug("Browser pool is disabled. Browsers are run by each process")
+        return None
+
+    num_workers = config.browser_workers
+    if num_workers == "auto":
+        num_workers = get_auto_num_workers()
+
+    # Each browser worker uses its index as its browser slot
+    set_up_displays(num_workers)
+
+    browser_pool = BrowserPool(
+        num_workers, config.browser_session_max_uses, config.browser_session_max_memory_growth
+    )
+    browser_pool.start()
+    return browser_pool
+
+
+def set_up_accounts(
+    config: GlobalConfig,
+    lock: BrowserArbiter,
+    reservation_cache: ReservationCache,
+    browser_pool: BrowserPool | None,
+    header_store: HeaderStore,
+    stagger_planner: StaggerPlanner | None = None,
+    budget_planner: BudgetPlanner | None = None,
+) -> None:
     for account in config.accounts:
-        account_monitor = AccountMonitor(account, lock)
+        account_monitor = AccountMonitor(
+            account, lock, reservation_cache, browser_pool, header_store
+        )
+        if stagger_planner is not None:
+            account_monitor.start_delay, account_monitor.phase = stagger_planner.get_stagger(
+                account
+            )
+        account_monitor.budget_planner = budget_planner
         account_monitor.start()
 
 
-def set_up_reservations(config: GlobalConfig, lock: multiprocessing.Lock) -> None:
+def set_up_reservations(
+    config: GlobalConfig,
+    lock: BrowserArbiter,
+    reservation_cache: ReservationCache,
+    browser_pool: BrowserPool | None,
+    header_store: HeaderStore,
+    stagger_planner: StaggerPlanner | None = None,
+    budget_planner: BudgetPlanner | None = None,
+) -> None:
     for reservation in config.reservations:
-        reservation_monitor = ReservationMonitor(reservation, lock)
+        reservation_monitor = ReservationMonitor(
+            reservation, lock, reservation_cache, browser_pool, header_store
+        )
+        if stagger_planner is not None:
+            reservation_monitor.start_delay, reservation_monitor.phase = (
+                stagger_planner.get_stagger(reservation)
+            )
+        reservation_monitor.budget_planner = budget_planner
         reservation_monitor.start()
 
 
+def set_up_budget_planner(config: GlobalConfig) -> BudgetPlanner | None:
+    """Only plan schedules when a daily budget is configured"""
+    if config.daily_request_budget <= 0 and config.daily_browser_session_budget <= 0:
+        return None
+
+    return BudgetPlanner(config, config.accounts + config.reservations)
+
+
 def set_up_check_in(arguments: list[str]) -> None:
     """
     Initialize reservation and account monitoring based on the configuration
@@ -75,6 +164,11 @@ def set_up_check_in(arguments: list[str]) -> None:
     """
     logger.debug("Called with %d arguments", len(arguments))
 
+    if "--phase-timings" in arguments:
+        # Doesn't need a configuration, so it is handled before the configuration is read
+        print_phase_timings()
+        sys.exit()
+
     config = GlobalConfig()
     config.initialize()
 
@@ -107,14 +201,75 @@ def set_up_check_in(arguments: list[str]) -> None:
         pluralize("reservation", num_reservations),
     )
 
-    lock = multiprocessing.Lock()
-    set_up_accounts(config, lock)
-    set_up_reservations(config, lock)
+    browser_pool = set_up_browser_pool(config)
+    if browser_pool is None:
+        set_up_displays(config.browser_instances)
 
-    # Keep the main process alive until all processes are done so it can handle
-    # keyboard interrupts
+    # Decides which process uses a browser (or browser worker) next, giving check-ins priority
+    num_slots = config.browser_instances if browser_pool is None else browser_pool.num_workers
+    lock = BrowserArbiter(
+        num_slots, config.check_in_quiet_window, num_monitors=num_accounts + num_reservations
+    )
+    set_up_browser_reaper(lock)
+
+    # Spreads the monitors' checks over the retrieval interval so they don't all start a browser
+    # at the same time
+    stagger_planner = StaggerPlanner(config.accounts + config.reservations)
+    budget_planner = set_up_budget_planner(config)
+
+    if config.check_in_engine == CheckInEngineOption.ASYNCIO:
+        set_up_check_in_engine(config, lock, browser_pool, stagger_planner, budget_planner)
+        return
+
+    # The manager shares reservation responses and headers between every monitor process
+    manager = multiprocessing.Manager()
+    reservation_cache = ReservationCache(manager)
+    header_store = HeaderStore(manager)
+
+    set_up_accounts(
+        config, lock, reservation_cache, browser_pool, header_store, stagger_planner, budget_planner
+    )
+    set_up_reservations(
+        config, lock, reservation_cache, browser_pool, header_store, stagger_planner, budget_planner
+    )
+
+    # Keep the main process alive until all monitor processes are done so it can handle
+    # keyboard interrupts. The manager and browser workers run until the main process exits
     for process in multiprocessing.active_children():
-        process.join()
+        if process.name == MONITOR_NAME:
+            process.join()
+
+
+def set_up_check_in_engine(
+    config: GlobalConfig,
+    lock: BrowserArbiter,
+    browser_pool: BrowserPool | None,
+    stagger_planner: StaggerPlanner | None = None,
+    budget_planner: BudgetPlanner | None = None,
+) -> None:
+    """
+    Run every monitor in a thread and every check-in in the check-in engine, all in the main
+    process. A manager is not needed to share the reservation cache and headers as there is only
+    one process.
+    """
+    logger.debug("Using the asyncio check-in engine")
+    engine = get_checkin_engine()
+    reservation_cache = ReservationCache(None)
+    header_store = HeaderStore(None)
+
+    set_up_accounts(
+        config, lock, reservation_cache, browser_pool, header_store, stagger_planner, budget_planner
+    )
+    set_up_reservations(
+        config, lock, reservation_cache, browser_pool, header_store, stagger_planner, budget_planner
+    )
+
+    # Keep the main process alive until all monitors and check-ins are done
+    for thread in threading.enumerate():
+        if thread.name == MONITOR_NAME:
+            thread.join()
+
+    engine.wait_until_idle()
 
 
 def main(arguments: list[str], version: str) -> None:
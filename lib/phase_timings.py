@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .browser_governor import get_process_tree_memory
+from .log import LOGS_DIRECTORY, get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+# Every browser session appends one JSON record per line. Once the file grows past the maximum
+# size, it is moved to a backup file so only the recent sessions are kept
+PHASE_TIMINGS_FILE = "phase_timings.jsonl"
+MAX_PHASE_TIMINGS_FILE_SIZE = 2 * 1024 * 1024
+
+PERCENTILES = [50, 90, 99]
+
+logger = get_logger(__name__)
+
+
+def get_phase_timings_path() -> Path:
+    return Path(LOGS_DIRECTORY) / PHASE_TIMINGS_FILE
+
+
+class PhaseTimer:
+    """
+    Records how long each phase of a browser session takes (e.g. starting the driver or waiting
+    for headers) and the peak memory of the browser's process tree. A phase run more than once in
+    a session is summed. The record is written once the session is done.
+    """
+
+    def __init__(self, operation: str | None = None) -> None:
+        self.operation = operation
+        self.phases = {}
+        # The peak is sampled at the end of every phase, so a short spike within a phase can be
+        # missed
+        self.peak_memory = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.monotonic() - start_time
+
+    def sample_memory(self, browser_pid: int | None) -> None:
+        if browser_pid is None:
+            return
+
+        memory = get_process_tree_memory(browser_pid)
+        if memory is not None and (self.peak_memory is None or memory > self.peak_memory):
+            self.peak_memory = memory
+
+    def get_record(self) -> JSON:
+        return {
+            "time": time.time(),
+            "operation": self.operation,
+            "phases": {name: round(duration, 4) for name, duration in self.phases.items()},
+            "peak_memory": self.peak_memory,
+        }
+
+    def write(self) -> None:
+        record = self.get_record()
+        logger.debug("Browser session phase timings: %s", record)
+
+        path = get_phase_timings_path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists() and path.stat().st_size > MAX_PHASE_TIMINGS_FILE_SIZE:
+                os.replace(path, path.with_suffix(path.suffix + ".1"))
+
+            # A single write of a short line is appended in one piece, so processes writing at
+            # the same time don't interleave their records
+            with open(path, "a") as timings_file:
+                timings_file.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.debug("Failed to write phase timings: %s", e)
+
+
+def read_records() -> list[JSON]:
+    """Read every record from the phase timings file and its backup, ignoring invalid lines"""
+    path = get_phase_timings_path()
+    records = []
+    for timings_path in [path.with_suffix(path.suffix + ".1"), path]:
+        try:
+            with open(timings_path) as timings_file:
+                lines = timings_file.readlines()
+        except OSError:
+            continue
+
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+
+    return records
+
+
+def get_percentile(values: list[float], percentile: int) -> float:
+    """Return the percentile of the values using the nearest-rank method"""
+    sorted_values = sorted(values)
+    rank = max(math.ceil(percentile / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def get_percentiles(records: list[JSON]) -> JSON:
+    """
+    Aggregate the records into percentiles for every phase of every operation. Peak memory is
+    aggregated like a phase as well.
+    """
+    values = {}
+    for record in records:
+        operation = values.setdefault(record.get("operation") or "unknown", {})
+        for name, duration in record.get("phases", {}).items():
+            operation.setdefault(name, []).append(duration)
+
+        if record.get("peak_memory") is not None:
+            operation.setdefault("peak_memory", []).append(record["peak_memory"])
+
+    percentiles = {}
+    for operation, phases in values.items():
+        percentiles[operation] = {}
+        for name, phase_values in phases.items():
+            phase_percentiles = {"count": len(phase_values)}
+            for percentile in PERCENTILES:
+                phase_percentiles[f"p{percentile}"] = get_percentile(phase_values, percentile)
+
+            percentiles[operation][name] = phase_percentiles
+
+    return percentiles
+
+
+def format_percentiles(percentiles: JSON) -> str:
+    if len(percentiles) == 0:
+        return f"No phase timings have been recorded in {get_phase_timings_path()}"
+
+    headers = "".join(f"{'p' + str(percentile):>10}" for percentile in PERCENTILES)
+    lines = []
+    for operation, phases in sorted(percentiles.items()):
+        lines.append(f"{operation}:")
+        lines.append(f"    {'phase':<24}{'count':>8}{headers}")
+        for name, phase_percentiles in sorted(phases.items()):
+            if name == "peak_memory":
+                # Show memory in MB instead of seconds
+                values = [phase_percentiles[f"p{p}"] / (1024 * 1024) for p in PERCENTILES]
+                unit = "MB"
+            else:
+                values = [phase_percentiles[f"p{p}"] for p in PERCENTILES]
+                unit = "s"
+
+            columns = "".join(f"{f'{value:.2f}{unit}':>10}" for value in values)
+            lines.append(f"    {name:<24}{phase_percentiles['count']:>8}{columns}")
+
+        lines.append("")
+
+    return "\n".join(lines).rstrip()
+
+
+def print_phase_timings() -> None:
+    print(format_percentiles(get_percentiles(read_records())))
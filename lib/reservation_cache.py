@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import multiprocessing
+import time
+from typing import TYPE_CHECKING, Any
+
+from .in_flight import LOCK_TIMEOUT_SECS, InFlightRequests
+from .log import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from multiprocessing.managers import SyncManager
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+# How long a reservation response can be reused by other monitors
+CACHE_TTL_SECS = 10 * 60
+MAX_CACHE_SIZE = 256
+
+# How long lookups wait for another monitor's request for the same reservation before making
+# their own. A request retries for a few minutes at most
+REQUEST_TIMEOUT_SECS = 5 * 60
+
+logger = get_logger(__name__)
+
+
+def get_cache_key(confirmation_number: str, first_name: str | None, last_name: str | None) -> str:
+    """
+    Return the key a reservation's response is cached under. Names are normalized so the same
+    passenger configured with different casing or spacing shares the cached response
+    """
+    names = [" ".join((name or "").split()).casefold() for name in (first_name, last_name)]
+    return ":".join([confirmation_number.upper(), *names])
+
+
+class ReservationCache:
+    """
+    A host-wide cache of reservation responses keyed by confirmation number and passenger name
+    (see get_cache_key). The cache is shared between every monitor process so a reservation
+    monitored in more than one place (e.g. both in the reservations list and under an account) is
+    only retrieved once. The name is part of the key as a response is only returned for a
+    passenger on the reservation, so a lookup with another name must never get it from the cache.
+
+    Concurrent lookups for the same key are coalesced: the first lookup makes the request and
+    every other lookup waits for it and then uses the cached response (see InFlightRequests). No
+    lock is held while requesting, so lookups for other reservations never wait.
+
+    If no manager is given, a regular dictionary is used. This is only safe when every monitor
+    runs in the same process (e.g. with the asyncio check-in engine).
+    """
+
+    def __init__(
+        self, manager: SyncManager | None, ttl: int = CACHE_TTL_SECS, max_size: int = MAX_CACHE_SIZE
+    ) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # Cache key -> (time the response was cached, response)
+        self.entries = {} if manager is None else manager.dict()
+        self.lock = multiprocessing.Lock()
+        self.in_flight = InFlightRequests(manager, REQUEST_TIMEOUT_SECS)
+
+    def get(self, key: str, request: Callable[[], JSON]) -> JSON:
+        """
+        Return the cached response for the key if it has not expired. Otherwise, make the request
+        and cache its response. Failed requests are not cached.
+        """
+
+        def request_and_store() -> JSON:
+            response = request()
+            self._store(key, response)
+            return response
+
+        return self.in_flight.get(key, lambda: self._get_cached(key), request_and_store)
+
+    def _get_cached(self, key: str) -> JSON | None:
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            logger.debug("Using cached reservation response")
+            return entry[1]
+
+        return None
+
+    def _store(self, key: str, response: JSON) -> None:
+        self.entries[key] = (time.time(), response)
+
+        # Evicting is only skipped if a process was killed while evicting
+        if not self.lock.acquire(timeout=LOCK_TIMEOUT_SECS):
+            logger.warning("Timeout waiting for the reservation cache lock. Skipping eviction")
+            return
+
+        try:
+            self._evict()
+        finally:
+            self.lock.release()
+
+    def _evict(self) -> None:
+        """Remove expired responses and then the oldest responses until the cache fits"""
+        entries = list(self.entries.items())
+        if len(entries) <= self.max_size:
+            return
+
+        current_time = time.time()
+        # Sort from oldest to newest so expired and old responses are removed first
+        entries = sorted(entries, key=lambda entry: entry[1][0])
+        num_to_remove = len(entries) - self.max_size
+        for idx, (key, (cached_time, _)) in enumerate(entries):
+            if idx >= num_to_remove and current_time - cached_time < self.ttl:
+                break
+
+            self.entries.pop(key, None)
+
+        logger.debug("Evicted reservation responses. %d are now cached", len(self.entries))
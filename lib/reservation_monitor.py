@@ -1,34 +1,58 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import multiprocessing
 import sys
+import threading
 import time
+from datetime import timedelta
 from typing import TYPE_CHECKING, Any
 
-from .checkin_scheduler import CheckInScheduler
+from .browser_arbiter import BrowserPriority
+from .checkin_scheduler import INVALID_HEADERS_STATUS_CODES, CheckInScheduler
+from .cycle_cost import measure_cycle, measure_fare_checks, record_browser_session
 from .fare_checker import FareChecker
 from .log import get_logger
 from .notification_handler import NotificationHandler
+from .stagger_planner import get_next_check_time, record_next_check_in
 from .utils import (
     CheckFaresOption,
+    CheckInEngineOption,
     DriverTimeoutError,
     FlightChangeError,
     LoginError,
     RequestError,
     get_current_time,
+    make_request,
 )
 from .webdriver import WebDriver
 
 if TYPE_CHECKING:
     from datetime import datetime
 
+    from .browser_arbiter import BrowserArbiter
+    from .browser_pool import BrowserPool
     from .config import AccountConfig, ReservationConfig
+    from .cycle_cost import CycleCost
+    from .flight import Flight
+    from .header_store import HeaderStore
+    from .reservation_cache import ReservationCache
+
+TRIPS_URL = "mobile-misc/v1/mobile-misc/page/upcoming-trips"
 
 TOO_MANY_REQUESTS_CODE = 429
 INTERNAL_SERVER_ERROR_CODE = 500
 
 RETRY_WAIT_SECONDS = 20
 
+# Allow a full resync to happen slightly early so small timing differences between checks don't
+# delay it by a whole retrieval interval
+FULL_RESYNC_GRACE_PERIOD = timedelta(minutes=1)
+
+# Name of the processes (or threads when using the asyncio check-in engine) monitors run in
+MONITOR_NAME = "ReservationMonitor"
+
 logger = get_logger(__name__)
 
 
@@ -41,19 +65,44 @@ class ReservationMonitor:
     def __init__(
         self,
         config: AccountConfig | ReservationConfig,
-        lock: multiprocessing.Lock | None = None,
+        lock: BrowserArbiter | None = None,
+        reservation_cache: ReservationCache | None = None,
+        browser_pool: BrowserPool | None = None,
+        header_store: HeaderStore | None = None,
     ) -> None:
         self.first_name = config.first_name
         self.last_name = config.last_name
 
         self.config = config
         self.lock = lock
+        self.reservation_cache = reservation_cache
+        self.browser_pool = browser_pool
+        self.header_store = header_store
         self.notification_handler = NotificationHandler(self)
         self.checkin_scheduler = CheckInScheduler(self)
 
+        # Set by the stagger planner. Without a phase, checks are not aligned to other monitors
+        self.start_delay = 0
+        self.phase = None
+
+        # Set when a daily budget is configured. The budget planner decides the shortest retrieval
+        # interval and how many cycles apart fares are checked
+        self.budget_planner = None
+        self.budget_interval = 0
+        self.fare_check_every = 1
+        self.cycles_until_fare_check = 0
+
     def start(self) -> None:
-        """Start each reservation monitor in a separate process to run them in parallel"""
-        process = multiprocessing.Process(target=self.monitor)
+        """
+        Start each reservation monitor in a separate process to run them in parallel. With the
+        asyncio check-in engine, a thread is used instead so every check-in shares one process.
+        """
+        if self.config.check_in_engine == CheckInEngineOption.ASYNCIO:
+            thread = threading.Thread(target=self.monitor, name=MONITOR_NAME, daemon=True)
+            thread.start()
+            return
+
+        process = multiprocessing.Process(target=self.monitor, name=MONITOR_NAME)
         process.start()
 
     def monitor(self) -> None:
@@ -68,24 +117,34 @@ class ReservationMonitor:
 
     def _monitor(self) -> None:
         """Continuously performs checks every X hours (the retrieval interval)"""
+        if self.start_delay > 0:
+            logger.debug("Waiting %d seconds before the first check", self.start_delay)
+            time.sleep(self.start_delay)
+
         while True:
+            self.lock.wait_for_quiet_window("reservation retrieval")
             time_before = get_current_time()
 
-            # Acquire a lock to prevent concurrency issues with the webdriver
-            logger.debug("Acquiring lock...")
-            with self.lock:
-                logger.debug("Lock acquired")
-
+            # The lock is only held while a browser is used, so reservation retrievals and fare
+            # checks from different monitors can run at the same time
+            with measure_cycle() as cycle_cost:
                 should_exit = self._check()
-                if should_exit:
-                    logger.debug("Stopping monitoring")
-                    break
 
-                if self.config.retrieval_interval <= 0:
-                    logger.debug("Monitoring is disabled as retrieval interval is 0")
-                    break
+            if self.phase is not None:
+                record_next_check_in(self.config, self._get_next_checkin_time())
+
+            if self.budget_planner is not None:
+                stopping = should_exit or self.config.retrieval_interval <= 0
+                self._update_budget_plan(cycle_cost, stopping)
+
+            if should_exit:
+                logger.debug("Stopping monitoring")
+                break
+
+            if self.config.retrieval_interval <= 0:
+                logger.debug("Monitoring is disabled as retrieval interval is 0")
+                break
 
-            logger.debug("Lock released")
             self._smart_sleep(time_before)
 
     def _check(self) -> bool:
@@ -122,9 +181,23 @@ class ReservationMonitor:
         if self.config.check_fares == CheckFaresOption.NO:
             return
 
+        if self.cycles_until_fare_check > 0:
+            self.cycles_until_fare_check -= 1
+            logger.debug("Skipping fare checks this cycle to stay within the daily budget")
+            return
+
+        self.cycles_until_fare_check = self.fare_check_every - 1
+
+        # Retrieving reservations can take long enough for a check-in's quiet window to start
+        self.lock.wait_for_quiet_window("fare checks")
+
         flights = self.checkin_scheduler.flights
         logger.debug("Checking fares for %d flights", len(flights))
 
+        with measure_fare_checks():
+            self._check_fares(flights)
+
+    def _check_fares(self, flights: list[Flight]) -> None:
         fare_checker = FareChecker(self)
         for flight in flights:
             # If a fare check fails, don't completely exit. Just print the error
@@ -156,11 +229,75 @@ class ReservationMonitor:
         is the exact time provided in the configuration file.
         """
         current_time = get_current_time()
-        time_taken = (current_time - previous_time).total_seconds()
-        sleep_time = self.config.retrieval_interval - time_taken
+        retrieval_interval = max(self._get_retrieval_interval(current_time), self.budget_interval)
+        if self.phase is None:
+            time_taken = (current_time - previous_time).total_seconds()
+            sleep_time = max(retrieval_interval - time_taken, 0)
+        else:
+            # Align the next check to this monitor's phase so it stays staggered from the others
+            next_check_time = get_next_check_time(
+                previous_time.timestamp(), retrieval_interval, self.phase
+            )
+            sleep_time = max(next_check_time - current_time.timestamp(), 0)
+
         logger.debug("Sleeping for %d seconds", sleep_time)
         time.sleep(sleep_time)
 
+    def _get_retrieval_interval(self, current_time: datetime) -> int:
+        """
+        Pick the retrieval interval based on how soon the nearest scheduled flight departs. The
+        interval of the first tier the flight departs within is used, but it is never longer
+        than the configured retrieval interval. If no tier matches, the configured retrieval
+        interval is used.
+        """
+        retrieval_interval = self.config.retrieval_interval
+        flights = self.checkin_scheduler.flights
+        if len(self.config.retrieval_interval_tiers) == 0 or len(flights) == 0:
+            return retrieval_interval
+
+        nearest_departure = min(flight.departure_time for flight in flights)
+        time_to_departure = (nearest_departure - current_time).total_seconds()
+
+        for departure_within, tier_interval in self.config.retrieval_interval_tiers:
+            if time_to_departure <= departure_within:
+                retrieval_interval = min(tier_interval, retrieval_interval)
+                break
+
+        logger.debug(
+            "Nearest flight departs in %d seconds. Using a retrieval interval of %d seconds",
+            time_to_departure,
+            retrieval_interval,
+        )
+        return retrieval_interval
+
+    def _get_next_departure(self) -> datetime | None:
+        flights = self.checkin_scheduler.flights
+        if len(flights) == 0:
+            return None
+
+        return min(flight.departure_time for flight in flights)
+
+    def _get_next_checkin_time(self) -> datetime | None:
+        next_departure = self._get_next_departure()
+        if next_departure is None:
+            return None
+
+        # Check-in is 24 hours before the flight departs
+        return next_departure - timedelta(days=1)
+
+    def _update_budget_plan(self, cycle_cost: CycleCost, stopping: bool) -> None:
+        """Record the cost of the last cycle and get this monitor's share of the daily budget"""
+        if stopping:
+            # Give this monitor's share of the budget to the others
+            self.budget_planner.remove_monitor(self.config)
+            return
+
+        retrieval_interval = self._get_retrieval_interval(get_current_time())
+        self.budget_planner.record_cycle(
+            self.config, cycle_cost, retrieval_interval, self._get_next_departure()
+        )
+        self.budget_interval, self.fare_check_every = self.budget_planner.get_plan(self.config)
+
     def _stop_checkins(self) -> None:
         """
         Stops all check-ins for a monitor. This is called when Ctrl-C is pressed. The
@@ -184,11 +321,27 @@ class ReservationMonitor:
 class AccountMonitor(ReservationMonitor):
     """Monitor an account for newly booked reservations"""
 
-    def __init__(self, config: AccountConfig, lock: multiprocessing.Lock) -> None:
-        super().__init__(config, lock)
+    def __init__(
+        self,
+        config: AccountConfig,
+        lock: BrowserArbiter,
+        reservation_cache: ReservationCache | None = None,
+        browser_pool: BrowserPool | None = None,
+        header_store: HeaderStore | None = None,
+    ) -> None:
+        super().__init__(config, lock, reservation_cache, browser_pool, header_store)
         self.username = config.username
         self.password = config.password
 
+        # Fingerprints of each reservation in the upcoming trips from the last check. Used to
+        # only retrieve reservations that changed since the last check
+        self.trip_fingerprints = {}
+        self.last_full_resync = None
+
+        # Headers of the account's logged in session. The upcoming trips are retrieved with them
+        # directly until they expire, so a browser is only needed to log in again
+        self.session_headers = None
+
     def _check(self) -> bool:
         """
         Check for newly booked reservations for the account. Returns true if future checks should
@@ -204,6 +357,70 @@ class AccountMonitor(ReservationMonitor):
         # this scope
         return False
 
+    def _schedule_reservations(self, reservations: list[dict[str, Any]]) -> None:
+        """
+        Only reservations that are new or have changed since the last check are retrieved
+        again, unless a full resync is due.
+        """
+        logger.debug("Scheduling flight check-ins for %d reservations", len(reservations))
+        confirmation_numbers = [reservation["confirmationNumber"] for reservation in reservations]
+        unchanged_confirmation_numbers = self._get_unchanged_reservations(reservations)
+        self.checkin_scheduler.process_reservations(
+            confirmation_numbers, unchanged_confirmation_numbers
+        )
+
+    def _get_unchanged_reservations(self, reservations: list[dict[str, Any]]) -> set[str]:
+        """
+        Fingerprint every reservation from the upcoming trips and return the confirmation numbers
+        of the reservations whose fingerprint has not changed since the last check. No
+        reservations are returned when a full resync is due.
+        """
+        fingerprints = {}
+        for reservation in reservations:
+            confirmation_number = reservation["confirmationNumber"]
+            # A reservation can be listed more than once, so include every entry in the fingerprint
+            fingerprint = fingerprints.get(confirmation_number, "")
+            fingerprints[confirmation_number] = self._get_trip_fingerprint(reservation, fingerprint)
+
+        previous_fingerprints = self.trip_fingerprints
+        self.trip_fingerprints = fingerprints
+
+        current_time = get_current_time()
+        resync_interval = timedelta(seconds=self.config.full_resync_interval)
+        if (
+            self.last_full_resync is None
+            or current_time - self.last_full_resync >= resync_interval - FULL_RESYNC_GRACE_PERIOD
+        ):
+            logger.debug("Performing a full resync of all reservations")
+            self.last_full_resync = current_time
+            return set()
+
+        scheduled_confirmation_numbers = {
+            flight.confirmation_number for flight in self.checkin_scheduler.flights
+        }
+        unchanged_confirmation_numbers = {
+            confirmation_number
+            for confirmation_number, fingerprint in fingerprints.items()
+            if previous_fingerprints.get(confirmation_number) == fingerprint
+            # Retrieve reservations with no scheduled flights in case the last retrieval failed
+            and confirmation_number in scheduled_confirmation_numbers
+        }
+
+        logger.debug(
+            "%d of %d reservations are unchanged since the last check",
+            len(unchanged_confirmation_numbers),
+            len(fingerprints),
+        )
+        return unchanged_confirmation_numbers
+
+    def _get_trip_fingerprint(self, reservation: dict[str, Any], previous_fingerprint: str) -> str:
+        """
+        Create a fingerprint from the entire upcoming trip entry. This covers the confirmation
+        number, dates, flight numbers, and any markers Southwest adds when a trip changes.
+        """
+        trip_json = json.dumps(reservation, sort_keys=True, default=str)
+        return hashlib.sha256((previous_fingerprint + trip_json).encode()).hexdigest()
+
     def _get_reservations(self, max_retries: int = 1) -> tuple[list[dict[str, Any]], bool]:
         """
         Attempts to retrieve a list of reservations and returns a tuple containing the list
@@ -216,10 +433,8 @@ class AccountMonitor(ReservationMonitor):
         logger.debug("Retrieving reservations for account (max retries: %d)", max_retries)
 
         for attempt in range(max_retries + 1):
-            webdriver = WebDriver(self.checkin_scheduler)
-
             try:
-                reservations = webdriver.get_reservations(self)
+                reservations = self._fetch_reservations()
                 logger.debug(
                     "Successfully retrieved %d reservations after %d attempts",
                     len(reservations),
@@ -261,6 +476,64 @@ class AccountMonitor(ReservationMonitor):
 
         return [], True
 
+    def _fetch_reservations(self) -> list[dict[str, Any]]:
+        """
+        Retrieve the upcoming trips with the headers of the last login. If they no longer work,
+        log in again with a browser to get new headers.
+        """
+        if self.session_headers is not None:
+            reservations = self._fetch_reservations_with_session()
+            if reservations is not None:
+                return reservations
+
+        reservations = self._log_in()
+        # The headers produced by the login carry the account's logged in session
+        self.session_headers = self.checkin_scheduler.headers
+        return reservations
+
+    def _fetch_reservations_with_session(self) -> list[dict[str, Any]] | None:
+        """
+        Request the upcoming trips directly with the session headers. Returns None if the request
+        fails, in which case a browser login is needed.
+        """
+        logger.debug("Retrieving upcoming trips with the account's session headers")
+        try:
+            response = make_request(
+                "GET", TRIPS_URL, self.session_headers, {}, max_attempts=1, random_sleep=False
+            )
+        except RequestError as err:
+            if err.status_code in INVALID_HEADERS_STATUS_CODES:
+                logger.debug("Account session has expired. Logging in again")
+            else:
+                logger.debug("Failed to retrieve upcoming trips: %s. Logging in again", err)
+
+            self.session_headers = None
+            return None
+
+        # A response without the upcoming trips is most likely the logged out page
+        reservations = response.get("upcomingTripsPage")
+        if reservations is None:
+            logger.debug("Upcoming trips are missing from the response. Logging in again")
+            self.session_headers = None
+            return None
+
+        # The session headers still work, so use them for retrieving the reservations as well
+        self.checkin_scheduler.headers = self.session_headers
+        return [reservation for reservation in reservations if reservation["tripType"] == "FLIGHT"]
+
+    def _log_in(self) -> list[dict[str, Any]]:
+        """Log in with the browser pool if it is used. Otherwise, log in with a webdriver here"""
+        record_browser_session()
+
+        # Wait for a free browser slot. Logging in is routine, so it waits for any check-ins that
+        # are about to use a browser. This applies to the browser pool's workers as well
+        with self.lock.use(BrowserPriority.ROUTINE) as browser_slot:
+            if self.browser_pool is not None:
+                return self.browser_pool.get_reservations(self)
+
+            webdriver = WebDriver(self.checkin_scheduler, browser_slot)
+            return webdriver.get_reservations(self)
+
     def _stop_monitoring(self) -> None:
         print(f"\nStopping monitoring for account with username {self.username}")
         self._stop_checkins()
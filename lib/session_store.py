@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+from .log import get_logger
+from .utils import atomic_write_json
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+SESSIONS_DIRECTORY = Path(__file__).parents[1] / "sessions"
+
+# Number of iterations used to derive the encryption key from the account's password
+KDF_ITERATIONS = 480000
+SALT_SIZE = 16
+
+logger = get_logger(__name__)
+
+
+class SessionStore:
+    """
+    An encrypted, on-disk store of an account's logged in browser session (cookies and storage).
+    A later login can restore the session instead of logging in again until the session expires.
+
+    The session is encrypted with a key derived from the account's password, so it can only be
+    read with the password in the configuration. Changing the password makes the stored session
+    unreadable, which just means a full login is done.
+
+    Statistics on how often a session is restored and the time saved are kept with the session.
+    They contain nothing sensitive, so they are not encrypted.
+    """
+
+    def __init__(self, username: str, password: str) -> None:
+        # Don't reveal the username in the file name
+        file_name = hashlib.sha256(username.encode()).hexdigest() + ".json"
+        self.path = SESSIONS_DIRECTORY / file_name
+        self.password = password
+
+    def load(self) -> JSON | None:
+        """Return the stored session or None if there is no session or it can't be decrypted"""
+        contents = self._read()
+        if "session" not in contents:
+            return None
+
+        try:
+            salt = base64.b64decode(contents["salt"])
+            session = self._get_fernet(salt).decrypt(contents["session"].encode())
+        except (InvalidToken, KeyError, ValueError):
+            logger.debug("Unable to decrypt stored session. A full login is needed")
+            return None
+
+        return json.loads(session)
+
+    def save(self, session: JSON) -> None:
+        salt = os.urandom(SALT_SIZE)
+        token = self._get_fernet(salt).encrypt(json.dumps(session).encode())
+
+        contents = self._read()
+        contents["salt"] = base64.b64encode(salt).decode()
+        contents["session"] = token.decode()
+        self._write(contents)
+        logger.debug("Stored logged in session")
+
+    def clear(self) -> None:
+        """Remove the stored session, but keep the statistics"""
+        contents = self._read()
+        if contents.pop("session", None) is not None:
+            contents.pop("salt", None)
+            self._write(contents)
+            logger.debug("Cleared expired session")
+
+    def record_restore(self, restored: bool, duration: float) -> None:
+        contents = self._read()
+        stats = contents.setdefault("stats", {})
+        stats["restores"] = stats.get("restores", 0) + 1
+        if restored:
+            stats["hits"] = stats.get("hits", 0) + 1
+            stats["restore_time"] = stats.get("restore_time", 0) + duration
+
+        self._write(contents)
+
+    def record_login(self, duration: float) -> None:
+        contents = self._read()
+        stats = contents.setdefault("stats", {})
+        stats["logins"] = stats.get("logins", 0) + 1
+        stats["login_time"] = stats.get("login_time", 0) + duration
+        self._write(contents)
+
+    def get_stats(self) -> JSON:
+        stats = self._read().get("stats", {})
+        restores = stats.get("restores", 0)
+        hits = stats.get("hits", 0)
+        logins = stats.get("logins", 0)
+
+        # Each restored session saves the difference between an average login and restore
+        time_saved = 0
+        if hits > 0 and logins > 0:
+            average_login_time = stats["login_time"] / logins
+            average_restore_time = stats["restore_time"] / hits
+            time_saved = hits * max(average_login_time - average_restore_time, 0)
+
+        return {
+            "restores": restores,
+            "hits": hits,
+            "hit_rate": hits / max(restores, 1),
+            "time_saved": time_saved,
+        }
+
+    def log_stats(self) -> None:
+        stats = self.get_stats()
+        logger.debug(
+            "Session restore hit rate: %.0f%% (%d of %d). Estimated time saved: %.1f seconds",
+            stats["hit_rate"] * 100,
+            stats["hits"],
+            stats["restores"],
+            stats["time_saved"],
+        )
+
+    def _get_fernet(self, salt: bytes) -> Fernet:
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+        key = base64.urlsafe_b64encode(kdf.derive(self.password.encode()))
+        return Fernet(key)
+
+    def _read(self) -> JSON:
+        try:
+            with open(self.path) as session_file:
+                contents = json.load(session_file)
+        except (OSError, ValueError):
+            return {}
+
+        return contents if isinstance(contents, dict) else {}
+
+    def _write(self, contents: JSON) -> None:
+        try:
+            atomic_write_json(self.path, contents)
+        except OSError as e:
+            logger.debug("Failed to write session file: %s", e)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .log import get_logger
+from .reservation_cache import get_cache_key
+from .utils import atomic_write_json
+
+if TYPE_CHECKING:
+    from datetime import datetime
+
+    from .config import AccountConfig, ReservationConfig
+
+# Type alias for JSON
+JSON = dict[str, Any]
+
+# Monitors start their first check this many seconds apart, most urgent first
+WARM_UP_SPACING_SECS = 15
+
+# How far into its share of the retrieval interval a monitor's cycle can be moved by its jitter
+MAX_JITTER = 0.5
+
+# The earliest upcoming check-in of every monitor, kept between runs of the script so the next
+# warm-up can be ordered by urgency
+STAGGER_STATE_FILE = Path(tempfile.gettempdir()) / "auto-southwest-check-in" / "stagger_state.json"
+
+logger = get_logger(__name__)
+
+
+def get_monitor_key(config: AccountConfig | ReservationConfig) -> str:
+    """
+    Identify a monitor across runs without revealing its username or reservation. The same
+    confirmation number can be monitored for different passengers, so reservations are identified
+    by the passenger's name as well (see get_cache_key).
+    """
+    identifier = getattr(config, "username", None)
+    if identifier is None:
+        identifier = get_cache_key(
+            str(getattr(config, "confirmation_number", None)),
+            getattr(config, "first_name", None),
+            getattr(config, "last_name", None),
+        )
+
+    return hashlib.sha256(str(identifier).encode()).hexdigest()
+
+
+def get_jitter(monitor_key: str) -> float:
+    """Return a value in [0, 1) for the monitor that stays the same every run"""
+    return int(monitor_key[:8], 16) / 0x100000000
+
+
+def get_next_check_time(previous_time: float, interval: float, phase: float) -> float:
+    """
+    Return the time (as a timestamp) of the next check so checks happen every interval seconds,
+    aligned to the monitor's phase. The first aligned time at least half an interval after the
+    previous check is used, so the first aligned interval is between half and one and a half
+    intervals long and every interval after is exactly as configured.
+    """
+    offset = phase * interval
+    earliest_time = previous_time + interval / 2
+    next_time = math.ceil((earliest_time - offset) / interval) * interval + offset
+
+    # Floating-point error can put the aligned time just before the earliest time
+    if next_time < earliest_time:
+        next_time += interval
+
+    return next_time
+
+
+class StaggerPlanner:
+    """
+    Spreads the checks of every monitor evenly over the retrieval interval so monitors don't all
+    use the browser at the same time.
+
+    Each monitor is given a phase: the fraction of the retrieval interval its checks are aligned
+    to. Monitors are spaced 1/N of the interval apart (for N monitors) plus a deterministic jitter
+    within their share, so the same monitor keeps the same phase every run. As checks are aligned
+    to the clock instead of when the monitor started, monitors stay spread out even with the same
+    retrieval interval.
+
+    On startup, monitors start their first check WARM_UP_SPACING_SECS apart. Monitors with the
+    soonest check-in (as recorded by the last run) go first, and monitors with no recorded
+    check-ins go last.
+    """
+
+    def __init__(self, configs: list[AccountConfig | ReservationConfig]) -> None:
+        self.start_delays = {}
+        self.phases = {}
+
+        monitor_keys = sorted({get_monitor_key(config) for config in configs})
+        num_monitors = max(len(monitor_keys), 1)
+        for index, monitor_key in enumerate(monitor_keys):
+            jitter = get_jitter(monitor_key) * MAX_JITTER
+            self.phases[monitor_key] = (index + jitter) / num_monitors
+
+        next_check_ins = read_next_check_ins()
+        current_time = time.time()
+
+        def get_urgency(monitor_key: str) -> tuple[bool, float, str]:
+            next_check_in = next_check_ins.get(monitor_key)
+            is_known = next_check_in is not None and next_check_in > current_time
+            return (not is_known, next_check_in if is_known else 0, monitor_key)
+
+        for rank, monitor_key in enumerate(sorted(monitor_keys, key=get_urgency)):
+            self.start_delays[monitor_key] = rank * WARM_UP_SPACING_SECS
+
+        logger.debug("Planned staggered startup for %d monitors", len(monitor_keys))
+
+    def get_stagger(self, config: AccountConfig | ReservationConfig) -> tuple[int, float]:
+        """Return the monitor's start delay (in seconds) and phase"""
+        monitor_key = get_monitor_key(config)
+        return self.start_delays.get(monitor_key, 0), self.phases.get(monitor_key, 0)
+
+
+def read_next_check_ins() -> JSON:
+    try:
+        with open(STAGGER_STATE_FILE) as state_file:
+            next_check_ins = json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+    return next_check_ins if isinstance(next_check_ins, dict) else {}
+
+
+def record_next_check_in(
+    config: AccountConfig | ReservationConfig, checkin_time: datetime | None
+) -> None:
+    """
+    Record the monitor's earliest upcoming check-in for ordering the next warm-up. If two
+    processes record at the same time, one of the records might be lost, which only affects the
+    order of the next warm-up.
+    """
+    monitor_key = get_monitor_key(config)
+    next_check_ins = read_next_check_ins()
+    next_check_in = None if checkin_time is None else checkin_time.timestamp()
+    if next_check_ins.get(monitor_key) == next_check_in:
+        return
+
+    if next_check_in is None:
+        next_check_ins.pop(monitor_key, None)
+    else:
+        next_check_ins[monitor_key] = next_check_in
+
+    try:
+        atomic_write_json(STAGGER_STATE_FILE, next_check_ins)
+    except OSError as e:
+        logger.debug("Failed to write stagger state: %s", e)
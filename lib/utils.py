@@ -1,18 +1,24 @@
 from __future__ import annotations
 
 import json
+import os
 import random
 import socket
+import tempfile
 import time
 from datetime import datetime, timezone
 from enum import Enum, IntEnum
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import ntplib
 import requests
 
+from .cycle_cost import record_request
 from .log import get_logger
 
+if TYPE_CHECKING:
+    from pathlib import Path
+
 # Type alias for JSON
 JSON = dict[str, Any]
 
@@ -69,6 +75,7 @@ def make_request(
     attempts = 0
     while attempts < max_attempts:
         attempts += 1
+        record_request()
 
         try:
             if method.upper() == "POST":
@@ -90,7 +97,7 @@ def make_request(
 
             response_body = response.content.decode()
             error_msg = f"{response.reason} ({response.status_code})"
-            error = RequestError(error_msg, response_body)
+            error = RequestError(error_msg, response_body, response.status_code)
 
             try:
                 _handle_southwest_error_code(error)
@@ -110,9 +117,7 @@ def make_request(
         else:
             sleep_time = 0.5
 
-        logger.debug(
-            "Retrying in %.2f seconds after error: %s", sleep_time, error
-        )
+        logger.debug("Retrying in %.2f seconds after error: %s", sleep_time, error)
         time.sleep(sleep_time)
 
     logger.debug("Failed to make request after %d attempts: %s", attempts, error)
@@ -120,7 +125,6 @@ def make_request(
     raise error
 
 
-
 def get_current_time() -> datetime:
     """
     Fetch the current time from an NTP server. Times are sometimes off on computers running the
@@ -146,11 +150,31 @@ def get_current_time() -> datetime:
     return datetime.fromtimestamp(response.tx_time, timezone.utc)
 
 
+def atomic_write_json(path: Path, data: Any) -> None:
+    """
+    Write the data to a temporary file in the same directory first and then atomically replace
+    the file, so readers never see a partially written file. The temporary file is only readable
+    by the current user, so the file is as well. Raises an OSError if the file can't be written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(data, temp_file)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
 class RequestError(Exception):
     """A custom exception when a request fails"""
 
-    def __init__(self, message: str, response_body: str = "") -> None:
+    def __init__(
+        self, message: str, response_body: str = "", status_code: int | None = None
+    ) -> None:
         super().__init__(message)
+        self.status_code = status_code
 
         try:
             response_json = json.loads(response_body)
@@ -169,8 +193,13 @@ class LoginError(Exception):
 
     def __init__(self, reason: str, status_code: int) -> None:
         super().__init__(f"Reason: {reason}. Status code: {status_code}")
+        self.reason = reason
         self.status_code = status_code
 
+    def __reduce__(self) -> tuple[type[LoginError], tuple[str, int]]:
+        # Allows the error to be sent between processes
+        return LoginError, (self.reason, self.status_code)
+
 
 class FlightChangeError(Exception):
     """A custom exception for flights that cannot be changed"""
@@ -187,6 +216,12 @@ class NotificationLevel(IntEnum):
     ERROR = 4
 
 
+# Switch to StrEnum when Python 3.10 support is dropped
+class BrowserLoadProfile(str, Enum):
+    FULL = "full"
+    LEAN = "lean"
+
+
 # Switch to StrEnum when Python 3.10 support is dropped
 class CheckFaresOption(str, Enum):
     NO = "no"
@@ -195,6 +230,12 @@ class CheckFaresOption(str, Enum):
     SAME_DAY = "same_day"
 
 
+# Switch to StrEnum when Python 3.10 support is dropped
+class CheckInEngineOption(str, Enum):
+    PROCESS = "process"
+    ASYNCIO = "asyncio"
+
+
 def is_truthy(arg: bool | int | str) -> bool:
     """
     Convert "truthy" strings into Booleans.
@@ -3,19 +3,31 @@ from __future__ import annotations
 import json
 import re
 import sys
+import tempfile
+import threading
 import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
 from sbvirtualdisplay import Display
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from seleniumbase import Driver
 from seleniumbase.fixtures import page_actions as seleniumbase_actions
 
+from .browser_governor import register_browser, unregister_browser
 from .config import IS_DOCKER
+from .display_manager import DISPLAY_SIZE, get_display_manager, get_display_number
+from .driver_cache import DriverCache
 from .log import LOGS_DIRECTORY, get_logger
-from .utils import DriverTimeoutError, LoginError, random_sleep_duration
+from .phase_timings import PhaseTimer
+from .session_store import SessionStore
+from .utils import BrowserLoadProfile, DriverTimeoutError, LoginError, random_sleep_duration
 
 if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from .browser_session import BrowserSession
     from .checkin_scheduler import CheckInScheduler
     from .reservation_monitor import AccountMonitor
 
@@ -29,6 +41,61 @@ HEADERS_URL = BASE_URL + "/api/mobile-air-booking/v1/mobile-air-booking/feature/
 INVALID_CREDENTIALS_CODE = 400518024
 
 WAIT_TIMEOUT_SECS = 180
+# A restored session loads the upcoming trips right away, so don't wait long before logging in
+SESSION_RESTORE_TIMEOUT_SECS = 20
+
+# Scripts to get, restore, and clear the page's local and session storage
+GET_STORAGE_SCRIPT = (
+    "return {local: Object.assign({}, localStorage), session: Object.assign({}, sessionStorage)}"
+)
+RESTORE_STORAGE_SCRIPT = """
+for (const [key, value] of Object.entries(arguments[0])) localStorage.setItem(key, value);
+for (const [key, value] of Object.entries(arguments[1])) sessionStorage.setItem(key, value);
+"""
+CLEAR_STORAGE_SCRIPT = "localStorage.clear(); sessionStorage.clear();"
+
+# Fields of a stored cookie that are accepted when setting it again
+COOKIE_PARAM_FIELDS = [
+    "name",
+    "value",
+    "domain",
+    "path",
+    "expires",
+    "secure",
+    "httpOnly",
+    "sameSite",
+]
+
+# URLs blocked by the lean load profile. Images, fonts, media, and analytics are not needed to log
+# in or for Southwest to issue cookies and headers. Scripts are never blocked as Southwest's own
+# scripts generate the headers
+LEAN_BLOCKED_URLS = [
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.svg",
+    "*.webp",
+    "*.ico",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.mp4",
+    "*.webm",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+]
+# With the lean load profile, stop waiting for the page to load after this long. Headers are
+# usually captured well before the page finishes loading
+LEAN_PAGE_LOAD_BUDGET_SECS = 20
+
+# Each browser slot runs an isolated browser instance with its own profile directory, debugging
+# port, and display. The port is offset from this by the slot
+BROWSER_PROFILES_DIRECTORY = Path(tempfile.gettempdir()) / "auto-southwest-check-in" / "browsers"
+BASE_DEBUGGING_PORT = 9230
 
 JSON = dict[str, Any]
 
@@ -51,16 +118,40 @@ class WebDriver:
     https://github.com/byalextran/southwest-headers/commit/d2969306edb0976290bfa256d41badcc9698f6ed
     """
 
-    def __init__(self, checkin_scheduler: CheckInScheduler) -> None:
+    def __init__(
+        self,
+        checkin_scheduler: CheckInScheduler,
+        browser_slot: int | None = None,
+        session: BrowserSession | None = None,
+    ) -> None:
         self.checkin_scheduler = checkin_scheduler
+        self.browser_slot = browser_slot
+        # A long-lived browser to reuse instead of starting a new one
+        self.session = session
         self.headers_set = False
         self.debug_screenshots = self._should_take_screenshots()
         self.display = None
+        self.load_profile = checkin_scheduler.reservation_monitor.config.browser_load_profile
+
+        # Load statistics reported when the browser quits
+        self.bytes_downloaded = 0
+        self.load_start_time = None
+        self.time_to_ready = None
+        # How long each phase of the session takes. Written once the browser quits
+        self.phase_timer = PhaseTimer()
 
         # For account login
         self.login_request_id = None
         self.login_status_code = None
         self.trips_request_id = None
+        self.trips_status_code = None
+
+        # Set by the CDP listeners (which run in another thread) as soon as each attribute is set
+        self.attribute_events = {
+            "headers_set": threading.Event(),
+            "login_request_id": threading.Event(),
+            "trips_request_id": threading.Event(),
+        }
 
     def _should_take_screenshots(self) -> bool:
         """
@@ -85,6 +176,7 @@ class WebDriver:
         The check-in URL is requested. Since another request contains valid headers
         during the initial request, those headers are set in the CheckIn Scheduler.
         """
+        self.phase_timer.operation = "refresh_headers"
         driver = self._get_driver()
         self._take_debug_screenshot(driver, "pre_headers.png")
         logger.debug("Waiting for valid headers")
@@ -100,25 +192,37 @@ class WebDriver:
         valid headers are produced, they are also grabbed and updated in the check-in scheduler.
         Last, if the account name is not set, it will be set based on the response information.
         """
+        self.phase_timer.operation = "login"
         driver = self._get_driver()
         driver.add_cdp_listener("Network.responseReceived", self._login_listener)
 
+        session_store = None
+        if account_monitor.config.persist_login_session:
+            session_store = SessionStore(account_monitor.username, account_monitor.password)
+            reservations = self._restore_session(driver, account_monitor, session_store)
+            if reservations is not None:
+                self._quit_driver(driver)
+                return reservations
+
         logger.debug("Logging into account to get a list of reservations and valid headers")
+        login_start_time = time.monotonic()
 
         # Log in to retrieve the account's reservations and needed headers for later requests
-        seleniumbase_actions.wait_for_element_not_visible(driver, ".dimmer")
+        with self._time_phase("dimmer_wait"):
+            seleniumbase_actions.wait_for_element_not_visible(driver, ".dimmer")
         self._take_debug_screenshot(driver, "pre_login.png")
 
-        # If a popup came up with an error, click "OK" to remove it.
-        # See https://github.com/jdholtz/auto-southwest-check-in/issues/226
-        driver.click_if_visible(".button-popup.confirm-button")
+        with self._time_phase("login_submit"):
+            # If a popup came up with an error, click "OK" to remove it.
+            # See https://github.com/jdholtz/auto-southwest-check-in/issues/226
+            driver.click_if_visible(".button-popup.confirm-button")
 
-        driver.click(".login-button--box")
-        time.sleep(random_sleep_duration(1, 5))
-        driver.type('input[name="userNameOrAccountNumber"]', account_monitor.username)
+            driver.click(".login-button--box")
+            time.sleep(random_sleep_duration(1, 5))
+            driver.type('input[name="userNameOrAccountNumber"]', account_monitor.username)
 
-        # Use quote_plus to workaround a x-www-form-urlencoded encoding bug on the mobile site
-        driver.type('input[name="password"]', f"{account_monitor.password}\n")
+            # Use quote_plus to workaround a x-www-form-urlencoded encoding bug on the mobile site
+            driver.type('input[name="password"]', f"{account_monitor.password}\n")
 
         # Wait for the necessary information to be set
         self._wait_for_attribute("headers_set")
@@ -129,38 +233,231 @@ class WebDriver:
         # instead of requesting again later
         reservations = self._fetch_reservations(driver)
 
+        if session_store is not None:
+            session_store.record_login(time.monotonic() - login_start_time)
+            self._save_session(driver, account_monitor, session_store)
+            session_store.log_stats()
+
         self._quit_driver(driver)
         return reservations
 
+    def _restore_session(
+        self, driver: Driver, account_monitor: AccountMonitor, session_store: SessionStore
+    ) -> list[JSON] | None:
+        """
+        Restore the account's stored session into the browser and reload the check-in page. If
+        the session is still valid, the upcoming trips are loaded without logging in. Returns the
+        reservations, or None if the session couldn't be restored and a full login is needed.
+        """
+        session = session_store.load()
+        if session is None:
+            return None
+
+        logger.debug("Restoring stored login session")
+        restore_start_time = time.monotonic()
+        reservations = None
+        try:
+            with self._time_phase("session_restore"):
+                driver.execute_cdp_cmd("Network.setCookies", {"cookies": session["cookies"]})
+                driver.execute_script(
+                    RESTORE_STORAGE_SCRIPT, session["local_storage"], session["session_storage"]
+                )
+                self._open_checkin_page(driver)
+
+            self._wait_for_attribute("trips_request_id", SESSION_RESTORE_TIMEOUT_SECS)
+            # The restored session's headers are copied below, so they must have been captured
+            self._wait_for_attribute("headers_set", SESSION_RESTORE_TIMEOUT_SECS)
+            if self.trips_status_code == 200:
+                reservations = self._fetch_reservations(driver)
+        except (DriverTimeoutError, WebDriverException, KeyError, ValueError) as e:
+            logger.debug("Failed to restore stored session: %s", e)
+
+        session_store.record_restore(
+            reservations is not None, time.monotonic() - restore_start_time
+        )
+
+        if reservations is None:
+            logger.debug("Stored session has expired. Logging in again")
+            session_store.clear()
+            self._reset_session(driver)
+            return None
+
+        logger.debug("Restored stored login session. Skipping login")
+        # The session's cookies are the restored ones, so refresh them in the captured headers
+        self.checkin_scheduler.headers = self._get_needed_headers(self.checkin_scheduler.headers)
+        if not account_monitor.first_name:
+            account_monitor.first_name = session.get("first_name")
+            account_monitor.last_name = session.get("last_name")
+
+        session_store.log_stats()
+        return reservations
+
+    def _save_session(
+        self, driver: Driver, account_monitor: AccountMonitor, session_store: SessionStore
+    ) -> None:
+        """
+        Store the logged in session's cookies and storage. The account name is stored as well as
+        it is only retrieved when logging in.
+        """
+        try:
+            cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+            storage = driver.execute_script(GET_STORAGE_SCRIPT)
+        except WebDriverException as e:
+            logger.debug("Failed to retrieve the logged in session: %s", e)
+            return
+
+        session_store.save(
+            {
+                "cookies": [self._get_cookie_param(cookie) for cookie in cookies],
+                "local_storage": storage["local"],
+                "session_storage": storage["session"],
+                "first_name": account_monitor.first_name,
+                "last_name": account_monitor.last_name,
+            }
+        )
+
+    def _get_cookie_param(self, cookie: JSON) -> JSON:
+        """Keep only the fields of a cookie that can be set again"""
+        cookie_param = {key: cookie[key] for key in COOKIE_PARAM_FIELDS if key in cookie}
+        if cookie.get("session"):
+            # Session cookies have no expiration
+            cookie_param.pop("expires", None)
+
+        return cookie_param
+
+    def _reset_session(self, driver: Driver) -> None:
+        """Clear the restored session and reload the check-in page so a full login can be done"""
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_script(CLEAR_STORAGE_SCRIPT)
+
+        self.trips_request_id = None
+        self.trips_status_code = None
+        self.attribute_events["trips_request_id"].clear()
+        self._open_checkin_page(driver)
+
     def _get_driver(self) -> Driver:
+        with self._time_phase("driver_start"):
+            if self.session is None:
+                self.driver, _ = self._start_browser()
+            else:
+                self.driver = self.session.get_driver(self._start_browser)
+
+        self.driver.add_cdp_listener("Network.requestWillBeSent", self._headers_listener)
+        self.driver.add_cdp_listener("Network.loadingFinished", self._loading_finished_listener)
+        self._apply_load_profile(self.driver)
+
+        # Opening the page again in a reused browser produces fresh headers as well
+        logger.debug("Loading Southwest check-in page (this may take a moment)")
+        self.load_start_time = time.monotonic()
+        with self._time_phase("page_open"):
+            self._open_checkin_page(self.driver)
+
+        self._take_debug_screenshot(self.driver, "after_page_load.png")
+        return self.driver
+
+    def _open_checkin_page(self, driver: Driver) -> None:
+        try:
+            driver.open(CHECKIN_URL)
+        except TimeoutException:
+            # The headers might still be captured, which is all that is waited for
+            logger.debug("Page load budget exceeded. Continuing with the partially loaded page")
+
+    def _apply_load_profile(self, driver: Driver) -> None:
+        """
+        The lean load profile blocks resources that aren't needed and limits how long the page
+        can take to load. These are set on every use so a reused browser keeps them as well
+        """
+        if self.load_profile != BrowserLoadProfile.LEAN:
+            return
+
+        logger.debug("Using the lean browser load profile")
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS})
+        driver.set_page_load_timeout(LEAN_PAGE_LOAD_BUDGET_SECS)
+
+    def _start_browser(self) -> tuple[Driver, Display | None]:
+        """Start a new browser. The virtual display it uses is returned as well (if any)"""
         logger.debug("Starting webdriver for current session")
-        browser_path = self.checkin_scheduler.reservation_monitor.config.browser_path
+        config = self.checkin_scheduler.reservation_monitor.config
+        browser_path = config.browser_path
 
-        driver_version = "mlatest"
         if IS_DOCKER:
             self._start_display()
             # Make sure a new driver is not downloaded as the Docker image
             # already has the correct driver
-            driver_version = "keep"
-
-        self.driver = Driver(
+            return self._create_driver(browser_path, "keep"), self.display
+
+        driver_cache = DriverCache(config.driver_cache_ttl)
+        if driver_cache.get(browser_path) is not None:
+            try:
+                # Use the driver that was already resolved without checking for a matching one
+                return self._create_driver(browser_path, "keep"), self.display
+            except Exception as e:
+                logger.debug("Failed to start browser with cached driver. Resolving again: %s", e)
+                driver_cache.invalidate(browser_path)
+
+        driver = self._create_driver(browser_path, "mlatest")
+        driver_version = driver.caps.get("chrome", {}).get("chromedriverVersion", "").split(" ")[0]
+        driver_cache.store(browser_path, driver.caps["browserVersion"], driver_version)
+        return driver, self.display
+
+    def _create_driver(self, browser_path: str | None, driver_version: str) -> Driver:
+        # Don't wait for images and subresources to finish loading with the lean load profile
+        page_load_strategy = "eager" if self.load_profile == BrowserLoadProfile.LEAN else None
+
+        driver = Driver(
             binary_location=browser_path,
             driver_version=driver_version,
             headed=IS_DOCKER,
             headless=not IS_DOCKER,
+            page_load_strategy=page_load_strategy,
             uc_cdp_events=True,
             undetectable=True,
             incognito=True,
+            **self._get_instance_options(),
         )
 
-        logger.debug("Using browser version: %s", self.driver.caps["browserVersion"])
+        logger.debug("Using browser version: %s", driver.caps["browserVersion"])
+        register_browser(driver, self.display)
+        return driver
 
-        #self.driver.add_cdp_listener("Network.requestWillBeSent", self._headers_listener)
+    def _get_instance_options(self) -> JSON:
+        """Isolate the browser from browsers running in other slots at the same time"""
+        if self.browser_slot is None:
+            return {}
 
-        logger.debug("Loading Southwest check-in page (this may take a moment)")
-        self.driver.open(CHECKIN_URL)
-        self._take_debug_screenshot(self.driver, "after_page_load.png")
-        return self.driver
+        profile_directory = BROWSER_PROFILES_DIRECTORY / f"slot_{self.browser_slot}"
+        debugging_port = BASE_DEBUGGING_PORT + self.browser_slot
+        logger.debug("Using browser slot %d (port %d)", self.browser_slot, debugging_port)
+
+        chromium_args = [f"--remote-debugging-port={debugging_port}"]
+        if IS_DOCKER:
+            # Point the browser at the slot's display directly. The DISPLAY environment variable
+            # is shared by every thread in the process, so it can't be relied on
+            chromium_args.append(f"--display=:{get_display_number(self.browser_slot)}")
+
+        return {
+            "user_data_dir": str(profile_directory),
+            "chromium_arg": ",".join(chromium_args),
+        }
+
+    def _headers_listener(self, data: JSON) -> None:
+        """
+        Wait for the request on the check-in page that is sent with valid headers. Once the
+        headers are captured, any wait for them finishes right away. This is the only thing a
+        plain header refresh waits for.
+        """
+        request = data["params"]["request"]
+        if request["url"] == HEADERS_URL and not self.headers_set:
+            logger.debug("Captured valid headers")
+            self.checkin_scheduler.headers = self._get_needed_headers(request["headers"])
+            if self.load_start_time is not None:
+                self.time_to_ready = time.monotonic() - self.load_start_time
+            self._set_attribute("headers_set", True)
+
+    def _loading_finished_listener(self, data: JSON) -> None:
+        """Count the bytes downloaded by the browser during this session"""
+        self.bytes_downloaded += data["params"].get("encodedDataLength", 0)
 
     def _login_listener(self, data: JSON) -> None:
         """
@@ -170,23 +467,31 @@ class WebDriver:
         response = data["params"]["response"]
         if response["url"] == LOGIN_URL:
             logger.debug("Login response has been received")
-            self.login_request_id = data["params"]["requestId"]
+            # The status code must be set before the waiting thread is notified
             self.login_status_code = response["status"]
+            self._set_attribute("login_request_id", data["params"]["requestId"])
         elif response["url"] == TRIPS_URL:
             logger.debug("Upcoming trips response has been received")
-            self.trips_request_id = data["params"]["requestId"]
+            self.trips_status_code = response["status"]
+            self._set_attribute("trips_request_id", data["params"]["requestId"])
+
+    def _set_attribute(self, attribute: str, value: Any) -> None:
+        """Set an attribute and wake up anything waiting for it"""
+        setattr(self, attribute, value)
+        self.attribute_events[attribute].set()
+
+    def _wait_for_attribute(self, attribute: str, timeout: int | None = None) -> None:
+        if timeout is None:
+            timeout = WAIT_TIMEOUT_SECS
 
-    def _wait_for_attribute(self, attribute: str) -> None:
-        logger.debug("Waiting for %s to be set (timeout: %d seconds)", attribute, WAIT_TIMEOUT_SECS)
-        poll_interval = 0.5
+        logger.debug("Waiting for %s to be set (timeout: %d seconds)", attribute, timeout)
 
-        attempts = 0
-        max_attempts = WAIT_TIMEOUT_SECS / poll_interval
-        while not getattr(self, attribute) and attempts < max_attempts:
-            time.sleep(poll_interval)
-            attempts += 1
+        # The attribute might have been set before the event was waited on
+        event = self.attribute_events[attribute]
+        with self._time_phase(f"wait_{attribute}"):
+            is_set = getattr(self, attribute) or event.wait(timeout)
 
-        if attempts >= max_attempts:
+        if not is_set:
             timeout_err = DriverTimeoutError(f"Timeout waiting for the '{attribute}' attribute")
             logger.debug(timeout_err)
             raise timeout_err
@@ -198,26 +503,12 @@ class WebDriver:
         Waits for the login request to go through and sets the account name appropriately.
         Handles login errors, if necessary.
         """
-        self._click_login_button(driver)
+        with self._time_phase("login_submit"):
+            self._click_login_button(driver)
         self._wait_for_attribute("login_request_id")
-        # Manually inject cookies into headers after login completes
-        request_headers = {
-            "x-api-key": "l7xx2c186c1297274b828b1872e22edfe67a",  # or pull dynamically
-            "x-channel-id": "MWEB",
-            "user-agent": self.driver.execute_script("return navigator.userAgent;"),
-            "accept": "application/json",
-            "referer": "https://mobile.southwest.com/air/check-in/",
-            "content-type": "application/json",
-        }
 
-        # Inject cookie header from current browser session
-        cookies = self.driver.get_cookies()
-        cookie_header = "; ".join([f"{c['name']}={c['value']}" for c in cookies])
-        request_headers["cookie"] = cookie_header
-        
-        # Save for checkin_scheduler
-        self.checkin_scheduler.headers = request_headers
-        self.headers_set = True
+        # The session's cookies change once logged in, so refresh them in the captured headers
+        self.checkin_scheduler.headers = self._get_needed_headers(self.checkin_scheduler.headers)
 
         login_response = self._get_response_body(driver, self.login_request_id)
 
@@ -258,7 +549,8 @@ class WebDriver:
         return [reservation for reservation in reservations if reservation["tripType"] == "FLIGHT"]
 
     def _get_response_body(self, driver: Driver, request_id: str) -> JSON:
-        response = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        with self._time_phase("response_body"):
+            response = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
         return json.loads(response["body"])
 
     def _handle_login_error(self, response: JSON) -> LoginError:
@@ -272,8 +564,16 @@ class WebDriver:
         return LoginError(reason, self.login_status_code)
 
     def _get_needed_headers(self, request_headers: JSON) -> JSON:
-        headers = dict(request_headers)
-    
+        """
+        Keep only the headers needed for the Southwest API: the API key, channel ID, user agent,
+        and the randomly named security headers (e.g. EE30zvQLWf-b). The browser session's
+        cookies are added as well.
+        """
+        headers = {}
+        for header in request_headers:
+            if re.match(r"x-api-key|x-channel-id|user-agent|^[\w-]+?-\w$", header, re.IGNORECASE):
+                headers[header] = request_headers[header]
+
         try:
             cookies = self.driver.get_cookies() if hasattr(self, "driver") else []
             cookie_header = "; ".join([f"{c['name']}={c['value']}" for c in cookies])
@@ -281,10 +581,8 @@ class WebDriver:
                 headers["cookie"] = cookie_header
         except Exception as e:
             logger.debug("Error while extracting cookies: %s", e)
-    
-        return headers
-
 
+        return headers
 
     def _set_account_name(self, account_monitor: AccountMonitor, response: JSON) -> None:
         if account_monitor.first_name:
@@ -301,12 +599,48 @@ class WebDriver:
         )  # Don't log as it contains sensitive information
 
     def _quit_driver(self, driver: Driver) -> None:
-        driver.quit()
-        self._stop_display()
+        self._report_load_stats()
+
+        with self._time_phase("quit"):
+            if self.session is not None:
+                # Keep the browser running for the next job
+                self.session.release()
+            else:
+                driver.quit()
+                unregister_browser(driver, self.display)
+                self._stop_display()
+
+        self.phase_timer.write()
+
+    @contextmanager
+    def _time_phase(self, name: str) -> Iterator[None]:
+        """Time a phase of the session and sample the browser's memory once the phase is done"""
+        try:
+            with self.phase_timer.phase(name):
+                yield
+        finally:
+            # The browser might not be started yet or have already quit
+            driver = getattr(self, "driver", None)
+            self.phase_timer.sample_memory(getattr(driver, "browser_pid", None))
+
+    def _report_load_stats(self) -> None:
+        time_to_ready = "unknown" if self.time_to_ready is None else f"{self.time_to_ready:.2f}s"
+        logger.debug(
+            "Browser session downloaded %.1f KB and was ready in %s (%s load profile)",
+            self.bytes_downloaded / 1024,
+            time_to_ready,
+            self.load_profile.value,
+        )
 
     def _start_display(self) -> None:
+        if self.browser_slot is not None:
+            # The slot's display is long-lived and keeps running after the browser quits, so it is
+            # not stored in self.display to be stopped
+            get_display_manager().lease(self.browser_slot)
+            return
+
         try:
-            self.display = Display(size=(1440, 1880), backend="xvfb")
+            self.display = Display(size=DISPLAY_SIZE, backend="xvfb")
             self.display.start()
 
             if self.display.is_alive():
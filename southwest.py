@@ -16,6 +16,8 @@ Options:
     --test-notifications   Test the notification URLs configuration and exit
     --debug-screenshots    Take screenshots of the browser for debugging purposes. Screenshots
                            will be stored in the 'logs/' directory
+    --phase-timings        Display percentiles of how long each phase of the recorded browser
+                           sessions took and exit
     -v, --verbose          Display debug messages
     -h, --help             Display this help and exit
     -V, --version          Display version information and exit
@@ -2,7 +2,6 @@
 
 import copy
 from datetime import datetime
-from multiprocessing import Lock
 from unittest.mock import call
 
 import pytest
@@ -27,7 +26,7 @@ def handler(mocker: MockerFixture) -> None:
     flight = Flight(flight_info, {}, "TEST")
     # Make sure it isn't affected by local time
     flight.departure_time = datetime(2021, 12, 6, 14, 40)
-    return CheckInHandler(mock_scheduler, flight, Lock())
+    return CheckInHandler(mock_scheduler, flight)
 
 
 @pytest.mark.parametrize("same_day_flight", [False, True])
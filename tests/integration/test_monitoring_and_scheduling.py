@@ -5,20 +5,22 @@ are set, errors are handled, and integration with the webdriver works.
 
 import json
 from datetime import datetime, timezone
-from multiprocessing import Lock
+from pathlib import Path
 from unittest import mock
 
 import pytest
 from pytest_mock import MockerFixture
 from requests_mock.mocker import Mocker as RequestMocker
 
+from lib.browser_arbiter import BrowserArbiter
 from lib.checkin_scheduler import VIEW_RESERVATION_URL
 from lib.config import GlobalConfig
-from lib.reservation_monitor import AccountMonitor, ReservationMonitor
+from lib.reservation_monitor import TRIPS_URL, AccountMonitor, ReservationMonitor
 from lib.utils import BASE_URL
 from lib.webdriver import WebDriver
 
 TEST_RESERVATION_URL = BASE_URL + VIEW_RESERVATION_URL + "TEST"
+TEST_TRIPS_URL = BASE_URL + TRIPS_URL
 
 ALL_HEADERS = {
     "Host": "test_host",
@@ -53,6 +55,11 @@ EXPECTED_HEADERS = {
 }
 
 
+@pytest.fixture(autouse=True)
+def _mock_phase_timings_directory(mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch("lib.phase_timings.LOGS_DIRECTORY", tmp_path)
+
+
 def test_flight_is_scheduled_checks_in_and_departs(
     requests_mock: RequestMocker, mocker: MockerFixture
 ) -> None:
@@ -110,7 +117,7 @@ def test_flight_is_scheduled_checks_in_and_departs(
         [{"json": reservation1, "status_code": 200}, {"json": reservation1, "status_code": 200}],
     )
 
-    monitor = ReservationMonitor(config.reservations[0], Lock())
+    monitor = ReservationMonitor(config.reservations[0], BrowserArbiter())
     monitor.monitor()
 
     scheduler = monitor.checkin_scheduler
@@ -144,8 +151,9 @@ def test_account_schedules_new_flights(requests_mock: RequestMocker, mocker: Moc
     mocker.patch("lib.checkin_scheduler.get_current_time", return_value=current_utc_time)
     mocker.patch("lib.webdriver.seleniumbase_actions.wait_for_element_not_visible")
     mock_process = mocker.patch("lib.checkin_handler.Process").return_value
-    # Raise a StopIteration to prevent an infinite loop
-    mocker.patch("time.sleep", side_effect=[None, None, None, None, None, StopIteration])
+    # Raise a StopIteration to prevent an infinite loop. The failed upcoming trips request with
+    # the expired session sleeps once as well
+    mocker.patch("time.sleep", side_effect=[None, None, None, None, None, None, StopIteration])
 
     # Is checked in a separate integration test
     mock_check_flight_price = mocker.patch("lib.fare_checker.FareChecker.check_flight_price")
@@ -214,8 +222,10 @@ def test_account_schedules_new_flights(requests_mock: RequestMocker, mocker: Moc
     }
 
     requests_mock.post(TEST_RESERVATION_URL, [{"json": reservation, "status_code": 200}])
+    # The session from the first login has expired, so the account logs in again
+    requests_mock.get(TEST_TRIPS_URL, status_code=401)
 
-    monitor = AccountMonitor(config.accounts[0], Lock())
+    monitor = AccountMonitor(config.accounts[0], BrowserArbiter())
     with pytest.raises(StopIteration):
         monitor.monitor()
 
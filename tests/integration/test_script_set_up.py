@@ -9,6 +9,7 @@ from pytest_mock import MockerFixture
 
 import southwest
 from lib import main
+from lib.reservation_monitor import MONITOR_NAME
 
 
 @pytest.fixture(autouse=True)
@@ -92,6 +93,7 @@ def test_account_from_command_line_with_verbose(
     mocker: MockerFixture, verbose_flag: str, logger: logging.Logger
 ) -> None:
     mock_process = mocker.patch("multiprocessing.Process").return_value
+    mock_process.name = MONITOR_NAME
     mocker.patch("multiprocessing.active_children", return_value=[mock_process])
 
     args = ["test_user", "test_pass", verbose_flag]
@@ -111,6 +113,7 @@ def test_reservation_from_command_line_without_verbose(
     mocker: MockerFixture, logger: logging.Logger
 ) -> None:
     mock_process = mocker.patch("multiprocessing.Process").return_value
+    mock_process.name = MONITOR_NAME
     mocker.patch("multiprocessing.active_children", return_value=[mock_process])
 
     args = ["TEST", "Charli", "Silvester"]
@@ -136,6 +139,7 @@ def test_accounts_and_reservations_from_config(mocker: MockerFixture) -> None:
     mocker.patch("pathlib.Path.read_text", return_value=json.dumps(config))
 
     mock_process = mocker.patch("multiprocessing.Process").return_value
+    mock_process.name = MONITOR_NAME
     mocker.patch("multiprocessing.active_children", return_value=[mock_process, mock_process])
 
     main.main([], "test_version")
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import pytest
+
+from lib.browser_arbiter import (
+    CHECK_IN_GUARD_SECS,
+    MIN_REGISTERED_CHECK_INS,
+    REGISTERED_CHECK_INS_PER_MONITOR,
+    BrowserArbiter,
+    BrowserPriority,
+)
+
+if TYPE_CHECKING:
+    from pytest_mock import MockerFixture
+
+# Timestamp for 1999-12-31 00:00:00 UTC
+CURRENT_TIME = 946598400
+
+
+@pytest.fixture(autouse=True)
+def mock_time(mocker: MockerFixture) -> mock.Mock:
+    return mocker.patch("time.time", return_value=CURRENT_TIME)
+
+
+@pytest.fixture(autouse=True)
+def mock_has_memory_for_browser(mocker: MockerFixture) -> mock.Mock:
+    """Don't let the host's memory decide whether a slot can be used"""
+    return mocker.patch("lib.browser_arbiter.has_memory_for_browser", return_value=True)
+
+
+def get_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class TestBrowserArbiter:
+    @pytest.fixture(autouse=True)
+    def _set_up_arbiter(self) -> None:
+        self.arbiter = BrowserArbiter()
+
+    def test_use_acquires_and_releases_a_browser_slot(self) -> None:
+        with self.arbiter.use(BrowserPriority.ROUTINE) as slot:
+            assert slot == 0
+            assert self.arbiter.slots_in_use[0]
+
+        assert not self.arbiter.slots_in_use[0]
+        assert self.arbiter.num_acquired[BrowserPriority.ROUTINE] == 1
+
+    def test_use_records_the_owner_of_a_browser_slot(self, mocker: MockerFixture) -> None:
+        mocker.patch("os.getpid", return_value=1234)
+        mocker.patch("lib.browser_arbiter.read_start_time", return_value=5678)
+
+        with self.arbiter.use(BrowserPriority.ROUTINE):
+            assert self.arbiter.slot_owner_pids[0] == 1234
+            assert self.arbiter.slot_owner_start_times[0] == 5678
+
+        assert self.arbiter.slot_owner_pids[0] == 0
+        assert self.arbiter.slot_owner_start_times[0] == 0
+
+    def test_release_orphaned_slots_releases_slots_of_stopped_processes(
+        self, mocker: MockerFixture
+    ) -> None:
+        arbiter = BrowserArbiter(3)
+        for slot, pid in enumerate([100, 200]):
+            arbiter.slots_in_use[slot] = True
+            arbiter.slot_owner_pids[slot] = pid
+            arbiter.slot_owner_start_times[slot] = 10
+
+        mock_is_process_running = mocker.patch(
+            "lib.browser_arbiter.is_process_running", side_effect=[True, False]
+        )
+
+        assert arbiter.release_orphaned_slots() == 1
+        assert list(arbiter.slots_in_use) == [True, False, False]
+        assert list(arbiter.slot_owner_pids) == [100, 0, 0]
+        mock_is_process_running.assert_has_calls([mock.call(100, 10), mock.call(200, 10)])
+
+    def test_acquire_records_waiters_until_a_slot_is_acquired(self, mocker: MockerFixture) -> None:
+        self.arbiter.slots_in_use[0] = True
+
+        def sleep(_: float) -> None:
+            assert self.arbiter._count_waiters(BrowserPriority.CHECK_IN) == 1
+            self.arbiter.release(0)
+
+        mocker.patch("time.sleep", side_effect=sleep)
+
+        assert self.arbiter.acquire(BrowserPriority.CHECK_IN) == 0
+        assert self.arbiter._count_waiters(BrowserPriority.CHECK_IN) == 0
+
+    def test_release_orphaned_slots_removes_waiters_of_stopped_processes(
+        self, mocker: MockerFixture
+    ) -> None:
+        self.arbiter._add_waiter(BrowserPriority.CHECK_IN, 100, 10)
+        self.arbiter._add_waiter(BrowserPriority.CHECK_IN, 200, 10)
+        mocker.patch("lib.browser_arbiter.is_process_running", side_effect=[True, False])
+
+        self.arbiter.release_orphaned_slots()
+
+        assert list(self.arbiter.waiter_pids[:2]) == [100, 0]
+        assert self.arbiter._count_waiters(BrowserPriority.CHECK_IN) == 1
+
+    @pytest.mark.skipif(not os.path.isdir("/proc"), reason="Processes are found through /proc")
+    def test_killing_a_waiting_process_does_not_block_other_processes(self) -> None:
+        """A check-in process is stopped with SIGTERM while it waits for a browser"""
+        ctx = multiprocessing.get_context("fork")
+        self.arbiter.acquire(BrowserPriority.ROUTINE)
+        process = ctx.Process(target=self.arbiter.acquire, args=(BrowserPriority.CHECK_IN,))
+        process.start()
+
+        for _ in range(100):
+            if self.arbiter._count_waiters(BrowserPriority.CHECK_IN) == 1:
+                break
+            time.sleep(0.01)
+        assert self.arbiter._count_waiters(BrowserPriority.CHECK_IN) == 1
+
+        os.kill(process.pid, signal.SIGTERM)
+        process.join()
+
+        released = threading.Event()
+        threading.Thread(
+            target=lambda: (self.arbiter.release(0), released.set()), daemon=True
+        ).start()
+        assert released.wait(1)
+
+        self.arbiter.release_orphaned_slots()
+        assert self.arbiter._count_waiters(BrowserPriority.CHECK_IN) == 0
+        assert self.arbiter._can_acquire(BrowserPriority.ROUTINE)
+
+    def test_use_acquires_separate_slots_concurrently(self) -> None:
+        arbiter = BrowserArbiter(2)
+
+        with arbiter.use(BrowserPriority.ROUTINE) as first_slot:
+            with arbiter.use(BrowserPriority.CHECK_IN) as second_slot:
+                assert (first_slot, second_slot) == (0, 1)
+                assert list(arbiter.slots_in_use) == [True, True]
+
+            assert list(arbiter.slots_in_use) == [True, False]
+
+    def test_arbiter_can_be_used_as_a_lock(self) -> None:
+        with self.arbiter:
+            assert self.arbiter.slots_in_use[0]
+
+        assert not self.arbiter.slots_in_use[0]
+        assert self.arbiter.held_slots == {}
+
+    def test_acquire_waits_until_browser_is_released(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.browser_arbiter.ACQUIRE_POLL_INTERVAL_SECS", 0.01)
+        self.arbiter.acquire(BrowserPriority.ROUTINE)
+        acquired = threading.Event()
+
+        def acquire() -> None:
+            self.arbiter.acquire(BrowserPriority.CHECK_IN)
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        assert not acquired.wait(0.05)
+
+        self.arbiter.release(0)
+        thread.join()
+        assert acquired.is_set()
+
+    @pytest.mark.parametrize(
+        ("priority", "num_check_ins_waiting", "refresh_offset", "expected_result"),
+        [
+            (BrowserPriority.ROUTINE, 0, None, True),
+            (BrowserPriority.ROUTINE, 1, None, False),
+            (BrowserPriority.ROUTINE, 0, CHECK_IN_GUARD_SECS, False),
+            (BrowserPriority.ROUTINE, 0, CHECK_IN_GUARD_SECS + 1, True),
+            (BrowserPriority.ROUTINE, 0, -CHECK_IN_GUARD_SECS, False),
+            # The registration is stale
+            (BrowserPriority.ROUTINE, 0, -CHECK_IN_GUARD_SECS - 1, True),
+            (BrowserPriority.CHECK_IN, 1, 0, True),
+            (None, 1, 0, True),
+        ],
+    )
+    def test_can_acquire_gives_check_ins_priority(
+        self,
+        priority: BrowserPriority | None,
+        num_check_ins_waiting: int,
+        refresh_offset: int | None,
+        expected_result: bool,
+    ) -> None:
+        for waiter in range(num_check_ins_waiting):
+            self.arbiter._add_waiter(BrowserPriority.CHECK_IN, 1000 + waiter, 0)
+        if refresh_offset is not None:
+            self.arbiter.check_in_refresh_times[0] = CURRENT_TIME + refresh_offset
+
+        assert self.arbiter._can_acquire(priority) == expected_result
+
+    def test_can_acquire_defers_routine_use_during_quiet_window(self) -> None:
+        arbiter = BrowserArbiter(quiet_window=120)
+        arbiter.check_in_times[0] = CURRENT_TIME + 60
+
+        assert not arbiter._can_acquire(BrowserPriority.ROUTINE)
+        assert arbiter._can_acquire(BrowserPriority.CHECK_IN)
+
+    def test_acquire_counts_deferred_routine_use(self, mocker: MockerFixture) -> None:
+        arbiter = BrowserArbiter(quiet_window=120)
+        arbiter.check_in_times[0] = CURRENT_TIME
+        # The quiet window is over once the check-in time is unregistered
+        mocker.patch("time.sleep", side_effect=lambda _: arbiter.check_in_times.__setitem__(0, 0))
+
+        arbiter.acquire(BrowserPriority.ROUTINE)
+        assert arbiter.num_deferred.value == 1
+
+    def test_can_acquire_returns_false_when_every_slot_is_in_use(self) -> None:
+        self.arbiter.slots_in_use[0] = True
+        assert not self.arbiter._can_acquire(BrowserPriority.CHECK_IN)
+
+    def test_can_acquire_returns_false_when_memory_is_low(
+        self, mock_has_memory_for_browser: mock.Mock
+    ) -> None:
+        arbiter = BrowserArbiter(2)
+        arbiter.slots_in_use[0] = True
+        mock_has_memory_for_browser.return_value = False
+
+        assert not arbiter._can_acquire(BrowserPriority.CHECK_IN)
+        mock_has_memory_for_browser.assert_called_once_with(1)
+
+    @pytest.mark.parametrize(
+        ("num_monitors", "expected_size"),
+        [(0, MIN_REGISTERED_CHECK_INS), (100, 100 * REGISTERED_CHECK_INS_PER_MONITOR)],
+    )
+    def test_registered_check_ins_are_sized_from_the_number_of_monitors(
+        self, num_monitors: int, expected_size: int
+    ) -> None:
+        arbiter = BrowserArbiter(num_monitors=num_monitors)
+        assert len(arbiter.check_in_refresh_times) == expected_size
+        assert len(arbiter.check_in_times) == expected_size
+
+    def test_register_check_in_uses_empty_and_stale_slots(self) -> None:
+        self.arbiter.check_in_refresh_times[0] = CURRENT_TIME + 100
+        self.arbiter.check_in_refresh_times[1] = CURRENT_TIME - CHECK_IN_GUARD_SECS - 1
+        refresh_time = get_datetime(CURRENT_TIME + 200)
+
+        assert self.arbiter.register_check_in(refresh_time) == 1
+        assert self.arbiter.register_check_in(refresh_time) == 2
+        assert self.arbiter.check_in_refresh_times[1] == CURRENT_TIME + 200
+
+    def test_register_check_in_returns_none_when_all_slots_are_taken(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        for slot in range(len(self.arbiter.check_in_refresh_times)):
+            self.arbiter.check_in_refresh_times[slot] = CURRENT_TIME
+
+        assert self.arbiter.register_check_in(get_datetime(CURRENT_TIME)) is None
+        assert caplog.records[-1].levelname == "WARNING"
+
+    def test_unregister_check_in_clears_slot(self) -> None:
+        refresh_time = get_datetime(CURRENT_TIME + 100)
+        slot = self.arbiter.register_check_in(refresh_time)
+
+        self.arbiter.unregister_check_in(slot, refresh_time)
+
+        assert self.arbiter.check_in_refresh_times[slot] == 0
+
+    def test_unregister_check_in_does_not_clear_reused_slot(self) -> None:
+        self.arbiter.check_in_refresh_times[0] = CURRENT_TIME + 200
+
+        self.arbiter.unregister_check_in(0, get_datetime(CURRENT_TIME + 100))
+        self.arbiter.unregister_check_in(None, get_datetime(CURRENT_TIME + 200))
+
+        assert self.arbiter.check_in_refresh_times[0] == CURRENT_TIME + 200
+
+    def test_register_check_in_time_uses_empty_and_past_quiet_window_slots(self) -> None:
+        arbiter = BrowserArbiter(quiet_window=120)
+        arbiter.check_in_times[0] = CURRENT_TIME - 100
+        arbiter.check_in_times[1] = CURRENT_TIME - 121
+        checkin_time = get_datetime(CURRENT_TIME + 200)
+
+        assert arbiter.register_check_in_time(checkin_time) == 1
+        assert arbiter.register_check_in_time(checkin_time) == 2
+        assert arbiter.check_in_times[1] == CURRENT_TIME + 200
+
+    def test_register_check_in_time_does_nothing_without_quiet_window(self) -> None:
+        assert self.arbiter.register_check_in_time(get_datetime(CURRENT_TIME + 100)) is None
+        assert self.arbiter.check_in_times[0] == 0
+
+    def test_register_check_in_time_returns_none_when_all_slots_are_taken(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        arbiter = BrowserArbiter(quiet_window=120)
+        for slot in range(len(arbiter.check_in_times)):
+            arbiter.check_in_times[slot] = CURRENT_TIME
+
+        assert arbiter.register_check_in_time(get_datetime(CURRENT_TIME)) is None
+        assert caplog.records[-1].levelname == "WARNING"
+
+    def test_unregister_check_in_time_clears_slot(self) -> None:
+        arbiter = BrowserArbiter(quiet_window=120)
+        checkin_time = get_datetime(CURRENT_TIME + 100)
+        slot = arbiter.register_check_in_time(checkin_time)
+
+        arbiter.unregister_check_in_time(slot, checkin_time)
+        arbiter.unregister_check_in_time(None, checkin_time)
+
+        assert arbiter.check_in_times[slot] == 0
+
+    def test_unregister_check_in_time_does_not_clear_reused_slot(self) -> None:
+        arbiter = BrowserArbiter(quiet_window=120)
+        arbiter.check_in_times[0] = CURRENT_TIME + 200
+
+        arbiter.unregister_check_in_time(0, get_datetime(CURRENT_TIME + 100))
+        assert arbiter.check_in_times[0] == CURRENT_TIME + 200
+
+    def test_wait_for_quiet_window_does_not_wait_outside_window(
+        self, mocker: MockerFixture
+    ) -> None:
+        arbiter = BrowserArbiter(quiet_window=120)
+        arbiter.check_in_times[0] = CURRENT_TIME + 121
+        mock_wait = mocker.patch("time.sleep")
+
+        arbiter.wait_for_quiet_window("test")
+
+        mock_wait.assert_not_called()
+        assert arbiter.num_deferred.value == 0
+
+    def test_wait_for_quiet_window_waits_until_window_is_over(
+        self, mock_time: mock.Mock, mocker: MockerFixture
+    ) -> None:
+        arbiter = BrowserArbiter(quiet_window=120)
+        arbiter.check_in_times[0] = CURRENT_TIME - 100
+        arbiter.check_in_times[1] = CURRENT_TIME + 60
+
+        def wait(_: float) -> None:
+            mock_time.return_value = CURRENT_TIME + 181
+
+        mock_wait = mocker.patch("time.sleep", side_effect=wait)
+
+        arbiter.wait_for_quiet_window("test")
+
+        mock_wait.assert_called_once_with(30)
+        assert arbiter.num_deferred.value == 1
+
+    def test_wait_for_quiet_window_waits_until_last_window_ends(
+        self, mock_time: mock.Mock, mocker: MockerFixture
+    ) -> None:
+        arbiter = BrowserArbiter(quiet_window=120)
+        arbiter.check_in_times[0] = CURRENT_TIME - 100
+
+        def wait(_: float) -> None:
+            mock_time.return_value = CURRENT_TIME + 21
+
+        mock_wait = mocker.patch("time.sleep", side_effect=wait)
+
+        arbiter.wait_for_quiet_window("test")
+
+        # The quiet window ends in 20 seconds, which is sooner than the poll interval
+        mock_wait.assert_called_once_with(20)
+
+    def test_get_stats_reports_wait_time_per_priority(self) -> None:
+        self.arbiter.num_acquired[BrowserPriority.CHECK_IN] = 2
+        self.arbiter.total_wait_time[BrowserPriority.CHECK_IN] = 5
+
+        assert self.arbiter.get_stats() == {
+            "check_in": {"waiting": 0, "acquired": 2, "average_wait_time": 2.5},
+            "routine": {"waiting": 0, "acquired": 0, "average_wait_time": 0},
+            "deferred": 0,
+        }
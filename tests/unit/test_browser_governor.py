@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import pytest
+
+from lib import browser_governor
+from lib.browser_governor import MEMORY_PER_BROWSER, BrowserReaper
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest_mock import MockerFixture
+
+
+def write_process(
+    proc_directory: Path, pid: int, parent_pid: int, memory_kb: int, start_time: int = 100
+) -> None:
+    process_directory = proc_directory / str(pid)
+    process_directory.mkdir()
+    # The start time is the 22nd field
+    fields = ["S", str(parent_pid)] + ["0"] * 17 + [str(start_time)]
+    (process_directory / "stat").write_text(f"{pid} (chrome (renderer)) {' '.join(fields)}")
+    (process_directory / "status").write_text(f"Name:\tchrome\nVmRSS:\t{memory_kb} kB\n")
+
+
+@pytest.fixture
+def proc_directory(mocker: MockerFixture, tmp_path: Path) -> Path:
+    directory = tmp_path / "proc"
+    directory.mkdir()
+    (directory / "self").mkdir()
+    mocker.patch.object(browser_governor, "PROC_DIRECTORY", str(directory))
+    return directory
+
+
+@pytest.fixture
+def registry_directory(mocker: MockerFixture, tmp_path: Path) -> Path:
+    directory = tmp_path / "running_browsers"
+    mocker.patch.object(browser_governor, "BROWSER_REGISTRY_DIRECTORY", directory)
+    return directory
+
+
+def write_record(registry_directory: Path, name: str, record: str) -> None:
+    record_path = registry_directory / name
+    record_path.write_text(record)
+    record_path.chmod(0o600)
+
+
+def get_mock_driver(driver_pid: int, browser_pid: int) -> mock.Mock:
+    driver = mock.Mock()
+    driver.service.process.pid = driver_pid
+    driver.browser_pid = browser_pid
+    return driver
+
+
+def test_get_process_tree_memory_sums_every_descendant(proc_directory: Path) -> None:
+    write_process(proc_directory, 10, 1, 100)
+    write_process(proc_directory, 11, 10, 200)
+    write_process(proc_directory, 12, 11, 300)
+    # Not a descendant of the browser
+    write_process(proc_directory, 20, 1, 1000)
+
+    assert browser_governor.get_process_tree_memory(10) == 600 * 1024
+
+
+def test_get_process_tree_memory_returns_none_without_proc(mocker: MockerFixture) -> None:
+    mocker.patch("os.listdir", side_effect=OSError)
+    assert browser_governor.get_process_tree_memory(10) is None
+
+
+@pytest.mark.parametrize("stat_content", ["10 (chrome)", "10 (chrome) S invalid"])
+def test_get_process_tree_skips_processes_with_malformed_stat(
+    proc_directory: Path, stat_content: str
+) -> None:
+    write_process(proc_directory, 10, 1, 100)
+    write_process(proc_directory, 11, 10, 200)
+    (proc_directory / "11" / "stat").write_text(stat_content)
+
+    assert browser_governor.get_process_tree(10) == [10]
+
+
+def test_get_available_memory_reads_meminfo(proc_directory: Path) -> None:
+    (proc_directory / "meminfo").write_text("MemTotal: 4000 kB\nMemAvailable: 2000 kB\n")
+    assert browser_governor.get_available_memory() == 2000 * 1024
+
+
+@pytest.mark.usefixtures("proc_directory")
+def test_get_available_memory_returns_none_without_meminfo() -> None:
+    assert browser_governor.get_available_memory() is None
+
+
+@pytest.mark.parametrize(
+    ("num_running", "available_memory", "expected_result"),
+    [
+        (0, 0, True),
+        (1, None, True),
+        (1, MEMORY_PER_BROWSER, True),
+        (1, MEMORY_PER_BROWSER - 1, False),
+    ],
+)
+def test_has_memory_for_browser_only_starts_browser_with_enough_memory(
+    mocker: MockerFixture, num_running: int, available_memory: int | None, expected_result: bool
+) -> None:
+    mocker.patch.object(browser_governor, "get_available_memory", return_value=available_memory)
+    assert browser_governor.has_memory_for_browser(num_running) == expected_result
+
+
+def test_register_browser_records_browser_processes(
+    proc_directory: Path, registry_directory: Path
+) -> None:
+    write_process(proc_directory, 10, 1, 100, start_time=5)
+    write_process(proc_directory, 11, 10, 100, start_time=6)
+    display = mock.Mock(pid=12)
+
+    browser_governor.register_browser(get_mock_driver(10, 11), display)
+
+    records = list(registry_directory.glob("*.json"))
+    assert len(records) == 1
+    record = json.loads(records[0].read_text())
+    assert record["owner_pid"] == os.getpid()
+    assert record["processes"] == {"10": 5, "11": 6, "12": None}
+    assert registry_directory.stat().st_mode & 0o777 == 0o700
+
+
+def test_register_browser_does_nothing_without_process_ids(registry_directory: Path) -> None:
+    browser_governor.register_browser(mock.Mock(), None)
+    assert not registry_directory.exists()
+
+
+def test_unregister_browser_removes_record(registry_directory: Path) -> None:
+    driver = get_mock_driver(10, 11)
+    browser_governor.register_browser(driver)
+    browser_governor.unregister_browser(driver)
+
+    assert list(registry_directory.glob("*.json")) == []
+
+
+def test_reap_orphaned_browsers_kills_browsers_of_dead_owners(
+    mocker: MockerFixture, proc_directory: Path, registry_directory: Path
+) -> None:
+    mock_kill = mocker.patch("os.kill")
+    write_process(proc_directory, 10, 1, 100)
+    write_process(proc_directory, 11, 10, 200)
+    # The process ID was reused by another process, so it isn't killed
+    write_process(proc_directory, 12, 1, 1000, start_time=200)
+    # Without a recorded start time, the process can't be told apart from a reused process ID
+    write_process(proc_directory, 13, 1, 1000)
+    # A running owner
+    write_process(proc_directory, 30, 1, 0)
+    write_process(proc_directory, 31, 30, 1000)
+
+    registry_directory.mkdir(mode=0o700)
+    orphaned_record = {"owner_pid": 20, "processes": {"10": 100, "12": 100, "13": None}}
+    write_record(registry_directory, "20-10.json", json.dumps(orphaned_record))
+    running_record = {"owner_pid": 30, "owner_start_time": 100, "processes": {"31": 100}}
+    write_record(registry_directory, "30-31.json", json.dumps(running_record))
+    write_record(registry_directory, "invalid.json", "invalid")
+
+    assert browser_governor.reap_orphaned_browsers() == 300 * 1024
+
+    killed_pids = sorted(call[0][0] for call in mock_kill.call_args_list)
+    assert killed_pids == [10, 11]
+    assert [path.name for path in registry_directory.glob("*.json")] == ["30-31.json"]
+
+
+@pytest.mark.usefixtures("registry_directory")
+def test_reap_orphaned_browsers_does_nothing_without_registry() -> None:
+    assert browser_governor.reap_orphaned_browsers() == 0
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="Only POSIX systems have file modes")
+def test_reap_orphaned_browsers_ignores_records_other_users_can_access(
+    mocker: MockerFixture, proc_directory: Path, registry_directory: Path
+) -> None:
+    mock_kill = mocker.patch("os.kill")
+    write_process(proc_directory, 10, 1, 100)
+    registry_directory.mkdir(mode=0o700)
+    write_record(registry_directory, "20-10.json", '{"owner_pid": 20, "processes": {"10": 100}}')
+    (registry_directory / "20-10.json").chmod(0o666)
+
+    assert browser_governor.reap_orphaned_browsers() == 0
+    mock_kill.assert_not_called()
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="Only POSIX systems have file modes")
+def test_reap_orphaned_browsers_ignores_registry_other_users_can_access(
+    mocker: MockerFixture, proc_directory: Path, registry_directory: Path
+) -> None:
+    mock_kill = mocker.patch("os.kill")
+    write_process(proc_directory, 10, 1, 100)
+    registry_directory.mkdir(mode=0o700)
+    write_record(registry_directory, "20-10.json", '{"owner_pid": 20, "processes": {"10": 100}}')
+    registry_directory.chmod(0o777)
+
+    assert browser_governor.reap_orphaned_browsers() == 0
+    mock_kill.assert_not_called()
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="Only POSIX systems have file modes")
+def test_register_browser_does_not_use_registry_other_users_can_access(
+    registry_directory: Path,
+) -> None:
+    registry_directory.mkdir(mode=0o777)
+    registry_directory.chmod(0o777)
+
+    browser_governor.register_browser(get_mock_driver(10, 11))
+    assert list(registry_directory.glob("*.json")) == []
+
+
+class TestBrowserReaper:
+    def test_reaper_reaps_until_stopped(self, mocker: MockerFixture) -> None:
+        reaped = threading.Event()
+
+        def reap() -> int:
+            reaped.set()
+            return 1024
+
+        mocker.patch.object(browser_governor, "reap_orphaned_browsers", side_effect=reap)
+        reaper = BrowserReaper(interval=0.01)
+        reaper.start()
+
+        assert reaped.wait(1)
+        reaper.stop()
+        assert reaper.total_reclaimed_memory >= 1024
+
+    def test_reaper_releases_orphaned_browser_slots(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(browser_governor, "reap_orphaned_browsers", return_value=0)
+        mock_arbiter = mock.Mock()
+        reaper = BrowserReaper(mock_arbiter)
+        mocker.patch.object(reaper.stop_event, "wait", return_value=True)
+
+        reaper._run()
+
+        mock_arbiter.release_orphaned_slots.assert_called_once()
+
+    def test_reaper_keeps_running_after_unexpected_error(self, mocker: MockerFixture) -> None:
+        mock_reap = mocker.patch.object(
+            browser_governor, "reap_orphaned_browsers", side_effect=[ValueError, 1024]
+        )
+        reaper = BrowserReaper()
+        # Stop after the second reap
+        mocker.patch.object(reaper.stop_event, "wait", side_effect=[False, True])
+
+        reaper._run()
+
+        assert mock_reap.call_count == 2
+        assert reaper.total_reclaimed_memory == 1024
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import pytest
+
+from lib import browser_pool
+from lib.browser_pool import MEMORY_PER_WORKER, BrowserJob, BrowserJobType, BrowserPool
+from lib.browser_session import BrowserSession
+from lib.config import AccountConfig, ReservationConfig
+from lib.reservation_monitor import AccountMonitor
+from lib.utils import DriverTimeoutError, LoginError
+from lib.webdriver import WebDriver
+
+if TYPE_CHECKING:
+    from pytest_mock import MockerFixture
+
+
+@pytest.mark.parametrize(
+    ("num_cpus", "num_pages", "expected_workers"),
+    [
+        (4, 8, 4),
+        (4, 2, 2),
+        (4, 0, 1),
+        (None, 8, 1),
+    ],
+)
+def test_get_auto_num_workers_sizes_pool_by_cores_and_memory(
+    mocker: MockerFixture, num_cpus: int | None, num_pages: int, expected_workers: int
+) -> None:
+    mocker.patch("os.cpu_count", return_value=num_cpus)
+    page_size = MEMORY_PER_WORKER
+    mocker.patch("os.sysconf", side_effect=[page_size, num_pages])
+
+    assert browser_pool.get_auto_num_workers() == expected_workers
+
+
+def test_get_auto_num_workers_uses_cores_when_memory_is_unknown(mocker: MockerFixture) -> None:
+    mocker.patch("os.cpu_count", return_value=4)
+    mocker.patch("os.sysconf", side_effect=ValueError)
+
+    assert browser_pool.get_auto_num_workers() == 4
+
+
+class TestBrowserPool:
+    @pytest.fixture(autouse=True)
+    def _set_up_pool(self) -> None:
+        self.pool = BrowserPool(2)
+
+    def test_start_starts_every_worker_and_supervisor(self, mocker: MockerFixture) -> None:
+        mock_process = mocker.patch("multiprocessing.Process")
+        mock_thread = mocker.patch("threading.Thread")
+
+        self.pool.start()
+
+        assert mock_process.return_value.start.call_count == 2
+        workers = mock_thread.call_args[1]["args"][0]
+        assert workers == [mock_process.return_value] * 2
+        mock_thread.return_value.start.assert_called_once()
+
+    def test_replace_exited_workers_starts_new_worker_in_slot(self, mocker: MockerFixture) -> None:
+        new_worker = mock.Mock()
+        mock_start_worker = mocker.patch.object(
+            BrowserPool, "_start_worker", return_value=new_worker
+        )
+        running_worker = mock.Mock()
+        running_worker.is_alive.return_value = True
+        exited_worker = mock.Mock()
+        exited_worker.is_alive.return_value = False
+        workers = [running_worker, exited_worker]
+
+        self.pool.busy_slots[1] = 1
+        self.pool.running_jobs.value = 2
+
+        self.pool._replace_exited_workers(workers)
+
+        mock_start_worker.assert_called_once_with(1)
+        assert workers == [running_worker, new_worker]
+        assert self.pool.busy_slots[1] == 0
+        assert self.pool.running_jobs.value == 1
+
+    def test_replace_exited_workers_keeps_running_jobs_of_idle_worker(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(BrowserPool, "_start_worker")
+        exited_worker = mock.Mock()
+        exited_worker.is_alive.return_value = False
+        self.pool.running_jobs.value = 1
+
+        self.pool._replace_exited_workers([exited_worker])
+
+        assert self.pool.running_jobs.value == 1
+
+    def test_refresh_headers_returns_headers_from_worker(self, mocker: MockerFixture) -> None:
+        mock_submit = mocker.patch.object(
+            BrowserPool, "_submit", return_value={"headers": {"test": "headers"}}
+        )
+        config = ReservationConfig()
+
+        assert self.pool.refresh_headers(config) == {"test": "headers"}
+        mock_submit.assert_called_once_with(BrowserJobType.REFRESH_HEADERS, config)
+
+    def test_get_reservations_sets_account_information(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(
+            BrowserPool,
+            "_submit",
+            return_value={
+                "headers": {"test": "headers"},
+                "reservations": [{"test": "reservation"}],
+                "first_name": "John",
+                "last_name": "Doe",
+            },
+        )
+        account_monitor = AccountMonitor(AccountConfig(), None)
+
+        assert self.pool.get_reservations(account_monitor) == [{"test": "reservation"}]
+        assert account_monitor.checkin_scheduler.headers == {"test": "headers"}
+        assert account_monitor.first_name == "John"
+        assert account_monitor.last_name == "Doe"
+
+    def test_get_stats_returns_averages(self) -> None:
+        self.pool.jobs_completed.value = 2
+        self.pool.total_wait_time.value = 3
+        self.pool.total_job_duration.value = 10
+
+        assert self.pool.get_stats() == {
+            "queue_depth": 0,
+            "jobs_completed": 2,
+            "average_wait_time": 1.5,
+            "average_job_duration": 5,
+        }
+
+    def test_submit_returns_result_from_worker(self, mocker: MockerFixture) -> None:
+        def reply(job: BrowserJob) -> None:
+            job.reply_conn.send((None, {"test": "result"}))
+
+        mocker.patch.object(self.pool.job_queue, "put", side_effect=reply)
+
+        result = self.pool._submit(BrowserJobType.REFRESH_HEADERS, ReservationConfig())
+
+        assert result == {"test": "result"}
+        assert self.pool.queue_depth.value == 1
+
+    def test_submit_raises_error_from_worker(self, mocker: MockerFixture) -> None:
+        def reply(job: BrowserJob) -> None:
+            job.reply_conn.send((LoginError("Invalid credentials", 400), None))
+
+        mocker.patch.object(self.pool.job_queue, "put", side_effect=reply)
+
+        with pytest.raises(LoginError) as err:
+            self.pool._submit(BrowserJobType.GET_RESERVATIONS, AccountConfig())
+
+        assert err.value.status_code == 400
+
+    def test_submit_raises_timeout_error_when_no_result_arrives(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(self.pool.job_queue, "put")
+        mocker.patch.object(browser_pool, "JOB_TIMEOUT_SECS", 0)
+
+        with pytest.raises(DriverTimeoutError):
+            self.pool._submit(BrowserJobType.REFRESH_HEADERS, ReservationConfig())
+
+    def test_run_worker_stops_on_keyboard_interrupt(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(self.pool.job_queue, "get", side_effect=["job", KeyboardInterrupt])
+        mock_run_job = mocker.patch.object(BrowserPool, "_run_job")
+
+        self.pool._run_worker(1)
+
+        mock_run_job.assert_called_once_with("job", 1, None)
+
+    def test_run_worker_closes_browser_session_when_stopped(self, mocker: MockerFixture) -> None:
+        pool = BrowserPool(1, session_max_uses=5)
+        mocker.patch.object(pool.job_queue, "get", side_effect=["job", KeyboardInterrupt])
+        mock_run_job = mocker.patch.object(BrowserPool, "_run_job")
+        mock_close = mocker.patch.object(BrowserSession, "close")
+
+        pool._run_worker(0)
+
+        session = mock_run_job.call_args[0][2]
+        assert isinstance(session, BrowserSession)
+        assert session.max_uses == 5
+        mock_close.assert_called_once()
+
+    def test_run_job_sends_result_and_updates_stats(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(BrowserPool, "_perform_job", return_value={"test": "result"})
+        job = BrowserJob(BrowserJobType.REFRESH_HEADERS, ReservationConfig(), mock.Mock())
+        self.pool.queue_depth.value = 1
+
+        self.pool._run_job(job, 0)
+
+        job.reply_conn.send.assert_called_once_with((None, {"test": "result"}))
+        assert self.pool.queue_depth.value == 0
+        assert self.pool.jobs_completed.value == 1
+
+    def test_run_job_skips_job_after_requester_timed_out(self, mocker: MockerFixture) -> None:
+        mock_perform_job = mocker.patch.object(BrowserPool, "_perform_job")
+        job = BrowserJob(BrowserJobType.REFRESH_HEADERS, ReservationConfig(), mock.Mock())
+        job.submitted_at -= browser_pool.JOB_TIMEOUT_SECS + 1
+
+        self.pool._run_job(job, 0)
+
+        mock_perform_job.assert_not_called()
+        job.reply_conn.send.assert_not_called()
+        job.reply_conn.close.assert_called_once()
+
+    def test_run_job_handles_requester_that_stopped_waiting(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(BrowserPool, "_perform_job", return_value={})
+        job = BrowserJob(BrowserJobType.REFRESH_HEADERS, ReservationConfig(), mock.Mock())
+        job.reply_conn.send.side_effect = BrokenPipeError
+
+        self.pool._run_job(job, 0)
+
+        job.reply_conn.close.assert_called_once()
+        assert self.pool.busy_slots[0] == 0
+
+    @pytest.mark.parametrize(
+        ("error", "expected_error"),
+        [
+            (LoginError("", 400), LoginError),
+            (DriverTimeoutError, DriverTimeoutError),
+            (ValueError, DriverTimeoutError),
+        ],
+    )
+    def test_run_job_sends_errors(
+        self, mocker: MockerFixture, error: Exception, expected_error: type[Exception]
+    ) -> None:
+        mocker.patch.object(BrowserPool, "_perform_job", side_effect=error)
+        job = BrowserJob(BrowserJobType.REFRESH_HEADERS, ReservationConfig(), mock.Mock())
+
+        self.pool._run_job(job, 0)
+
+        sent_error, result = job.reply_conn.send.call_args[0][0]
+        assert isinstance(sent_error, expected_error)
+        assert result is None
+
+    def test_run_job_waits_for_memory_before_running(self, mocker: MockerFixture) -> None:
+        mock_sleep = mocker.patch("time.sleep")
+        mocker.patch.object(browser_pool, "has_memory_for_browser", side_effect=[False, True])
+        mocker.patch.object(BrowserPool, "_perform_job", return_value={})
+        job = BrowserJob(BrowserJobType.REFRESH_HEADERS, ReservationConfig(), mock.Mock())
+
+        self.pool._run_job(job, 0)
+
+        mock_sleep.assert_called_once()
+        assert self.pool.running_jobs.value == 0
+
+    def test_run_job_closes_browser_session_on_error(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(BrowserPool, "_perform_job", side_effect=DriverTimeoutError)
+        job = BrowserJob(BrowserJobType.REFRESH_HEADERS, ReservationConfig(), mock.Mock())
+        mock_session = mock.Mock()
+
+        self.pool._run_job(job, 0, mock_session)
+
+        mock_session.close.assert_called_once()
+
+    def test_perform_job_refreshes_headers(self, mocker: MockerFixture) -> None:
+        mock_webdriver = mocker.patch("lib.browser_pool.WebDriver")
+        job = BrowserJob(BrowserJobType.REFRESH_HEADERS, ReservationConfig(), mock.Mock())
+
+        assert self.pool._perform_job(job, 1) == {"headers": {}}
+        mock_webdriver.return_value.set_headers.assert_called_once()
+        assert mock_webdriver.call_args[0][1] == 1
+
+    def test_perform_job_gets_reservations(self, mocker: MockerFixture) -> None:
+        mock_get_reservations = mocker.patch.object(
+            WebDriver, "get_reservations", return_value=[{"test": "reservation"}]
+        )
+        job = BrowserJob(
+            BrowserJobType.GET_RESERVATIONS, AccountConfig(), mock.Mock(), "John", "Doe"
+        )
+
+        assert self.pool._perform_job(job, 0) == {
+            "headers": {},
+            "reservations": [{"test": "reservation"}],
+            "first_name": "John",
+            "last_name": "Doe",
+        }
+        mock_get_reservations.assert_called_once()
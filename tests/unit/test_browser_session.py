@@ -0,0 +1,91 @@
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+from selenium.common.exceptions import WebDriverException
+
+from lib.browser_session import BrowserSession
+
+
+class TestBrowserSession:
+    @pytest.fixture(autouse=True)
+    def _set_up_session(self, mocker: MockerFixture) -> None:
+        self.session = BrowserSession(max_uses=2, max_memory_growth=100)
+        self.mock_get_memory = mocker.patch.object(BrowserSession, "_get_memory", return_value=0)
+        self.mock_driver = mock.Mock()
+        self.mock_display = mock.Mock()
+        self.mock_start_browser = mock.Mock(return_value=(self.mock_driver, self.mock_display))
+
+    def test_get_driver_starts_browser_once(self) -> None:
+        assert self.session.get_driver(self.mock_start_browser) == self.mock_driver
+        assert self.session.get_driver(self.mock_start_browser) == self.mock_driver
+
+        self.mock_start_browser.assert_called_once()
+
+    def test_get_driver_replaces_unhealthy_browser(self) -> None:
+        self.session.get_driver(self.mock_start_browser)
+        self.mock_driver.execute_script.side_effect = WebDriverException
+
+        self.session.get_driver(self.mock_start_browser)
+
+        self.mock_driver.quit.assert_called_once()
+        self.mock_display.stop.assert_called_once()
+        assert self.mock_start_browser.call_count == 2
+
+    def test_release_clears_browser_state(self) -> None:
+        self.session.get_driver(self.mock_start_browser)
+
+        self.session.release()
+
+        assert self.session.num_uses == 1
+        self.mock_driver.clear_cdp_listeners.assert_called_once()
+        self.mock_driver.execute_cdp_cmd.assert_called_once_with("Network.clearBrowserCookies", {})
+        self.mock_driver.quit.assert_not_called()
+
+    def test_release_closes_browser_when_state_cannot_be_cleared(self) -> None:
+        self.session.get_driver(self.mock_start_browser)
+        self.mock_driver.clear_cdp_listeners.side_effect = WebDriverException
+
+        self.session.release()
+
+        self.mock_driver.quit.assert_called_once()
+        assert self.session.driver is None
+
+    def test_release_recycles_browser_after_max_uses(self) -> None:
+        self.session.get_driver(self.mock_start_browser)
+        self.session.release()
+        self.session.get_driver(self.mock_start_browser)
+        self.session.release()
+
+        self.mock_driver.quit.assert_called_once()
+        assert self.session.driver is None
+
+    def test_release_recycles_browser_after_too_much_memory_growth(self) -> None:
+        self.session.get_driver(self.mock_start_browser)
+        self.mock_get_memory.return_value = 101
+
+        self.session.release()
+
+        self.mock_driver.quit.assert_called_once()
+
+    def test_release_does_not_recycle_browser_when_memory_is_unknown(self) -> None:
+        self.mock_get_memory.return_value = None
+        self.session.get_driver(self.mock_start_browser)
+
+        self.session.release()
+
+        self.mock_driver.quit.assert_not_called()
+
+    def test_close_quits_and_unregisters_browser(self, mocker: MockerFixture) -> None:
+        mock_unregister_browser = mocker.patch("lib.browser_session.unregister_browser")
+        self.session.get_driver(self.mock_start_browser)
+
+        self.session.close()
+
+        self.mock_driver.quit.assert_called_once()
+        self.mock_display.stop.assert_called_once()
+        mock_unregister_browser.assert_called_once_with(self.mock_driver, self.mock_display)
+
+    def test_close_does_nothing_without_a_browser(self) -> None:
+        self.session.close()
+        self.mock_driver.quit.assert_not_called()
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+import pytest
+
+from lib import budget_planner
+from lib.budget_planner import (
+    DEFAULT_CYCLE_REQUESTS,
+    MAX_FARE_CHECK_EVERY,
+    MAX_URGENCY_WEIGHT,
+    SECONDS_PER_DAY,
+    BudgetPlanner,
+    allocate_budget,
+    get_urgency_weight,
+    read_budget_state,
+    write_budget_state,
+)
+from lib.config import AccountConfig, GlobalConfig, ReservationConfig
+from lib.cycle_cost import CycleCost
+from lib.stagger_planner import get_monitor_key
+from lib.utils import CheckFaresOption
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest_mock import MockerFixture
+
+# Timestamp for 1999-12-31 00:00:00 UTC
+CURRENT_TIME = 946598400
+
+
+@pytest.fixture(autouse=True)
+def state_file(tmp_path: Path, mocker: MockerFixture) -> Path:
+    path = tmp_path / "budget_state.json"
+    mocker.patch.object(budget_planner, "BUDGET_STATE_FILE", path)
+    mocker.patch("time.time", return_value=CURRENT_TIME)
+    return path
+
+
+def create_account(username: str, retrieval_interval: int = 6 * 60 * 60) -> AccountConfig:
+    account = AccountConfig()
+    account.username = username
+    account.retrieval_interval = retrieval_interval
+    return account
+
+
+def create_global_config(request_budget: int = 0, browser_session_budget: int = 0) -> GlobalConfig:
+    global_config = GlobalConfig()
+    global_config.daily_request_budget = request_budget
+    global_config.daily_browser_session_budget = browser_session_budget
+    return global_config
+
+
+def create_cycle_cost(requests: int, fare_check_requests: int, browser_sessions: int) -> CycleCost:
+    cycle_cost = CycleCost()
+    cycle_cost.requests = requests
+    cycle_cost.fare_check_requests = fare_check_requests
+    cycle_cost.browser_sessions = browser_sessions
+    cycle_cost.checked_fares = True
+    return cycle_cost
+
+
+@pytest.mark.parametrize(
+    ("time_to_departure", "expected_weight"),
+    [
+        (None, 1),
+        (30 * SECONDS_PER_DAY, 1),
+        (7 * SECONDS_PER_DAY, 1),
+        (SECONDS_PER_DAY, 7),
+        (60 * 60, MAX_URGENCY_WEIGHT),
+    ],
+)
+def test_get_urgency_weight_favors_near_term_flights(
+    time_to_departure: int | None, expected_weight: float
+) -> None:
+    next_departure = None if time_to_departure is None else CURRENT_TIME + time_to_departure
+    assert get_urgency_weight({"next_departure": next_departure}) == expected_weight
+
+
+def test_allocate_budget_gives_unused_share_to_others() -> None:
+    monitors = {"small": {"need": 10}, "large": {"need": 1000}, "medium": {"need": 100}}
+    allocations = allocate_budget(300, monitors, lambda monitor: monitor["need"])
+
+    assert allocations == {"small": 10, "medium": 100, "large": 190}
+
+
+def test_allocate_budget_splits_by_weight_when_over_budget() -> None:
+    monitors = {
+        "soon": {"need": 1000, "next_departure": CURRENT_TIME + SECONDS_PER_DAY},
+        "later": {"need": 1000, "next_departure": None},
+    }
+    allocations = allocate_budget(800, monitors, lambda monitor: monitor["need"])
+
+    assert allocations == {"soon": 700, "later": 100}
+
+
+def test_read_budget_state_returns_empty_dict_on_invalid_file(state_file: Path) -> None:
+    assert read_budget_state() == {}
+
+    state_file.write_text("invalid")
+    assert read_budget_state() == {}
+
+    state_file.write_text("[]")
+    assert read_budget_state() == {}
+
+
+def test_write_budget_state_handles_write_errors(mocker: MockerFixture) -> None:
+    mocker.patch("tempfile.mkstemp", side_effect=OSError)
+    write_budget_state({"key": {}})
+    assert read_budget_state() == {}
+
+
+class TestBudgetPlanner:
+    def test_init_removes_monitors_no_longer_configured(self, state_file: Path) -> None:
+        account = create_account("user")
+        state_file.write_text(
+            json.dumps({get_monitor_key(account): {"stopped": True}, "removed": {}})
+        )
+
+        BudgetPlanner(create_global_config(100), [account])
+
+        assert read_budget_state() == {get_monitor_key(account): {}}
+
+    def test_record_cycle_averages_measured_costs(self) -> None:
+        account = create_account("user")
+        planner = BudgetPlanner(create_global_config(100), [account])
+        departure = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+        planner.record_cycle(account, create_cycle_cost(10, 4, 1), 3600, departure)
+        planner.record_cycle(account, create_cycle_cost(20, 0, 0), 3600, None)
+        cycle_cost = create_cycle_cost(30, 30, 0)
+        cycle_cost.checked_fares = False
+        planner.record_cycle(account, cycle_cost, 7200, None)
+
+        monitor = read_budget_state()[get_monitor_key(account)]
+        assert monitor["cycle_requests"] == pytest.approx(0.3 * 30 + 0.7 * (0.3 * 20 + 0.7 * 10))
+        assert monitor["cycle_browser_sessions"] == pytest.approx(0.49)
+        # Fares weren't checked in the last cycle
+        assert monitor["fare_check_requests"] == pytest.approx(0.3 * 0 + 0.7 * 4)
+        assert monitor["retrieval_interval"] == 7200
+        assert monitor["next_departure"] is None
+
+    def test_get_plan_keeps_configured_schedule_within_budget(self) -> None:
+        account = create_account("user")
+        planner = BudgetPlanner(create_global_config(1000, 100), [account])
+
+        assert planner.get_plan(account) == (6 * 60 * 60, 1)
+
+    def test_get_plan_skips_fare_checks_first(self) -> None:
+        account = create_account("user")
+        planner = BudgetPlanner(create_global_config(100), [account])
+        planner.record_cycle(account, create_cycle_cost(20, 20, 0), 6 * 60 * 60, None)
+
+        # 4 cycles a day use 80 requests, leaving 20 requests for 80 requests of fare checks
+        assert planner.get_plan(account) == (6 * 60 * 60, 4)
+
+    def test_get_plan_lengthens_retrieval_interval_when_skipping_fares_is_not_enough(
+        self,
+    ) -> None:
+        account = create_account("user")
+        planner = BudgetPlanner(create_global_config(30), [account])
+        planner.record_cycle(account, create_cycle_cost(20, 40, 0), 6 * 60 * 60, None)
+
+        # Each cycle uses 30 requests when fares are checked every 4 cycles
+        assert planner.get_plan(account) == (SECONDS_PER_DAY, MAX_FARE_CHECK_EVERY)
+
+    def test_get_plan_lengthens_retrieval_interval_for_browser_session_budget(self) -> None:
+        account = create_account("user")
+        planner = BudgetPlanner(create_global_config(0, 2), [account])
+        planner.record_cycle(account, create_cycle_cost(20, 20, 1), 6 * 60 * 60, None)
+
+        assert planner.get_plan(account) == (12 * 60 * 60, 1)
+
+    def test_get_plan_does_not_plan_fare_checks_when_fares_are_not_checked(self) -> None:
+        account = create_account("user")
+        account.check_fares = CheckFaresOption.NO
+        planner = BudgetPlanner(create_global_config(2 * DEFAULT_CYCLE_REQUESTS), [account])
+
+        assert planner.get_plan(account) == (12 * 60 * 60, 1)
+
+    def test_get_plan_does_not_plan_disabled_monitoring(self) -> None:
+        account = create_account("user", 0)
+        planner = BudgetPlanner(create_global_config(1), [account])
+
+        assert planner.get_plan(account) == (0, 1)
+
+    def test_get_plan_gives_stopped_monitors_share_to_others(self) -> None:
+        account = create_account("user")
+        reservation = ReservationConfig()
+        reservation.confirmation_number = "TEST12"
+        reservation.retrieval_interval = 6 * 60 * 60
+        planner = BudgetPlanner(create_global_config(80), [account, reservation])
+        planner.record_cycle(account, create_cycle_cost(20, 0, 0), 6 * 60 * 60, None)
+        planner.record_cycle(reservation, create_cycle_cost(20, 0, 0), 6 * 60 * 60, None)
+
+        assert planner.get_plan(account) == (12 * 60 * 60, 1)
+
+        planner.remove_monitor(reservation)
+        assert planner.get_plan(account) == (6 * 60 * 60, 1)
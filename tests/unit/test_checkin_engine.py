@@ -0,0 +1,114 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lib import checkin_engine
+from lib.checkin_engine import CheckInEngine
+
+
+@pytest.fixture
+def engine() -> CheckInEngine:
+    engine = CheckInEngine()
+    engine.start()
+    return engine
+
+
+def test_get_checkin_engine_only_starts_one_engine(mocker: MockerFixture) -> None:
+    mocker.patch.object(checkin_engine, "_engine", None)
+    mock_start = mocker.patch.object(CheckInEngine, "start")
+
+    engine = checkin_engine.get_checkin_engine()
+
+    assert checkin_engine.get_checkin_engine() is engine
+    mock_start.assert_called_once()
+
+
+class TestCheckInEngine:
+    @pytest.fixture(autouse=True)
+    def _set_up_time(self, mocker: MockerFixture) -> None:
+        self.current_time = datetime(1999, 12, 31, tzinfo=timezone.utc)
+        mocker.patch("lib.checkin_engine.get_current_time", return_value=self.current_time)
+
+    def test_call_at_runs_due_timers(self, engine: CheckInEngine) -> None:
+        mock_job = mock.Mock()
+
+        engine.call_at(self.current_time, mock_job)
+        engine.wait_until_idle()
+
+        mock_job.assert_called_once()
+
+    def test_call_at_uses_given_current_time(
+        self, mocker: MockerFixture, engine: CheckInEngine
+    ) -> None:
+        mock_get_current_time = mocker.patch("lib.checkin_engine.get_current_time")
+        mock_job = mock.Mock()
+
+        engine.call_at(self.current_time, mock_job, self.current_time)
+        engine.wait_until_idle()
+
+        mock_job.assert_called_once()
+        mock_get_current_time.assert_not_called()
+
+    def test_call_at_runs_timers_in_order_of_due_time(self, engine: CheckInEngine) -> None:
+        calls = []
+        engine.call_at(self.current_time + timedelta(seconds=0.2), lambda: calls.append("second"))
+        engine.call_at(self.current_time + timedelta(seconds=0.1), lambda: calls.append("first"))
+
+        engine.wait_until_idle()
+
+        assert calls == ["first", "second"]
+
+    def test_call_at_runs_timers_added_before_engine_starts(self) -> None:
+        engine = CheckInEngine()
+        mock_job = mock.Mock()
+
+        engine.call_at(self.current_time, mock_job)
+        engine.start()
+        engine.wait_until_idle()
+
+        mock_job.assert_called_once()
+
+    def test_due_timers_run_concurrently(self, engine: CheckInEngine) -> None:
+        barrier = threading.Barrier(2, timeout=5)
+
+        engine.call_at(self.current_time, barrier.wait)
+        engine.call_at(self.current_time, barrier.wait)
+        engine.wait_until_idle()
+
+        # The barrier would have been broken if the timers ran one after another
+        assert not barrier.broken
+
+    def test_cancel_skips_timer(self, engine: CheckInEngine) -> None:
+        mock_job = mock.Mock()
+
+        timer = engine.call_at(self.current_time + timedelta(seconds=0.1), mock_job)
+        timer.cancel()
+        assert engine.pending_timers == 0
+
+        mock_other_job = mock.Mock()
+        engine.call_at(self.current_time + timedelta(seconds=0.2), mock_other_job)
+        engine.wait_until_idle()
+
+        mock_job.assert_not_called()
+        mock_other_job.assert_called_once()
+
+    def test_cancel_does_nothing_if_timer_has_started(self) -> None:
+        engine = CheckInEngine()
+        timer = engine.call_at(self.current_time, mock.Mock())
+        timer.started = True
+
+        timer.cancel()
+
+        assert not timer.cancelled
+        assert engine.pending_timers == 1
+
+    def test_run_timer_handles_unexpected_errors(self) -> None:
+        engine = CheckInEngine()
+        timer = engine.call_at(self.current_time, mock.Mock(side_effect=ValueError))
+
+        engine._run_timer(timer)
+
+        assert engine.pending_timers == 0
@@ -5,8 +5,9 @@ from unittest import mock
 import pytest
 from pytest_mock import MockerFixture
 
+from lib.browser_arbiter import BrowserPriority
 from lib.checkin_handler import MAX_CHECK_IN_ATTEMPTS, CheckInHandler
-from lib.utils import AirportCheckInError, DriverTimeoutError, RequestError
+from lib.utils import AirportCheckInError, CheckInEngineOption, DriverTimeoutError, RequestError
 
 
 class TestCheckInHandler:
@@ -16,19 +17,77 @@ class TestCheckInHandler:
     def _set_up_handler(self, mocker: MockerFixture) -> None:
         test_flight = mocker.patch("lib.flight.Flight")
         mock_checkin_scheduler = mocker.patch("lib.checkin_scheduler.CheckInScheduler")
-        mock_lock = mocker.patch("multiprocessing.Lock")
 
-        self.handler = CheckInHandler(mock_checkin_scheduler, test_flight, mock_lock)
+        self.handler = CheckInHandler(mock_checkin_scheduler, test_flight)
         # This would usually be set in schedule_check_in, but that won't be run for every test
         self.handler.pid = 0
 
     def test_schedule_check_in_starts_a_process(self, mocker: MockerFixture) -> None:
         mock_process = mocker.patch("lib.checkin_handler.Process")
+        mocker.patch(
+            "lib.checkin_handler.get_current_time", return_value=datetime(1999, 12, 30, 18)
+        )
+        mock_register_check_in = mocker.patch.object(CheckInHandler, "_register_check_in")
 
         self.handler.schedule_check_in()
 
         mock_process.return_value.start.assert_called_once()
         assert self.handler.pid is not None, "PID was not set while scheduling a check-in"
+        mock_register_check_in.assert_called_once_with(datetime(1999, 12, 30, 18))
+
+    def test_schedule_check_in_schedules_a_timer_with_asyncio_engine(
+        self, mocker: MockerFixture
+    ) -> None:
+        mock_process = mocker.patch("lib.checkin_handler.Process")
+        mock_get_current_time = mocker.patch(
+            "lib.checkin_handler.get_current_time", return_value=datetime(1999, 12, 30, 18)
+        )
+        mock_register_check_in = mocker.patch.object(CheckInHandler, "_register_check_in")
+        mock_schedule_timer = mocker.patch.object(CheckInHandler, "_schedule_timer")
+        config = self.handler.checkin_scheduler.reservation_monitor.config
+        config.check_in_engine = CheckInEngineOption.ASYNCIO
+
+        self.handler.schedule_check_in()
+
+        # The registrations and the timer use the same time
+        mock_get_current_time.assert_called_once()
+        mock_register_check_in.assert_called_once_with(datetime(1999, 12, 30, 18))
+        mock_schedule_timer.assert_called_once_with(datetime(1999, 12, 30, 18))
+        mock_process.assert_not_called()
+
+    def test_stop_check_in_cancels_timer_with_asyncio_engine(self, mocker: MockerFixture) -> None:
+        mock_os_kill = mocker.patch("os.kill")
+        self.handler.timer = mock.Mock()
+
+        self.handler.stop_check_in()
+
+        self.handler.timer.cancel.assert_called_once()
+        assert self.handler.stopped
+        mock_os_kill.assert_not_called()
+
+    def test_stop_check_in_unregisters_check_in(self, mocker: MockerFixture) -> None:
+        mocker.patch("os.kill")
+        mocker.patch("os.waitpid")
+        browser_arbiter = self.handler.checkin_scheduler.reservation_monitor.lock
+        self.handler.check_in_registration = (0, datetime(1999, 12, 30, 18))
+
+        self.handler.stop_check_in()
+
+        browser_arbiter.unregister_check_in.assert_called_once_with(0, datetime(1999, 12, 30, 18))
+        assert self.handler.check_in_registration is None
+
+    def test_stop_check_in_unregisters_check_in_time(self, mocker: MockerFixture) -> None:
+        mocker.patch("os.kill")
+        mocker.patch("os.waitpid")
+        browser_arbiter = self.handler.checkin_scheduler.reservation_monitor.lock
+        self.handler.quiet_window_registration = (0, datetime(1999, 12, 30, 18, 30))
+
+        self.handler.stop_check_in()
+
+        browser_arbiter.unregister_check_in_time.assert_called_once_with(
+            0, datetime(1999, 12, 30, 18, 30)
+        )
+        assert self.handler.quiet_window_registration is None
 
     def test_stop_check_in_stops_a_process_by_killing_its_pid(self, mocker: MockerFixture) -> None:
         mock_os_kill = mocker.patch("os.kill")
@@ -67,6 +126,89 @@ class TestCheckInHandler:
         mock_wait_for_check_in.assert_called_once_with(datetime(1999, 12, 30, 18, 29))
         mock_check_in.assert_called_once()
 
+    def test_schedule_timer_schedules_header_refresh_thirty_minutes_before_check_in(
+        self, mocker: MockerFixture
+    ) -> None:
+        mock_engine = mocker.patch("lib.checkin_handler.get_checkin_engine").return_value
+        self.handler.flight.departure_time = datetime(1999, 12, 31, 18, 30)
+
+        self.handler._schedule_timer(datetime(1999, 12, 30, 17, 59))
+
+        mock_engine.call_at.assert_called_once_with(
+            datetime(1999, 12, 30, 18),
+            self.handler._refresh_and_schedule_check_in,
+            datetime(1999, 12, 30, 17, 59),
+        )
+        assert self.handler.timer == mock_engine.call_at.return_value
+
+    def test_schedule_timer_schedules_check_in_when_it_is_thirty_minutes_away(
+        self, mocker: MockerFixture
+    ) -> None:
+        mock_engine = mocker.patch("lib.checkin_handler.get_checkin_engine").return_value
+        self.handler.flight.departure_time = datetime(1999, 12, 31, 18, 30)
+
+        self.handler._schedule_timer(datetime(1999, 12, 30, 18))
+
+        mock_engine.call_at.assert_called_once_with(
+            datetime(1999, 12, 30, 18, 30), self.handler._check_in, datetime(1999, 12, 30, 18)
+        )
+
+    @pytest.mark.parametrize("stopped", [True, False])
+    def test_refresh_and_schedule_check_in_schedules_check_in_if_not_stopped(
+        self, mocker: MockerFixture, stopped: bool
+    ) -> None:
+        mock_refresh_headers = mocker.patch.object(CheckInHandler, "_refresh_headers")
+        mock_engine = mocker.patch("lib.checkin_handler.get_checkin_engine").return_value
+        self.handler.flight.departure_time = datetime(1999, 12, 31, 18, 30)
+        self.handler.stopped = stopped
+
+        self.handler._refresh_and_schedule_check_in()
+
+        mock_refresh_headers.assert_called_once()
+        assert mock_engine.call_at.called != stopped
+
+    def test_register_check_in_registers_header_refresh_time(self) -> None:
+        self.handler.flight.departure_time = datetime(1999, 12, 31, 18, 30)
+        browser_arbiter = self.handler.checkin_scheduler.reservation_monitor.lock
+        browser_arbiter.register_check_in.return_value = 1
+
+        self.handler._register_check_in(datetime(1999, 12, 30, 17, 59))
+
+        browser_arbiter.register_check_in.assert_called_once_with(datetime(1999, 12, 30, 18))
+        assert self.handler.check_in_registration == (1, datetime(1999, 12, 30, 18))
+
+    def test_register_check_in_registers_check_in_time(self) -> None:
+        self.handler.flight.departure_time = datetime(1999, 12, 31, 18, 30)
+        browser_arbiter = self.handler.checkin_scheduler.reservation_monitor.lock
+        browser_arbiter.register_check_in_time.return_value = 2
+
+        self.handler._register_check_in(datetime(1999, 12, 30, 18, 10))
+
+        browser_arbiter.register_check_in_time.assert_called_once_with(
+            datetime(1999, 12, 30, 18, 30)
+        )
+        assert self.handler.quiet_window_registration == (2, datetime(1999, 12, 30, 18, 30))
+        # The headers won't be refreshed before the check-in
+        browser_arbiter.register_check_in.assert_not_called()
+
+    def test_register_check_in_does_not_register_check_in_time_that_passed(self) -> None:
+        self.handler.flight.departure_time = datetime(1999, 12, 31, 18, 30)
+        browser_arbiter = self.handler.checkin_scheduler.reservation_monitor.lock
+
+        self.handler._register_check_in(datetime(1999, 12, 30, 18, 30))
+
+        browser_arbiter.register_check_in_time.assert_not_called()
+        assert self.handler.quiet_window_registration is None
+
+    def test_register_check_in_does_not_register_when_headers_are_not_refreshed(self) -> None:
+        self.handler.flight.departure_time = datetime(1999, 12, 31, 18, 30)
+        browser_arbiter = self.handler.checkin_scheduler.reservation_monitor.lock
+
+        self.handler._register_check_in(datetime(1999, 12, 30, 18))
+
+        browser_arbiter.register_check_in.assert_not_called()
+        assert self.handler.check_in_registration is None
+
     def test_set_check_in_passes_on_keyboard_interrupt(self, mocker: MockerFixture) -> None:
         mocker.patch.object(CheckInHandler, "_wait_for_check_in", side_effect=KeyboardInterrupt)
         self.handler._set_check_in()
@@ -93,10 +235,6 @@ class TestCheckInHandler:
 
         mock_sleep.assert_called_once_with(1800)
 
-    @pytest.mark.filterwarnings(
-        # Mocking multiprocessing.Lock causes this warning
-        "ignore:Mocks returned by pytest-mock do not need to be used as context managers:"
-    )
     def test_wait_for_check_in_refreshes_headers_thirty_minutes_before_check_in(
         self, mocker: MockerFixture
     ) -> None:
@@ -112,15 +250,15 @@ class TestCheckInHandler:
             ],
         )
 
+        self.handler.flight.departure_time = datetime(2000, 1, 1, 23, 49, 59)
+
         self.handler._wait_for_check_in(datetime(1999, 12, 31, 23, 49, 59))
 
         mock_sleep.assert_has_calls([mock.call(17400), mock.call(1800)])
-        mock_refresh_headers.assert_called_once()
+        mock_refresh_headers.assert_called_once_with(
+            BrowserPriority.CHECK_IN, datetime(1999, 12, 31, 23, 49, 59)
+        )
 
-    @pytest.mark.filterwarnings(
-        # Mocking multiprocessing.Lock causes this warning
-        "ignore:Mocks returned by pytest-mock do not need to be used as context managers:"
-    )
     def test_wait_for_check_in_handles_timeout_refreshing_headers(
         self, mocker: MockerFixture
     ) -> None:
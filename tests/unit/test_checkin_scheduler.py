@@ -1,20 +1,29 @@
+from __future__ import annotations
+
 import copy
 import json
+import time
 from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
 from unittest import mock
 
 import pytest
-from pytest_mock import MockerFixture
 
+from lib.browser_arbiter import BrowserPriority
 from lib.checkin_handler import CheckInHandler
-from lib.checkin_scheduler import FLIGHT_IN_PAST_CODE, CheckInScheduler
+from lib.checkin_scheduler import FLIGHT_IN_PAST_CODE, HEADERS_PROBE_URL, CheckInScheduler
 from lib.config import ReservationConfig
+from lib.cycle_cost import measure_cycle, record_request
 from lib.flight import Flight
+from lib.header_store import HEADERS_KEY, HeaderStore
 from lib.notification_handler import NotificationHandler
 from lib.reservation_monitor import ReservationMonitor
 from lib.utils import RequestError
 from lib.webdriver import WebDriver
 
+if TYPE_CHECKING:
+    from pytest_mock import MockerFixture
+
 
 @pytest.fixture
 def test_flights(mocker: MockerFixture) -> list[Flight]:
@@ -32,12 +41,13 @@ def test_flights(mocker: MockerFixture) -> list[Flight]:
 class TestCheckInScheduler:
     @pytest.fixture(autouse=True)
     def _set_up_scheduler(self) -> None:
-        self.scheduler = CheckInScheduler(ReservationMonitor(ReservationConfig()))
+        self.scheduler = CheckInScheduler(ReservationMonitor(ReservationConfig(), mock.MagicMock()))
 
     def test_process_reservations_handles_all_reservations(self, mocker: MockerFixture) -> None:
         mock_get_flights = mocker.patch.object(
             CheckInScheduler, "_get_flights", return_value=["flight"]
         )
+        mock_set_same_day_flights = mocker.patch.object(CheckInScheduler, "_set_same_day_flights")
         mock_update_scheduled_flights = mocker.patch.object(
             CheckInScheduler, "_update_scheduled_flights"
         )
@@ -46,12 +56,211 @@ class TestCheckInScheduler:
 
         mock_get_flights.assert_has_calls([mock.call("test1"), mock.call("test2")])
         mock_update_scheduled_flights.assert_called_once_with(["flight", "flight"])
+        mock_set_same_day_flights.assert_called_once_with(["flight", "flight"])
+
+    def test_process_reservations_merges_flights_in_confirmation_number_order(
+        self, mocker: MockerFixture
+    ) -> None:
+        def mock_get_flights(confirmation_number: str) -> list[str]:
+            # Make the first reservation finish last to ensure the order does not depend on timing
+            if confirmation_number == "test1":
+                time.sleep(0.05)
+            return [confirmation_number + "_flight1", confirmation_number + "_flight2"]
+
+        mocker.patch.object(CheckInScheduler, "_get_flights", side_effect=mock_get_flights)
+        mocker.patch.object(CheckInScheduler, "_set_same_day_flights")
+        mock_update_scheduled_flights = mocker.patch.object(
+            CheckInScheduler, "_update_scheduled_flights"
+        )
+
+        self.scheduler.process_reservations(["test1", "test2"])
+
+        mock_update_scheduled_flights.assert_called_once_with(
+            ["test1_flight1", "test1_flight2", "test2_flight1", "test2_flight2"]
+        )
+
+    def test_process_reservations_counts_requests_towards_current_cycle(
+        self, mocker: MockerFixture
+    ) -> None:
+        def mock_get_flights(_: str) -> list[str]:
+            record_request()
+            return []
+
+        mocker.patch.object(CheckInScheduler, "_get_flights", side_effect=mock_get_flights)
+        mocker.patch.object(CheckInScheduler, "_update_scheduled_flights")
+
+        with measure_cycle() as cycle_cost:
+            self.scheduler.process_reservations(["test1", "test2", "test3"])
+
+        assert cycle_cost.requests == 3
+
+    def test_process_reservations_does_not_retrieve_when_no_reservations(
+        self, mocker: MockerFixture
+    ) -> None:
+        mock_get_flights = mocker.patch.object(CheckInScheduler, "_get_flights")
+        mocker.patch.object(CheckInScheduler, "_set_same_day_flights")
+        mock_update_scheduled_flights = mocker.patch.object(
+            CheckInScheduler, "_update_scheduled_flights"
+        )
+
+        self.scheduler.process_reservations([])
+
+        mock_get_flights.assert_not_called()
+        mock_update_scheduled_flights.assert_called_once_with([])
+
+    def test_process_reservations_reuses_flights_for_unchanged_reservations(
+        self, mocker: MockerFixture, test_flights: list[Flight]
+    ) -> None:
+        mock_get_flights = mocker.patch.object(
+            CheckInScheduler, "_get_flights", return_value=["flight"]
+        )
+        mock_update_scheduled_flights = mocker.patch.object(
+            CheckInScheduler, "_update_scheduled_flights"
+        )
+        mocker.patch.object(CheckInScheduler, "_set_same_day_flights")
+        current_time = datetime(1999, 12, 30, 18, 20)
+        mocker.patch("lib.checkin_scheduler.get_current_time", return_value=current_time)
+
+        # The second flight has already departed so it should not be reused
+        test_flights[0].confirmation_number = "test2"
+        test_flights[0].departure_time = datetime(1999, 12, 31, 18, 29)
+        test_flights[1].confirmation_number = "test2"
+        test_flights[1].departure_time = datetime(1999, 12, 30, 18, 19)
+        self.scheduler.flights = test_flights
+
+        self.scheduler.process_reservations(["test1", "test2", "test3"], {"test2"})
+
+        mock_get_flights.assert_has_calls([mock.call("test1"), mock.call("test3")])
+        assert mock_get_flights.call_count == 2
+        mock_update_scheduled_flights.assert_called_once_with(["flight", test_flights[0], "flight"])
 
     def test_refresh_headers_sets_new_headers(self, mocker: MockerFixture) -> None:
         mock_webdriver_set_headers = mocker.patch.object(WebDriver, "set_headers")
 
-        self.scheduler.refresh_headers()
+        with measure_cycle() as cycle_cost:
+            self.scheduler.refresh_headers()
+
         mock_webdriver_set_headers.assert_called_once()
+        self.scheduler.reservation_monitor.lock.use.assert_called_once_with(BrowserPriority.ROUTINE)
+        assert cycle_cost.browser_sessions == 1
+
+    def test_refresh_headers_uses_browser_pool_when_available(self, mocker: MockerFixture) -> None:
+        mock_webdriver_set_headers = mocker.patch.object(WebDriver, "set_headers")
+        mock_browser_pool = mock.Mock()
+        mock_browser_pool.refresh_headers.return_value = {"test": "headers"}
+        self.scheduler.reservation_monitor.browser_pool = mock_browser_pool
+
+        self.scheduler.refresh_headers()
+
+        assert self.scheduler.headers == {"test": "headers"}
+        mock_browser_pool.refresh_headers.assert_called_once_with(
+            self.scheduler.reservation_monitor.config
+        )
+        mock_webdriver_set_headers.assert_not_called()
+        self.scheduler.reservation_monitor.lock.use.assert_called_once_with(BrowserPriority.ROUTINE)
+
+    def test_refresh_headers_uses_header_store_for_routine_refreshes(
+        self, mocker: MockerFixture
+    ) -> None:
+        mock_fetch_headers = mocker.patch.object(
+            CheckInScheduler, "_fetch_headers", return_value={"test": "headers"}
+        )
+        header_store = HeaderStore(None)
+        self.scheduler.reservation_monitor.header_store = header_store
+        header_store.store({"stored": "headers"})
+
+        self.scheduler.refresh_headers()
+
+        assert self.scheduler.headers == {"stored": "headers"}
+        mock_fetch_headers.assert_not_called()
+
+    def test_refresh_headers_always_fetches_and_stores_headers_for_check_ins(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(CheckInScheduler, "_fetch_headers", return_value={"test": "headers"})
+        header_store = HeaderStore(None)
+        self.scheduler.reservation_monitor.header_store = header_store
+        header_store.store({"stored": "headers"})
+
+        self.scheduler.refresh_headers(BrowserPriority.CHECK_IN)
+
+        assert self.scheduler.headers == {"test": "headers"}
+        assert header_store.entries[HEADERS_KEY][1] == {"test": "headers"}
+
+    def test_refresh_headers_shares_refreshes_for_check_ins_in_the_same_window(
+        self, mocker: MockerFixture
+    ) -> None:
+        mock_fetch_headers = mocker.patch.object(
+            CheckInScheduler, "_fetch_headers", return_value={"test": "headers"}
+        )
+        self.scheduler.reservation_monitor.header_store = HeaderStore(None)
+        checkin_time = datetime(1999, 12, 31, tzinfo=timezone.utc)
+
+        self.scheduler.refresh_headers(BrowserPriority.CHECK_IN, checkin_time)
+        self.scheduler.refresh_headers(
+            BrowserPriority.CHECK_IN, checkin_time + timedelta(minutes=5)
+        )
+
+        assert self.scheduler.headers == {"test": "headers"}
+        mock_fetch_headers.assert_called_once_with(BrowserPriority.CHECK_IN)
+
+    @pytest.mark.parametrize(
+        ("error", "expected_result"),
+        [
+            (None, True),
+            (RequestError("", status_code=401), False),
+            (RequestError("", status_code=403), False),
+            (RequestError("", status_code=500), False),
+            (RequestError(""), False),
+        ],
+    )
+    def test_are_headers_valid_only_succeeds_on_successful_response(
+        self, mocker: MockerFixture, error: RequestError | None, expected_result: bool
+    ) -> None:
+        mock_make_request = mocker.patch(
+            "lib.checkin_scheduler.make_request", side_effect=error, return_value={}
+        )
+
+        assert self.scheduler._are_headers_valid({"test": "headers"}) == expected_result
+        mock_make_request.assert_called_once_with(
+            "GET", HEADERS_PROBE_URL, {"test": "headers"}, {}, max_attempts=1, random_sleep=False
+        )
+
+    def test_get_flights_safely_returns_retrieved_flights(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(CheckInScheduler, "_get_flights", return_value=["flight"])
+        assert self.scheduler._get_flights_safely("test1") == ["flight"]
+
+    def test_get_flights_safely_keeps_scheduled_flights_on_unexpected_error(
+        self, mocker: MockerFixture, test_flights: list[Flight]
+    ) -> None:
+        mocker.patch.object(CheckInScheduler, "_get_flights", side_effect=KeyError)
+        mocker.patch(
+            "lib.checkin_scheduler.get_current_time", return_value=datetime(1999, 12, 30, 18, 20)
+        )
+
+        test_flights[0].confirmation_number = "test1"
+        test_flights[0].departure_time = datetime(1999, 12, 30, 18, 29)
+        test_flights[1].confirmation_number = "test2"
+        test_flights[1].departure_time = datetime(1999, 12, 30, 18, 29)
+        self.scheduler.flights = test_flights
+
+        assert self.scheduler._get_flights_safely("test1") == [test_flights[0]]
+
+    def test_get_flights_safely_does_not_keep_departed_flights_on_unexpected_error(
+        self, mocker: MockerFixture, test_flights: list[Flight]
+    ) -> None:
+        mocker.patch.object(CheckInScheduler, "_get_flights", side_effect=KeyError)
+        mocker.patch(
+            "lib.checkin_scheduler.get_current_time", return_value=datetime(1999, 12, 30, 18, 20)
+        )
+
+        test_flights[0].confirmation_number = "test1"
+        test_flights[0].departure_time = datetime(1999, 12, 30, 18, 19)
+        test_flights[1].confirmation_number = "test1"
+        test_flights[1].departure_time = datetime(1999, 12, 30, 18, 29)
+        self.scheduler.flights = test_flights
+
+        assert self.scheduler._get_flights_safely("test1") == [test_flights[1]]
 
     def test_get_flights_retrieves_all_flights_under_reservation(
         self, mocker: MockerFixture, test_flights: list[Flight]
@@ -59,7 +268,6 @@ class TestCheckInScheduler:
         mocker.patch.object(
             CheckInScheduler, "_get_reservation_info", return_value={"bounds": [{}, {}]}
         )
-        mock_set_same_day_flight = mocker.patch.object(CheckInScheduler, "_set_same_day_flight")
 
         # Set the departing times to be after the current time
         test_flights[0].departure_time = datetime(1999, 12, 30, 18, 29)
@@ -71,9 +279,6 @@ class TestCheckInScheduler:
 
         flights = self.scheduler._get_flights("flight1")
         assert len(flights) == 2, "Unexpected number of flights retrieved"
-        assert mock_set_same_day_flight.call_count == len(flights), (
-            "_set_same_day_flight() not called once for every retrieved flight"
-        )
 
     def test_get_flights_retrieves_no_flights_on_request_error(self, mocker: MockerFixture) -> None:
         mocker.patch("lib.checkin_scheduler.make_request", side_effect=RequestError(""))
@@ -107,6 +312,41 @@ class TestCheckInScheduler:
         reservation_info = self.scheduler._get_reservation_info("flight1")
         assert reservation_info == {"bounds": [{"test": "reservation"}]}
 
+    def test_get_reservation_info_uses_reservation_cache(self, mocker: MockerFixture) -> None:
+        reservation_content = {"viewReservationViewPage": {"bounds": [{"test": "reservation"}]}}
+        mock_make_request = mocker.patch(
+            "lib.checkin_scheduler.make_request", return_value=reservation_content
+        )
+        mock_cache = mock.Mock()
+        mock_cache.get.side_effect = lambda _, request: request()
+        self.scheduler.reservation_monitor.reservation_cache = mock_cache
+        self.scheduler.reservation_monitor.first_name = "John"
+        self.scheduler.reservation_monitor.last_name = "Doe"
+
+        reservation_info = self.scheduler._get_reservation_info("flight1")
+
+        assert reservation_info == {"bounds": [{"test": "reservation"}]}
+        assert mock_cache.get.call_args[0][0] == "FLIGHT1:john:doe"
+        mock_make_request.assert_called_once()
+
+    @pytest.mark.parametrize(("status_code", "should_invalidate"), [(401, True), (404, False)])
+    def test_get_reservation_info_invalidates_stored_headers_on_authentication_error(
+        self, mocker: MockerFixture, status_code: int, should_invalidate: bool
+    ) -> None:
+        mocker.patch(
+            "lib.checkin_scheduler.make_request",
+            side_effect=RequestError("", status_code=status_code),
+        )
+        mocker.patch.object(NotificationHandler, "failed_reservation_retrieval")
+        header_store = HeaderStore(None)
+        header_store.store({"test": "headers"})
+        self.scheduler.reservation_monitor.header_store = header_store
+        self.scheduler.headers = {"test": "headers"}
+
+        self.scheduler._get_reservation_info("flight1")
+
+        assert (HEADERS_KEY not in header_store.entries) == should_invalidate
+
     def test_get_reservation_info_sends_error_notification_when_reservation_not_found(
         self, mocker: MockerFixture
     ) -> None:
@@ -164,17 +404,54 @@ class TestCheckInScheduler:
         assert reservation_info == {}
 
     @pytest.mark.parametrize(("hour_diff", "same_day"), [(23, True), (24, True), (25, False)])
-    def test_set_same_day_flight_sets_flight_as_same_day_correctly(
+    def test_set_same_day_flights_sets_flight_as_same_day_correctly(
         self, hour_diff: int, same_day: bool, test_flights: list[Flight]
     ) -> None:
         prev_flight, new_flight = test_flights
         prev_flight.departure_time = datetime.now(timezone.utc)
         new_flight.departure_time = prev_flight.departure_time + timedelta(hours=hour_diff)
 
-        self.scheduler._set_same_day_flight(new_flight, [prev_flight])
+        # The flights are passed in reverse to ensure they are sorted by departure time
+        self.scheduler._set_same_day_flights([new_flight, prev_flight])
 
+        assert not prev_flight.is_same_day
         assert new_flight.is_same_day == same_day
 
+    def test_set_same_day_flights_does_not_mark_flights_on_other_reservations(
+        self, test_flights: list[Flight]
+    ) -> None:
+        prev_flight, new_flight = test_flights
+        prev_flight.confirmation_number = "test1"
+        prev_flight.departure_time = datetime.now(timezone.utc)
+        new_flight.confirmation_number = "test2"
+        new_flight.departure_time = prev_flight.departure_time + timedelta(hours=5)
+        new_flight.is_same_day = True
+
+        self.scheduler._set_same_day_flights([prev_flight, new_flight])
+
+        assert not prev_flight.is_same_day
+        assert not new_flight.is_same_day
+
+    def test_set_same_day_flights_compares_across_interleaved_reservations(
+        self, test_flights: list[Flight]
+    ) -> None:
+        """A flight on another reservation in between should not hide a same-day flight"""
+        first_flight, last_flight = test_flights
+        middle_flight = copy.copy(first_flight)
+
+        first_flight.confirmation_number = "test1"
+        first_flight.departure_time = datetime.now(timezone.utc)
+        middle_flight.confirmation_number = "test2"
+        middle_flight.departure_time = first_flight.departure_time + timedelta(hours=2)
+        last_flight.confirmation_number = "test1"
+        last_flight.departure_time = first_flight.departure_time + timedelta(hours=4)
+
+        self.scheduler._set_same_day_flights([last_flight, middle_flight, first_flight])
+
+        assert not first_flight.is_same_day
+        assert not middle_flight.is_same_day
+        assert last_flight.is_same_day
+
     def test_update_scheduled_flights_updates_all_flights_correctly(
         self, mocker: MockerFixture, test_flights: list[Flight]
     ) -> None:
@@ -227,8 +504,8 @@ class TestCheckInScheduler:
 
         self.scheduler.flights = test_flights
         self.scheduler.checkin_handlers = [
-            CheckInHandler(self.scheduler, test_flights[0], None),
-            CheckInHandler(self.scheduler, test_flights[1], None),
+            CheckInHandler(self.scheduler, test_flights[0]),
+            CheckInHandler(self.scheduler, test_flights[1]),
         ]
 
         self.scheduler._remove_old_flights([test_flights[1]])
@@ -13,7 +13,7 @@ from lib.config import (
     NotificationConfig,
     ReservationConfig,
 )
-from lib.utils import CheckFaresOption, NotificationLevel
+from lib.utils import BrowserLoadProfile, CheckFaresOption, CheckInEngineOption, NotificationLevel
 
 JSON = dict[str, Any]
 
@@ -56,13 +56,20 @@ class TestConfig:
 
         global_config._parse_config(
             {
+                "browser_load_profile": "lean",
                 "browser_path": "test/browser_path",
                 "check_fares": True,
+                "check_in_engine": "asyncio",
+                "check_in_refresh_window": 10,
+                "driver_cache_ttl": 12,
+                "full_resync_interval": 48,
                 "healthchecks_url": "global_healthchecks",
                 "notifications": [
                     {"url": "url1", "24_hour_time": True},
                 ],
+                "persist_login_session": True,
                 "retrieval_interval": 20,
+                "retrieval_interval_tiers": [{"departure_within": 48, "interval": 1}],
             }
         )
 
@@ -70,17 +77,26 @@ class TestConfig:
             {
                 "browser_path": "test/browser_path2",
                 "check_fares": False,
+                "full_resync_interval": 12,
                 "healthchecks_url": "test_healthchecks",
                 "notifications": [{"url": "url1", "level": NotificationLevel.ERROR}],
                 "retrieval_interval": 10,
+                "retrieval_interval_tiers": [],
             }
         )
 
         test_config._merge_globals(global_config)
 
+        assert test_config.browser_load_profile == BrowserLoadProfile.LEAN
         assert test_config.browser_path == global_config.browser_path
         assert test_config.check_fares == global_config.check_fares
+        assert test_config.check_in_engine == CheckInEngineOption.ASYNCIO
+        assert test_config.check_in_refresh_window == 10 * 60
+        assert test_config.driver_cache_ttl == 12 * 3600
+        assert test_config.full_resync_interval == global_config.full_resync_interval
+        assert test_config.persist_login_session is True
         assert test_config.retrieval_interval == global_config.retrieval_interval
+        assert test_config.retrieval_interval_tiers == global_config.retrieval_interval_tiers
 
         # Notification configs should not be merged in merge_globals
         assert len(test_config.notifications) == 1
@@ -138,8 +154,18 @@ class TestConfig:
         [
             {"check_fares": "invalid"},
             {"healthchecks_url": 0},
+            {"full_resync_interval": "invalid"},
+            {"full_resync_interval": -1},
+            {"full_resync_interval": True},
             {"notifications": "invalid"},
+            {"persist_login_session": "invalid"},
             {"retrieval_interval": "invalid"},
+            {"retrieval_interval_tiers": "invalid"},
+            {"retrieval_interval_tiers": ["invalid"]},
+            {"retrieval_interval_tiers": [{"interval": 1}]},
+            {"retrieval_interval_tiers": [{"departure_within": 1}]},
+            {"retrieval_interval_tiers": [{"departure_within": 1, "interval": 0}]},
+            {"retrieval_interval_tiers": [{"departure_within": "1", "interval": 1}]},
         ],
     )
     def test_parse_config_raises_exception_with_invalid_entries(self, config_content: JSON) -> None:
@@ -153,6 +179,7 @@ class TestConfig:
         test_config._parse_config(
             {
                 "check_fares": CheckFaresOption.SAME_DAY_NONSTOP,
+                "full_resync_interval": 12,
                 "healthchecks_url": "test_healthchecks",
                 "notifications": [
                     {
@@ -161,17 +188,20 @@ class TestConfig:
                         "24_hour_time": False,
                     }
                 ],
+                "persist_login_session": True,
                 "retrieval_interval": 30,
             }
         )
 
         assert test_config.check_fares == CheckFaresOption.SAME_DAY_NONSTOP
+        assert test_config.full_resync_interval == 12 * 60 * 60
         assert test_config.healthchecks_url == "test_healthchecks"
 
         assert len(test_config.notifications) == 1
         self._assert_notification_config_matches(
             test_config.notifications[0], "test_url", NotificationLevel.ERROR, False
         )
+        assert test_config.persist_login_session is True
         assert test_config.retrieval_interval == 30 * 60 * 60
 
     def test_parse_config_does_not_set_values_when_a_config_value_is_empty(self) -> None:
@@ -181,8 +211,10 @@ class TestConfig:
         test_config._parse_config({})
 
         assert test_config.check_fares == expected_config.check_fares
+        assert test_config.full_resync_interval == expected_config.full_resync_interval
         assert test_config.healthchecks_url == expected_config.healthchecks_url
         assert test_config.notifications == expected_config.notifications
+        assert test_config.persist_login_session == expected_config.persist_login_session
         assert test_config.retrieval_interval == expected_config.retrieval_interval
 
     def test_parse_config_sets_retrieval_interval_to_a_minimum(self) -> None:
@@ -191,6 +223,19 @@ class TestConfig:
 
         assert test_config.retrieval_interval == 0
 
+    def test_parse_config_sorts_retrieval_interval_tiers(self) -> None:
+        test_config = Config()
+        test_config._parse_config(
+            {
+                "retrieval_interval_tiers": [
+                    {"departure_within": 336, "interval": 24},
+                    {"departure_within": 48, "interval": 1},
+                ]
+            }
+        )
+
+        assert test_config.retrieval_interval_tiers == [(48 * 3600, 3600), (336 * 3600, 24 * 3600)]
+
     def test_create_notification_config_creates_all_configs(self, mocker: MockerFixture) -> None:
         mock_config_create = mocker.patch.object(NotificationConfig, "create")
         test_config = GlobalConfig()
@@ -485,6 +530,28 @@ class TestGlobalConfig:
         "config_content",
         [
             {"browser_path": 0},
+            {"browser_load_profile": "invalid"},
+            {"check_in_engine": "invalid"},
+            {"check_in_refresh_window": "invalid"},
+            {"check_in_refresh_window": -1},
+            {"check_in_refresh_window": True},
+            {"driver_cache_ttl": -1},
+            {"driver_cache_ttl": "24"},
+            {"browser_workers": -1},
+            {"browser_workers": "invalid"},
+            {"browser_workers": True},
+            {"browser_instances": 0},
+            {"browser_instances": "2"},
+            {"browser_instances": True},
+            {"check_in_quiet_window": -1},
+            {"check_in_quiet_window": "2"},
+            {"daily_request_budget": -1},
+            {"daily_request_budget": "500"},
+            {"daily_browser_session_budget": True},
+            {"browser_session_max_uses": -1},
+            {"browser_session_max_uses": "5"},
+            {"browser_session_max_memory_growth": -1},
+            {"browser_session_max_memory_growth": 1.5},
             {"accounts": "invalid"},
             {"reservations": "invalid"},
         ],
@@ -503,14 +570,36 @@ class TestGlobalConfig:
         test_config._parse_config(
             {
                 "browser_path": "test/browser_path",
+                "browser_load_profile": "lean",
                 "check_fares": False,
+                "check_in_engine": "asyncio",
+                "browser_workers": "auto",
+                "browser_instances": 2,
+                "browser_session_max_uses": 20,
+                "browser_session_max_memory_growth": 256,
+                "check_in_refresh_window": 2,
+                "check_in_quiet_window": 5,
+                "daily_request_budget": 500,
+                "daily_browser_session_budget": 20,
+                "driver_cache_ttl": 0,
                 "accounts": [],
                 "reservations": [],
             }
         )
 
         assert test_config.browser_path == "test/browser_path"
+        assert test_config.browser_load_profile == BrowserLoadProfile.LEAN
         assert test_config.check_fares == CheckFaresOption.NO
+        assert test_config.check_in_engine == CheckInEngineOption.ASYNCIO
+        assert test_config.browser_workers == "auto"
+        assert test_config.browser_instances == 2
+        assert test_config.browser_session_max_uses == 20
+        assert test_config.browser_session_max_memory_growth == 256 * 1024 * 1024
+        assert test_config.check_in_refresh_window == 2 * 60
+        assert test_config.check_in_quiet_window == 5 * 60
+        assert test_config.daily_request_budget == 500
+        assert test_config.daily_browser_session_budget == 20
+        assert test_config.driver_cache_ttl == 0
         mock_account_config.assert_called_once_with([])
         mock_reservation_config.assert_called_once_with([])
 
@@ -521,6 +610,22 @@ class TestGlobalConfig:
         test_config._parse_config({})
 
         assert test_config.browser_path == expected_config.browser_path
+        assert test_config.browser_load_profile == expected_config.browser_load_profile
+        assert test_config.check_in_engine == expected_config.check_in_engine
+        assert test_config.browser_workers == expected_config.browser_workers
+        assert test_config.browser_instances == expected_config.browser_instances
+        assert test_config.browser_session_max_uses == expected_config.browser_session_max_uses
+        assert (
+            test_config.browser_session_max_memory_growth
+            == expected_config.browser_session_max_memory_growth
+        )
+        assert test_config.check_in_refresh_window == expected_config.check_in_refresh_window
+        assert test_config.check_in_quiet_window == expected_config.check_in_quiet_window
+        assert test_config.daily_request_budget == expected_config.daily_request_budget
+        assert (
+            test_config.daily_browser_session_budget == expected_config.daily_browser_session_budget
+        )
+        assert test_config.driver_cache_ttl == expected_config.driver_cache_ttl
         assert test_config.accounts == expected_config.accounts
         assert test_config.reservations == expected_config.reservations
 
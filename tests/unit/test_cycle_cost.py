@@ -0,0 +1,43 @@
+from lib.cycle_cost import (
+    measure_cycle,
+    measure_fare_checks,
+    record_browser_session,
+    record_request,
+)
+
+
+def test_record_request_does_nothing_outside_a_cycle() -> None:
+    # Nothing should be raised
+    record_request()
+    record_browser_session()
+
+
+def test_measure_cycle_counts_requests_and_browser_sessions() -> None:
+    with measure_cycle() as cycle_cost:
+        record_request()
+        record_request()
+        record_browser_session()
+
+    # Requests after the cycle aren't counted
+    record_request()
+
+    assert cycle_cost.requests == 2
+    assert cycle_cost.browser_sessions == 1
+    assert not cycle_cost.checked_fares
+
+
+def test_measure_fare_checks_counts_fare_check_requests_separately() -> None:
+    with measure_cycle() as cycle_cost:
+        record_request()
+        with measure_fare_checks():
+            record_request()
+            record_request()
+
+    assert cycle_cost.requests == 1
+    assert cycle_cost.fare_check_requests == 2
+    assert cycle_cost.checked_fares
+
+
+def test_measure_fare_checks_does_nothing_outside_a_cycle() -> None:
+    with measure_fare_checks():
+        record_request()
@@ -0,0 +1,149 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lib import display_manager
+from lib.display_manager import BASE_DISPLAY_NUMBER, DisplayManager, SlotDisplay
+
+
+@pytest.fixture(autouse=True)
+def lock_file(mocker: MockerFixture, tmp_path: Path) -> Path:
+    mocker.patch("lib.display_manager.X_LOCK_FILE", str(tmp_path / ".X{}-lock"))
+    return tmp_path / f".X{BASE_DISPLAY_NUMBER}-lock"
+
+
+def test_get_display_manager_returns_the_same_manager(mocker: MockerFixture) -> None:
+    mocker.patch("lib.display_manager._display_manager", None)
+    assert display_manager.get_display_manager() is display_manager.get_display_manager()
+
+
+def test_get_display_number_offsets_by_browser_slot() -> None:
+    assert display_manager.get_display_number(3) == BASE_DISPLAY_NUMBER + 3
+
+
+def test_is_display_running_returns_false_without_lock_file() -> None:
+    assert display_manager.is_display_running(BASE_DISPLAY_NUMBER) is False
+
+
+def test_is_display_running_returns_true_when_x_server_is_running(
+    mocker: MockerFixture, lock_file: Path
+) -> None:
+    lock_file.write_text("      1234\n")
+    mock_kill = mocker.patch("os.kill")
+
+    assert display_manager.is_display_running(BASE_DISPLAY_NUMBER) is True
+    mock_kill.assert_called_once_with(1234, 0)
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"), [(ProcessLookupError, False), (PermissionError, True)]
+)
+def test_is_display_running_checks_if_x_server_process_exists(
+    mocker: MockerFixture, lock_file: Path, error: type[Exception], expected: bool
+) -> None:
+    lock_file.write_text("1234")
+    mocker.patch("os.kill", side_effect=error)
+
+    assert display_manager.is_display_running(BASE_DISPLAY_NUMBER) is expected
+
+
+def test_is_display_running_returns_false_when_lock_file_is_invalid(lock_file: Path) -> None:
+    lock_file.write_text("invalid")
+    assert display_manager.is_display_running(BASE_DISPLAY_NUMBER) is False
+
+
+class TestSlotDisplay:
+    @pytest.fixture(autouse=True)
+    def _set_up_display(self, mocker: MockerFixture) -> None:
+        self.mock_popen = mocker.patch("subprocess.Popen")
+        self.mock_popen.return_value.poll.return_value = None
+        self.display = SlotDisplay(BASE_DISPLAY_NUMBER, size=(100, 200))
+
+    def test_start_runs_xvfb_on_the_display_number(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.display_manager.is_display_running", return_value=True)
+        self.display.start()
+
+        command = self.mock_popen.call_args[0][0]
+        assert command[:2] == ["Xvfb", f":{BASE_DISPLAY_NUMBER}"]
+        assert "100x200x24" in command
+        assert self.display.pid == self.mock_popen.return_value.pid
+        assert self.display.is_alive()
+
+    def test_start_waits_for_display_to_run(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.display_manager.DISPLAY_START_POLL_INTERVAL_SECS", 0)
+        mock_is_running = mocker.patch(
+            "lib.display_manager.is_display_running", side_effect=[False, False, True]
+        )
+        self.display.start()
+        assert mock_is_running.call_count == 3
+
+    def test_start_stops_waiting_when_xvfb_exits(self, mocker: MockerFixture) -> None:
+        mock_is_running = mocker.patch("lib.display_manager.is_display_running")
+        self.mock_popen.return_value.poll.return_value = 1
+
+        self.display.start()
+
+        mock_is_running.assert_not_called()
+        assert not self.display.is_alive()
+
+    def test_stop_kills_xvfb_when_it_does_not_exit(self) -> None:
+        mock_process = self.mock_popen.return_value
+        mock_process.wait.side_effect = [subprocess.TimeoutExpired("Xvfb", 5), None]
+        self.display.process = mock_process
+
+        self.display.stop()
+
+        mock_process.terminate.assert_called_once()
+        mock_process.kill.assert_called_once()
+
+    def test_stop_does_nothing_when_not_started(self) -> None:
+        self.display.stop()
+        assert self.display.pid is None
+        assert not self.display.is_alive()
+
+
+class TestDisplayManager:
+    @pytest.fixture(autouse=True)
+    def _set_up_manager(self) -> None:
+        self.manager = DisplayManager()
+
+    def test_start_displays_leases_every_slot(self, mocker: MockerFixture) -> None:
+        mock_lease = mocker.patch.object(self.manager, "lease")
+        self.manager.start_displays(3)
+        assert mock_lease.call_args_list == [mocker.call(0), mocker.call(1), mocker.call(2)]
+
+    def test_lease_reuses_running_display(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.display_manager.is_display_running", return_value=True)
+        mock_display = mocker.patch("lib.display_manager.SlotDisplay")
+
+        assert self.manager.lease(1) == BASE_DISPLAY_NUMBER + 1
+        mock_display.assert_not_called()
+
+    def test_lease_starts_display_when_not_running(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.display_manager.is_display_running", return_value=False)
+        mock_display = mocker.patch("lib.display_manager.SlotDisplay")
+
+        assert self.manager.lease(1) == BASE_DISPLAY_NUMBER + 1
+        mock_display.assert_called_once_with(BASE_DISPLAY_NUMBER + 1)
+        mock_display.return_value.start.assert_called_once()
+        assert self.manager.displays[BASE_DISPLAY_NUMBER + 1] == mock_display.return_value
+
+    def test_lease_restarts_unhealthy_display(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.display_manager.is_display_running", return_value=False)
+        mock_display = mocker.patch("lib.display_manager.SlotDisplay")
+        old_display = mocker.Mock()
+        self.manager.displays[BASE_DISPLAY_NUMBER] = old_display
+
+        self.manager.lease(0)
+
+        old_display.stop.assert_called_once()
+        assert self.manager.displays[BASE_DISPLAY_NUMBER] == mock_display.return_value
+
+    def test_lease_ignores_error_when_display_fails_to_start(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.display_manager.is_display_running", return_value=False)
+        mocker.patch("lib.display_manager.SlotDisplay", side_effect=Exception)
+
+        assert self.manager.lease(0) == BASE_DISPLAY_NUMBER
+        assert self.manager.displays == {}
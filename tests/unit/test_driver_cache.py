@@ -0,0 +1,134 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lib import driver_cache
+from lib.driver_cache import DriverCache
+
+
+@pytest.fixture
+def browser_path(tmp_path: Path) -> str:
+    path = tmp_path / "chrome"
+    path.write_text("browser")
+    return str(path)
+
+
+@pytest.fixture
+def cache_file(mocker: MockerFixture, tmp_path: Path) -> Path:
+    path = tmp_path / "cache" / "driver_cache.json"
+    mocker.patch("lib.driver_cache.DRIVER_CACHE_FILE", path)
+    return path
+
+
+def test_get_browser_fingerprint_changes_when_browser_binary_changes(browser_path: str) -> None:
+    fingerprint = driver_cache.get_browser_fingerprint(browser_path)
+    Path(browser_path).write_text("updated browser")
+
+    assert driver_cache.get_browser_fingerprint(browser_path) != fingerprint
+
+
+def test_get_browser_fingerprint_returns_none_when_browser_does_not_exist(tmp_path: Path) -> None:
+    assert driver_cache.get_browser_fingerprint(str(tmp_path / "missing")) is None
+
+
+def test_get_browser_fingerprint_finds_default_browser(
+    mocker: MockerFixture, browser_path: str
+) -> None:
+    mocker.patch("lib.driver_cache.detect_b_ver.get_binary_location", return_value=browser_path)
+    assert driver_cache.get_browser_fingerprint(None) == driver_cache.get_browser_fingerprint(
+        browser_path
+    )
+
+
+def test_get_browser_fingerprint_returns_none_when_default_browser_is_not_found(
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch("lib.driver_cache.detect_b_ver.get_binary_location", side_effect=Exception)
+    assert driver_cache.get_browser_fingerprint(None) is None
+
+
+@pytest.mark.usefixtures("cache_file")
+class TestDriverCache:
+    def test_get_returns_stored_entry(self, browser_path: str) -> None:
+        cache = DriverCache(3600)
+        cache.store(browser_path, "130.0.1", "130.0.2")
+
+        entry = cache.get(browser_path)
+
+        assert entry["browser_version"] == "130.0.1"
+        assert entry["driver_version"] == "130.0.2"
+
+    def test_get_is_shared_between_cache_instances(self, browser_path: str) -> None:
+        DriverCache(3600).store(browser_path, "130.0.1", "130.0.2")
+        assert DriverCache(3600).get(browser_path) is not None
+
+    def test_get_returns_none_when_entry_has_expired(
+        self, mocker: MockerFixture, browser_path: str
+    ) -> None:
+        cache = DriverCache(3600)
+        cache.store(browser_path, "130.0.1", "130.0.2")
+        mocker.patch("time.time", return_value=time.time() + 3600)
+
+        assert cache.get(browser_path) is None
+
+    def test_get_returns_none_when_browser_binary_changes(self, browser_path: str) -> None:
+        cache = DriverCache(3600)
+        cache.store(browser_path, "130.0.1", "130.0.2")
+        Path(browser_path).write_text("updated browser")
+
+        assert cache.get(browser_path) is None
+
+    def test_get_returns_none_when_browser_is_not_found(self, tmp_path: Path) -> None:
+        assert DriverCache(3600).get(str(tmp_path / "missing")) is None
+
+    def test_get_returns_none_when_cache_file_is_invalid(
+        self, cache_file: Path, browser_path: str
+    ) -> None:
+        cache_file.parent.mkdir()
+        cache_file.write_text("invalid")
+
+        assert DriverCache(3600).get(browser_path) is None
+
+    def test_cache_is_disabled_with_a_ttl_of_zero(
+        self, cache_file: Path, browser_path: str
+    ) -> None:
+        cache = DriverCache(0)
+        cache.store(browser_path, "130.0.1", "130.0.2")
+
+        assert not cache_file.exists()
+        assert cache.get(browser_path) is None
+
+    def test_store_keeps_entries_for_other_browsers(
+        self, cache_file: Path, browser_path: str, tmp_path: Path
+    ) -> None:
+        other_browser_path = tmp_path / "brave"
+        other_browser_path.write_text("other browser")
+        cache = DriverCache(3600)
+
+        cache.store(str(other_browser_path), "129.0.1", "129.0.2")
+        cache.store(browser_path, "130.0.1", "130.0.2")
+
+        assert len(json.loads(cache_file.read_text())) == 2
+        assert cache.get(str(other_browser_path))["browser_version"] == "129.0.1"
+
+    def test_store_does_not_leave_temporary_files(
+        self, cache_file: Path, browser_path: str
+    ) -> None:
+        DriverCache(3600).store(browser_path, "130.0.1", "130.0.2")
+        assert os.listdir(cache_file.parent) == [cache_file.name]
+
+    def test_store_ignores_write_errors(self, mocker: MockerFixture, browser_path: str) -> None:
+        mocker.patch("tempfile.mkstemp", side_effect=OSError)
+        DriverCache(3600).store(browser_path, "130.0.1", "130.0.2")
+
+    def test_invalidate_removes_entry(self, browser_path: str) -> None:
+        cache = DriverCache(3600)
+        cache.store(browser_path, "130.0.1", "130.0.2")
+
+        cache.invalidate(browser_path)
+
+        assert cache.get(browser_path) is None
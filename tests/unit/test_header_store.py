@@ -0,0 +1,262 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lib.header_store import HEADERS_KEY, HeaderStore, get_check_in_key
+from lib.utils import DriverTimeoutError
+
+
+@pytest.fixture
+def mock_manager() -> mock.Mock:
+    manager = mock.Mock()
+    manager.dict.side_effect = dict
+    return manager
+
+
+@pytest.fixture(autouse=True)
+def mock_poll_interval(mocker: MockerFixture) -> None:
+    mocker.patch("lib.in_flight.POLL_INTERVAL_SECS", 0.01)
+
+
+class TestHeaderStore:
+    @pytest.fixture(autouse=True)
+    def _set_up_store(self, mock_manager: mock.Mock) -> None:
+        self.store = HeaderStore(mock_manager, ttl=60)
+
+    def test_get_refreshes_and_stores_headers_when_empty(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=100)
+        mock_refresh = mock.Mock(return_value={"test": "headers"})
+
+        assert self.store.get(mock_refresh) == {"test": "headers"}
+        mock_refresh.assert_called_once()
+        assert self.store.entries[HEADERS_KEY] == (100, {"test": "headers"})
+
+    def test_get_uses_stored_headers_before_they_expire(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=159)
+        self.store.entries[HEADERS_KEY] = (100, {"test": "stored"})
+        mock_refresh = mock.Mock()
+
+        assert self.store.get(mock_refresh) == {"test": "stored"}
+        mock_refresh.assert_not_called()
+
+    def test_get_refreshes_again_when_stored_headers_expire(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=160)
+        self.store.entries[HEADERS_KEY] = (100, {"test": "stored"})
+        mock_refresh = mock.Mock(return_value={"test": "new"})
+
+        assert self.store.get(mock_refresh) == {"test": "new"}
+        assert self.store.entries[HEADERS_KEY] == (160, {"test": "new"})
+
+    def test_get_reuses_expired_headers_when_probe_says_they_are_valid(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("time.time", return_value=160)
+        self.store.entries[HEADERS_KEY] = (100, {"test": "stored"})
+        mock_refresh = mock.Mock()
+        mock_probe = mock.Mock(return_value=True)
+
+        assert self.store.get(mock_refresh, mock_probe) == {"test": "stored"}
+        mock_probe.assert_called_once_with({"test": "stored"})
+        mock_refresh.assert_not_called()
+        assert self.store.entries[HEADERS_KEY] == (160, {"test": "stored"})
+        assert self.store.get_stats() == {
+            "probes": 1,
+            "browser_launches_saved": 1,
+            "hit_rate": 1,
+        }
+
+    def test_get_refreshes_when_probe_says_expired_headers_are_invalid(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("time.time", return_value=160)
+        self.store.entries[HEADERS_KEY] = (100, {"test": "stored"})
+        mock_refresh = mock.Mock(return_value={"test": "new"})
+
+        assert self.store.get(mock_refresh, mock.Mock(return_value=False)) == {"test": "new"}
+        assert self.store.get_stats() == {
+            "probes": 1,
+            "browser_launches_saved": 0,
+            "hit_rate": 0,
+        }
+
+    def test_get_does_not_probe_without_stored_headers(self) -> None:
+        mock_probe = mock.Mock()
+
+        self.store.get(mock.Mock(return_value={"test": "new"}), mock_probe)
+
+        mock_probe.assert_not_called()
+
+    def test_get_does_not_store_failed_refreshes(self) -> None:
+        mock_refresh = mock.Mock(side_effect=DriverTimeoutError)
+
+        with pytest.raises(DriverTimeoutError):
+            self.store.get(mock_refresh)
+
+        assert self.store.entries == {}
+
+    def test_get_coalesces_concurrent_refreshes(self) -> None:
+        refresh_started = threading.Event()
+        finish_refresh = threading.Event()
+
+        def slow_refresh() -> dict[str, str]:
+            refresh_started.set()
+            finish_refresh.wait(5)
+            return {"test": "headers"}
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(self.store.get(slow_refresh)))
+        first.start()
+        refresh_started.wait(5)
+
+        mock_refresh = mock.Mock()
+        second = threading.Thread(target=lambda: results.append(self.store.get(mock_refresh)))
+        second.start()
+        finish_refresh.set()
+        first.join()
+        second.join()
+
+        assert results == [{"test": "headers"}, {"test": "headers"}]
+        mock_refresh.assert_not_called()
+
+    def test_get_takes_over_refresh_of_stopped_process(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=100)
+        mocker.patch("lib.in_flight.is_process_running", return_value=False)
+        self.store.in_flight.marks[HEADERS_KEY] = (1234, 5678, 1, 100)
+        mock_refresh = mock.Mock(return_value={"test": "headers"})
+
+        assert self.store.get(mock_refresh) == {"test": "headers"}
+        mock_refresh.assert_called_once()
+        assert self.store.in_flight.marks == {}
+
+    def test_get_for_check_in_refreshes_and_stores_headers_for_the_window(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("time.time", return_value=100)
+        checkin_time = datetime(1999, 12, 31, tzinfo=timezone.utc)
+        mock_refresh = mock.Mock(return_value={"test": "headers"})
+
+        assert self.store.get_for_check_in(checkin_time, 300, mock_refresh) == {"test": "headers"}
+        assert self.store.entries[get_check_in_key(3155328)] == (
+            checkin_time.timestamp(),
+            {"test": "headers"},
+        )
+        # The headers are shared with routine refreshes as well
+        assert self.store.entries[HEADERS_KEY] == (100, {"test": "headers"})
+
+    @pytest.mark.parametrize(
+        ("offset", "should_refresh"), [(-300, False), (300, False), (301, True)]
+    )
+    def test_get_for_check_in_reuses_headers_for_check_ins_in_the_same_window(
+        self, offset: int, should_refresh: bool
+    ) -> None:
+        checkin_time = datetime(1999, 12, 31, tzinfo=timezone.utc)
+        self.store.entries[get_check_in_key(3155328)] = (
+            checkin_time.timestamp(),
+            {"test": "group"},
+        )
+        mock_refresh = mock.Mock(return_value={"test": "new"})
+
+        headers = self.store.get_for_check_in(
+            checkin_time + timedelta(seconds=offset), 300, mock_refresh
+        )
+
+        assert mock_refresh.called == should_refresh
+        assert headers == ({"test": "new"} if should_refresh else {"test": "group"})
+
+    def test_get_for_check_in_does_not_wait_for_refresh_in_another_window(self) -> None:
+        checkin_time = datetime(1999, 12, 31, tzinfo=timezone.utc)
+        refresh_started = threading.Event()
+        finish_refresh = threading.Event()
+
+        def slow_refresh() -> dict:
+            refresh_started.set()
+            finish_refresh.wait(1)
+            return {"test": "first"}
+
+        thread = threading.Thread(
+            target=self.store.get_for_check_in, args=(checkin_time, 300, slow_refresh)
+        )
+        thread.start()
+        assert refresh_started.wait(1)
+
+        # A check-in an hour later refreshes while the first window's refresh is still running
+        other_headers = self.store.get_for_check_in(
+            checkin_time + timedelta(hours=1), 300, mock.Mock(return_value={"test": "second"})
+        )
+        assert thread.is_alive()
+        finish_refresh.set()
+        thread.join()
+
+        assert other_headers == {"test": "second"}
+
+    def test_get_for_check_in_coalesces_refreshes_in_the_same_window(self) -> None:
+        checkin_time = datetime(1999, 12, 31, tzinfo=timezone.utc)
+        refresh_started = threading.Event()
+        finish_refresh = threading.Event()
+
+        def slow_refresh() -> dict:
+            refresh_started.set()
+            finish_refresh.wait(5)
+            return {"test": "first"}
+
+        thread = threading.Thread(
+            target=self.store.get_for_check_in, args=(checkin_time, 300, slow_refresh)
+        )
+        thread.start()
+        assert refresh_started.wait(5)
+
+        mock_refresh = mock.Mock()
+        threading.Timer(0.05, finish_refresh.set).start()
+        headers = self.store.get_for_check_in(checkin_time, 300, mock_refresh)
+        thread.join()
+
+        assert headers == {"test": "first"}
+        mock_refresh.assert_not_called()
+
+    def test_get_for_check_in_takes_over_refresh_of_stopped_process(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("time.time", return_value=100)
+        mocker.patch("lib.in_flight.is_process_running", return_value=False)
+        checkin_time = datetime(1999, 12, 31, tzinfo=timezone.utc)
+        self.store.check_in_in_flight.marks[get_check_in_key(3155328)] = (1234, 5678, 1, 100)
+        mock_refresh = mock.Mock(return_value={"test": "headers"})
+
+        assert self.store.get_for_check_in(checkin_time, 300, mock_refresh) == {"test": "headers"}
+        assert self.store.check_in_in_flight.marks == {}
+
+    def test_get_for_check_in_evicts_headers_of_past_windows(self, mocker: MockerFixture) -> None:
+        checkin_time = datetime(1999, 12, 31, tzinfo=timezone.utc)
+        mocker.patch("time.time", return_value=checkin_time.timestamp())
+        self.store.entries[get_check_in_key(0)] = (100, {"test": "old"})
+
+        self.store.get_for_check_in(checkin_time, 300, mock.Mock(return_value={"test": "new"}))
+
+        assert get_check_in_key(0) not in self.store.entries
+
+    def test_invalidate_removes_rejected_headers(self) -> None:
+        self.store.entries[HEADERS_KEY] = (100, {"test": "headers"})
+        self.store.entries[get_check_in_key(0)] = (100, {"test": "headers"})
+
+        self.store.invalidate({"test": "headers"})
+
+        assert self.store.entries == {}
+
+    def test_invalidate_keeps_headers_refreshed_since(self) -> None:
+        self.store.entries[HEADERS_KEY] = (100, {"test": "new"})
+
+        self.store.invalidate({"test": "old"})
+
+        assert self.store.entries[HEADERS_KEY] == (100, {"test": "new"})
+
+    def test_store_ignores_empty_headers(self) -> None:
+        self.store.store({})
+        assert self.store.entries == {}
+
+
+def test_header_store_uses_regular_dictionary_without_manager() -> None:
+    store = HeaderStore(None)
+    assert store.entries == {}
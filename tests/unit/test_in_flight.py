@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import pytest
+
+from lib.in_flight import InFlightRequests
+
+if TYPE_CHECKING:
+    from pytest_mock import MockerFixture
+
+
+@pytest.fixture(autouse=True)
+def mock_poll_interval(mocker: MockerFixture) -> None:
+    mocker.patch("lib.in_flight.POLL_INTERVAL_SECS", 0.01)
+
+
+class TestInFlightRequests:
+    @pytest.fixture(autouse=True)
+    def _set_up_in_flight(self) -> None:
+        self.in_flight = InFlightRequests(None, timeout=60)
+        self.results = {}
+
+    def _request(self, key: str, result: str) -> mock.Mock:
+        def request() -> str:
+            self.results[key] = result
+            return result
+
+        return mock.Mock(side_effect=request)
+
+    def _get(self, request: mock.Mock) -> str:
+        return self.in_flight.get("TEST", lambda: self.results.get("TEST"), request)
+
+    def test_get_returns_existing_result_without_requesting(self) -> None:
+        self.results["TEST"] = "stored"
+        mock_request = mock.Mock()
+
+        assert self._get(mock_request) == "stored"
+        mock_request.assert_not_called()
+
+    def test_get_requests_and_removes_mark_on_miss(self) -> None:
+        mock_request = self._request("TEST", "requested")
+
+        assert self._get(mock_request) == "requested"
+        mock_request.assert_called_once()
+        assert self.in_flight.marks == {}
+
+    def test_get_waits_for_request_of_another_process(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=100)
+        self.in_flight.marks["TEST"] = (os.getpid(), 0, 1, 100)
+        mock_request = mock.Mock()
+
+        def finish_request() -> None:
+            self.results["TEST"] = "other"
+            self.in_flight.marks.pop("TEST")
+
+        timer = threading.Timer(0.05, finish_request)
+        timer.start()
+
+        assert self._get(mock_request) == "other"
+        mock_request.assert_not_called()
+        timer.join()
+
+    def test_get_takes_over_mark_of_stopped_process(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=100)
+        mock_is_running = mocker.patch("lib.in_flight.is_process_running", return_value=False)
+        self.in_flight.marks["TEST"] = (1234, 5678, 1, 100)
+        mock_request = self._request("TEST", "requested")
+
+        assert self._get(mock_request) == "requested"
+        mock_is_running.assert_called_once_with(1234, 5678)
+        assert self.in_flight.marks == {}
+
+    def test_get_takes_over_mark_after_timeout(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=161)
+        self.in_flight.marks["TEST"] = (os.getpid(), 0, 1, 100)
+        mock_request = self._request("TEST", "requested")
+
+        assert self._get(mock_request) == "requested"
+        assert self.in_flight.marks == {}
+
+    def test_get_removes_mark_when_request_fails(self) -> None:
+        mock_request = mock.Mock(side_effect=ValueError)
+
+        with pytest.raises(ValueError):
+            self.in_flight.get("TEST", lambda: None, mock_request)
+
+        assert self.in_flight.marks == {}
+
+    def test_get_keeps_mark_that_was_taken_over(self) -> None:
+        new_mark = (1234, 5678, 1, 100)
+
+        def request() -> str:
+            self.in_flight.marks["TEST"] = new_mark
+            return "requested"
+
+        assert self.in_flight.get("TEST", lambda: None, request) == "requested"
+        assert self.in_flight.marks["TEST"] == new_mark
+
+    def test_get_requests_without_lock_when_lock_times_out(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.in_flight.LOCK_TIMEOUT_SECS", 0.01)
+        self.in_flight.lock.acquire()
+        mock_request = mock.Mock(return_value="requested")
+
+        assert self.in_flight.get("TEST", lambda: None, mock_request) == "requested"
+        assert self.in_flight.marks == {}
+        self.in_flight.lock.release()
@@ -1,13 +1,19 @@
+from __future__ import annotations
+
 import logging
+from typing import TYPE_CHECKING
+from unittest import mock
 
 import pytest
-from pytest_mock import MockerFixture
-from requests_mock.mocker import Mocker as RequestMocker
 
 from lib import main
 from lib.config import AccountConfig, GlobalConfig, ReservationConfig
 from lib.notification_handler import NotificationHandler
-from lib.reservation_monitor import AccountMonitor, ReservationMonitor
+from lib.reservation_monitor import MONITOR_NAME, AccountMonitor, ReservationMonitor
+
+if TYPE_CHECKING:
+    from pytest_mock import MockerFixture
+    from requests_mock.mocker import Mocker as RequestMocker
 
 
 @pytest.fixture(autouse=True)
@@ -16,6 +22,11 @@ def mock_config(mocker: MockerFixture) -> None:
     mocker.patch("lib.config.GlobalConfig._read_config")
 
 
+@pytest.fixture(autouse=True)
+def mock_browser_reaper(mocker: MockerFixture) -> mock.Mock:
+    return mocker.patch("lib.main.BrowserReaper")
+
+
 def test_get_timezone_fetches_timezone_from_request(requests_mock: RequestMocker) -> None:
     requests_mock.get(main.IP_TIMEZONE_URL, text="Asia/Tokyo")
     assert main.get_timezone() == "Asia/Tokyo"
@@ -57,12 +68,60 @@ def test_pluralize_pluralizes_a_word_if_needed(expected: str, count: int) -> Non
     assert main.pluralize("test", count) == expected
 
 
+@pytest.mark.parametrize(("is_docker", "expected_calls"), [(True, 1), (False, 0)])
+def test_set_up_displays_starts_displays_only_in_docker(
+    mocker: MockerFixture, is_docker: bool, expected_calls: int
+) -> None:
+    mocker.patch("lib.main.IS_DOCKER", is_docker)
+    mock_get_display_manager = mocker.patch("lib.main.get_display_manager")
+
+    main.set_up_displays(2)
+
+    mock_start_displays = mock_get_display_manager.return_value.start_displays
+    assert mock_start_displays.call_count == expected_calls
+
+
+@pytest.mark.parametrize(("has_proc", "expected_calls"), [(True, 1), (False, 0)])
+def test_set_up_browser_reaper_starts_reaper_only_with_proc(
+    mocker: MockerFixture, mock_browser_reaper: mock.Mock, has_proc: bool, expected_calls: int
+) -> None:
+    mocker.patch("os.path.isdir", return_value=has_proc)
+    mock_lock = mock.Mock()
+    main.set_up_browser_reaper(mock_lock)
+    assert mock_browser_reaper.return_value.start.call_count == expected_calls
+    assert mock_browser_reaper.call_count == expected_calls
+    if has_proc:
+        mock_browser_reaper.assert_called_once_with(mock_lock)
+
+
+def test_set_up_browser_pool_does_not_start_pool_when_disabled(mocker: MockerFixture) -> None:
+    mock_browser_pool = mocker.patch("lib.main.BrowserPool")
+    assert main.set_up_browser_pool(GlobalConfig()) is None
+    mock_browser_pool.assert_not_called()
+
+
+@pytest.mark.parametrize(("browser_workers", "expected_workers"), [(2, 2), ("auto", 3)])
+def test_set_up_browser_pool_starts_pool_with_configured_workers(
+    mocker: MockerFixture, browser_workers: int | str, expected_workers: int
+) -> None:
+    mock_browser_pool = mocker.patch("lib.main.BrowserPool")
+    mocker.patch("lib.main.get_auto_num_workers", return_value=3)
+    mock_set_up_displays = mocker.patch("lib.main.set_up_displays")
+    config = GlobalConfig()
+    config.browser_workers = browser_workers
+
+    assert main.set_up_browser_pool(config) == mock_browser_pool.return_value
+    mock_set_up_displays.assert_called_once_with(expected_workers)
+    mock_browser_pool.assert_called_once_with(expected_workers, 0, 512 * 1024 * 1024)
+    mock_browser_pool.return_value.start.assert_called_once()
+
+
 def test_set_up_accounts_starts_all_accounts(mocker: MockerFixture) -> None:
     config = GlobalConfig()
     config.accounts = [AccountConfig(), AccountConfig()]
 
     mock_account_start = mocker.patch.object(AccountMonitor, "start")
-    main.set_up_accounts(config, None)
+    main.set_up_accounts(config, None, None, None, None)
     assert mock_account_start.call_count == len(config.accounts)
 
 
@@ -71,10 +130,64 @@ def test_set_up_reservations_starts_all_reservations(mocker: MockerFixture) -> N
     config.reservations = [ReservationConfig(), ReservationConfig()]
 
     mock_reservation_start = mocker.patch.object(ReservationMonitor, "start")
-    main.set_up_reservations(config, None)
+    main.set_up_reservations(config, None, None, None, None)
     assert mock_reservation_start.call_count == len(config.reservations)
 
 
+def test_set_up_accounts_staggers_monitors(mocker: MockerFixture) -> None:
+    config = GlobalConfig()
+    config.accounts = [AccountConfig()]
+    mock_stagger_planner = mock.Mock()
+    mock_stagger_planner.get_stagger.return_value = (15, 0.5)
+
+    monitors = []
+    mocker.patch.object(AccountMonitor, "start", autospec=True, side_effect=monitors.append)
+    main.set_up_accounts(config, None, None, None, None, mock_stagger_planner)
+
+    mock_stagger_planner.get_stagger.assert_called_once_with(config.accounts[0])
+    assert monitors[0].start_delay == 15
+    assert monitors[0].phase == 0.5
+
+
+def test_set_up_reservations_sets_budget_planner(mocker: MockerFixture) -> None:
+    config = GlobalConfig()
+    config.reservations = [ReservationConfig()]
+    mock_budget_planner = mock.Mock()
+
+    monitors = []
+    mocker.patch.object(ReservationMonitor, "start", autospec=True, side_effect=monitors.append)
+    main.set_up_reservations(config, None, None, None, None, None, mock_budget_planner)
+
+    assert monitors[0].budget_planner == mock_budget_planner
+
+
+def test_set_up_reservations_staggers_monitors(mocker: MockerFixture) -> None:
+    config = GlobalConfig()
+    config.reservations = [ReservationConfig()]
+    mock_stagger_planner = mock.Mock()
+    mock_stagger_planner.get_stagger.return_value = (30, 0.25)
+
+    monitors = []
+    mocker.patch.object(ReservationMonitor, "start", autospec=True, side_effect=monitors.append)
+    main.set_up_reservations(config, None, None, None, None, mock_stagger_planner)
+
+    assert monitors[0].start_delay == 30
+    assert monitors[0].phase == 0.25
+
+
+def test_set_up_budget_planner_does_not_plan_without_a_budget() -> None:
+    assert main.set_up_budget_planner(GlobalConfig()) is None
+
+
+def test_set_up_budget_planner_creates_planner_with_a_budget(mocker: MockerFixture) -> None:
+    mock_budget_planner = mocker.patch("lib.main.BudgetPlanner")
+    config = GlobalConfig()
+    config.daily_browser_session_budget = 10
+
+    assert main.set_up_budget_planner(config) == mock_budget_planner.return_value
+    mock_budget_planner.assert_called_once_with(config, [])
+
+
 def test_set_up_check_in_sends_test_notifications_when_flag_passed(mocker: MockerFixture) -> None:
     mock_test_notifications = mocker.patch("lib.main.test_notifications")
     with pytest.raises(SystemExit):
@@ -82,6 +195,17 @@ def test_set_up_check_in_sends_test_notifications_when_flag_passed(mocker: Mocke
     mock_test_notifications.assert_called_once()
 
 
+def test_set_up_check_in_prints_phase_timings_when_flag_passed(mocker: MockerFixture) -> None:
+    mock_print_phase_timings = mocker.patch("lib.main.print_phase_timings")
+    mock_config = mocker.patch("lib.main.GlobalConfig")
+
+    with pytest.raises(SystemExit):
+        main.set_up_check_in(["--phase-timings"])
+
+    mock_print_phase_timings.assert_called_once()
+    mock_config.assert_not_called()
+
+
 @pytest.mark.parametrize(
     ("arguments", "accounts_len", "reservations_len"),
     [
@@ -94,8 +218,13 @@ def test_set_up_check_in_sets_up_account_and_reservation_with_arguments(
     mocker: MockerFixture, arguments: list[str], accounts_len: int, reservations_len: int
 ) -> None:
     mock_process = mocker.patch("multiprocessing.Process")
+    mock_process.name = MONITOR_NAME
+    mocker.patch("multiprocessing.Manager")
     mock_processes = [mock_process] * (accounts_len + reservations_len)
-    mocker.patch("multiprocessing.active_children", return_value=mock_processes)
+    mock_manager_process = mock.Mock()
+    mocker.patch(
+        "multiprocessing.active_children", return_value=[*mock_processes, mock_manager_process]
+    )
 
     mock_set_up_accounts = mocker.patch("lib.main.set_up_accounts")
     mock_set_up_reservations = mocker.patch("lib.main.set_up_reservations")
@@ -105,6 +234,63 @@ def test_set_up_check_in_sets_up_account_and_reservation_with_arguments(
     assert len(mock_set_up_accounts.call_args[0][0].accounts) == accounts_len
     assert len(mock_set_up_reservations.call_args[0][0].reservations) == reservations_len
     assert mock_process.join.call_count == len(mock_processes)
+    mock_manager_process.join.assert_not_called()
+
+
+def test_set_up_check_in_uses_check_in_engine_when_configured(mocker: MockerFixture) -> None:
+    mocker.patch(
+        "lib.config.GlobalConfig._read_config", return_value={"check_in_engine": "asyncio"}
+    )
+    mock_manager = mocker.patch("multiprocessing.Manager")
+    mock_set_up_check_in_engine = mocker.patch("lib.main.set_up_check_in_engine")
+
+    main.set_up_check_in([])
+
+    mock_set_up_check_in_engine.assert_called_once()
+    mock_manager.assert_not_called()
+
+
+@pytest.mark.parametrize(("num_workers", "expected_slots"), [(None, 1), (3, 3)])
+def test_set_up_check_in_sizes_browser_arbiter_to_browser_workers(
+    mocker: MockerFixture, num_workers: int | None, expected_slots: int
+) -> None:
+    mocker.patch(
+        "lib.config.GlobalConfig._read_config", return_value={"check_in_engine": "asyncio"}
+    )
+    mock_browser_pool = None
+    if num_workers is not None:
+        mock_browser_pool = mock.Mock()
+        mock_browser_pool.num_workers = num_workers
+
+    mocker.patch("lib.main.set_up_browser_pool", return_value=mock_browser_pool)
+    mocker.patch("lib.main.set_up_displays")
+    mock_browser_arbiter = mocker.patch("lib.main.BrowserArbiter")
+    mocker.patch("lib.main.set_up_check_in_engine")
+
+    main.set_up_check_in([])
+
+    assert mock_browser_arbiter.call_args[0][0] == expected_slots
+    assert mock_browser_arbiter.call_args[1]["num_monitors"] == 0
+
+
+def test_set_up_check_in_engine_waits_for_monitors_and_check_ins(mocker: MockerFixture) -> None:
+    mock_engine = mocker.patch("lib.main.get_checkin_engine").return_value
+    mock_set_up_accounts = mocker.patch("lib.main.set_up_accounts")
+    mock_set_up_reservations = mocker.patch("lib.main.set_up_reservations")
+    mock_monitor_thread = mock.Mock()
+    mock_monitor_thread.name = MONITOR_NAME
+    mock_other_thread = mock.Mock()
+    mocker.patch("threading.enumerate", return_value=[mock_monitor_thread, mock_other_thread])
+
+    main.set_up_check_in_engine(GlobalConfig(), None, None)
+
+    # The reservation cache and header store should not use a manager
+    assert mock_set_up_accounts.call_args[0][2].entries == {}
+    assert mock_set_up_accounts.call_args[0][4].entries == {}
+    mock_set_up_reservations.assert_called_once()
+    mock_monitor_thread.join.assert_called_once()
+    mock_other_thread.join.assert_not_called()
+    mock_engine.wait_until_idle.assert_called_once()
 
 
 def test_set_up_check_in_sends_error_message_when_arguments_are_invalid(
@@ -0,0 +1,152 @@
+import json
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lib import phase_timings
+from lib.phase_timings import PhaseTimer
+
+
+@pytest.fixture(autouse=True)
+def timings_file(mocker: MockerFixture, tmp_path: Path) -> Path:
+    mocker.patch("lib.phase_timings.LOGS_DIRECTORY", tmp_path)
+    return tmp_path / "phase_timings.jsonl"
+
+
+class TestPhaseTimer:
+    @pytest.fixture(autouse=True)
+    def _set_up_timer(self) -> None:
+        self.timer = PhaseTimer("login")
+
+    def test_phase_records_duration(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.monotonic", side_effect=[1, 3.5])
+
+        with self.timer.phase("driver_start"):
+            pass
+
+        assert self.timer.phases == {"driver_start": 2.5}
+
+    def test_phase_sums_repeated_phases(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.monotonic", side_effect=[1, 2, 5, 8])
+
+        with self.timer.phase("response_body"):
+            pass
+        with self.timer.phase("response_body"):
+            pass
+
+        assert self.timer.phases == {"response_body": 4}
+
+    def test_phase_records_duration_when_an_error_occurs(self) -> None:
+        with pytest.raises(ValueError), self.timer.phase("page_open"):
+            raise ValueError
+
+        assert "page_open" in self.timer.phases
+
+    def test_sample_memory_keeps_the_peak(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.phase_timings.get_process_tree_memory", side_effect=[100, 300, 200, None])
+
+        for _ in range(4):
+            self.timer.sample_memory(10)
+
+        assert self.timer.peak_memory == 300
+
+    def test_sample_memory_does_nothing_without_a_browser(self, mocker: MockerFixture) -> None:
+        mock_get_memory = mocker.patch("lib.phase_timings.get_process_tree_memory")
+        self.timer.sample_memory(None)
+
+        mock_get_memory.assert_not_called()
+        assert self.timer.peak_memory is None
+
+    def test_write_appends_a_record(self, timings_file: Path) -> None:
+        self.timer.phases = {"quit": 0.5}
+        self.timer.peak_memory = 1024
+
+        self.timer.write()
+        self.timer.write()
+
+        lines = timings_file.read_text().splitlines()
+        assert len(lines) == 2
+        record = json.loads(lines[0])
+        assert record["operation"] == "login"
+        assert record["phases"] == {"quit": 0.5}
+        assert record["peak_memory"] == 1024
+
+    def test_write_rotates_a_large_file(self, mocker: MockerFixture, timings_file: Path) -> None:
+        mocker.patch("lib.phase_timings.MAX_PHASE_TIMINGS_FILE_SIZE", 10)
+        timings_file.write_text(json.dumps({"operation": "old"}) + "\n")
+
+        self.timer.write()
+
+        assert len(timings_file.read_text().splitlines()) == 1
+        backup_file = timings_file.with_suffix(".jsonl.1")
+        assert json.loads(backup_file.read_text())["operation"] == "old"
+
+    def test_write_ignores_errors(self, mocker: MockerFixture) -> None:
+        mocker.patch("builtins.open", side_effect=OSError)
+        self.timer.write()
+
+
+def test_read_records_reads_backup_and_ignores_invalid_lines(timings_file: Path) -> None:
+    timings_file.with_suffix(".jsonl.1").write_text('{"operation": "old"}\n')
+    timings_file.write_text('{"operation": "new"}\ninvalid\n')
+
+    records = phase_timings.read_records()
+
+    assert records == [{"operation": "old"}, {"operation": "new"}]
+
+
+def test_read_records_returns_nothing_without_a_file() -> None:
+    assert phase_timings.read_records() == []
+
+
+@pytest.mark.parametrize(
+    ("percentile", "expected"), [(50, 5), (90, 9), (99, 10), (100, 10), (1, 1)]
+)
+def test_get_percentile_uses_nearest_rank(percentile: int, expected: int) -> None:
+    values = [10, 9, 8, 7, 6, 5, 4, 3, 2, 1]
+    assert phase_timings.get_percentile(values, percentile) == expected
+
+
+def test_get_percentiles_aggregates_each_phase_by_operation() -> None:
+    records = [
+        {"operation": "login", "phases": {"driver_start": 2}, "peak_memory": 100},
+        {"operation": "login", "phases": {"driver_start": 4}, "peak_memory": None},
+        {"operation": "refresh_headers", "phases": {"page_open": 1}},
+        {"phases": {"quit": 1}},
+    ]
+
+    percentiles = phase_timings.get_percentiles(records)
+
+    assert percentiles["login"]["driver_start"] == {"count": 2, "p50": 2, "p90": 4, "p99": 4}
+    assert percentiles["login"]["peak_memory"]["count"] == 1
+    assert percentiles["refresh_headers"]["page_open"]["p50"] == 1
+    assert percentiles["unknown"]["quit"]["count"] == 1
+
+
+def test_format_percentiles_formats_every_phase() -> None:
+    percentiles = {
+        "login": {
+            "driver_start": {"count": 2, "p50": 2, "p90": 4, "p99": 4},
+            "peak_memory": {"count": 1, "p50": 1048576, "p90": 1048576, "p99": 1048576},
+        }
+    }
+
+    output = phase_timings.format_percentiles(percentiles)
+
+    assert output.splitlines()[0] == "login:"
+    assert "2.00s" in output
+    assert "1.00MB" in output
+
+
+def test_format_percentiles_reports_when_nothing_is_recorded() -> None:
+    assert "No phase timings" in phase_timings.format_percentiles({})
+
+
+def test_print_phase_timings_prints_percentiles(mocker: MockerFixture, timings_file: Path) -> None:
+    timings_file.write_text('{"operation": "login", "phases": {"quit": 1}}\n')
+    mock_print = mocker.patch("builtins.print")
+
+    phase_timings.print_phase_timings()
+
+    assert "login:" in mock_print.call_args[0][0]
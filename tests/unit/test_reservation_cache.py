@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import pytest
+
+from lib.reservation_cache import ReservationCache, get_cache_key
+from lib.utils import RequestError
+
+if TYPE_CHECKING:
+    from pytest_mock import MockerFixture
+
+
+@pytest.fixture
+def mock_manager() -> mock.Mock:
+    manager = mock.Mock()
+    manager.dict.side_effect = dict
+    return manager
+
+
+@pytest.fixture(autouse=True)
+def mock_poll_interval(mocker: MockerFixture) -> None:
+    mocker.patch("lib.in_flight.POLL_INTERVAL_SECS", 0.01)
+
+
+class TestReservationCache:
+    @pytest.fixture(autouse=True)
+    def _set_up_cache(self, mock_manager: mock.Mock) -> None:
+        self.cache = ReservationCache(mock_manager, ttl=60, max_size=2)
+
+    def test_get_requests_and_caches_response_on_miss(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=100)
+        mock_request = mock.Mock(return_value={"test": "response"})
+
+        assert self.cache.get("TEST", mock_request) == {"test": "response"}
+        mock_request.assert_called_once()
+        assert self.cache.entries["TEST"] == (100, {"test": "response"})
+
+    def test_get_uses_cached_response_before_it_expires(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=159)
+        self.cache.entries["TEST"] = (100, {"test": "cached"})
+        mock_request = mock.Mock()
+
+        assert self.cache.get("TEST", mock_request) == {"test": "cached"}
+        mock_request.assert_not_called()
+
+    def test_get_requests_again_when_cached_response_expires(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=160)
+        self.cache.entries["TEST"] = (100, {"test": "cached"})
+        mock_request = mock.Mock(return_value={"test": "response"})
+
+        assert self.cache.get("TEST", mock_request) == {"test": "response"}
+        mock_request.assert_called_once()
+
+    def test_get_does_not_cache_failed_requests(self) -> None:
+        mock_request = mock.Mock(side_effect=RequestError(""))
+
+        with pytest.raises(RequestError):
+            self.cache.get("TEST", mock_request)
+
+        assert "TEST" not in self.cache.entries
+
+    def test_get_coalesces_concurrent_requests_for_the_same_reservation(self) -> None:
+        request_started = threading.Event()
+        finish_request = threading.Event()
+
+        def slow_request() -> dict[str, str]:
+            request_started.set()
+            finish_request.wait(5)
+            return {"test": "response"}
+
+        mock_request = mock.Mock(side_effect=slow_request)
+        responses = []
+
+        def get_reservation() -> None:
+            responses.append(self.cache.get("TEST", mock_request))
+
+        first_thread = threading.Thread(target=get_reservation)
+        first_thread.start()
+        request_started.wait(5)
+
+        second_thread = threading.Thread(target=get_reservation)
+        second_thread.start()
+        finish_request.set()
+
+        first_thread.join(5)
+        second_thread.join(5)
+
+        mock_request.assert_called_once()
+        assert responses == [{"test": "response"}, {"test": "response"}]
+
+    def test_get_does_not_wait_for_requests_of_other_reservations(self) -> None:
+        request_started = threading.Event()
+        finish_request = threading.Event()
+
+        def slow_request() -> dict[str, str]:
+            request_started.set()
+            finish_request.wait(1)
+            return {"test": "slow"}
+
+        thread = threading.Thread(target=self.cache.get, args=("SLOW", slow_request))
+        thread.start()
+        assert request_started.wait(1)
+
+        assert self.cache.get("OTHER", mock.Mock(return_value={"test": "other"})) == {
+            "test": "other"
+        }
+        assert thread.is_alive()
+        finish_request.set()
+        thread.join()
+
+    def test_get_takes_over_request_of_stopped_process(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=100)
+        mocker.patch("lib.in_flight.is_process_running", return_value=False)
+        self.cache.in_flight.marks["TEST"] = (1234, 5678, 1, 100)
+        mock_request = mock.Mock(return_value={"test": "response"})
+
+        assert self.cache.get("TEST", mock_request) == {"test": "response"}
+        assert "TEST" not in self.cache.in_flight.marks
+
+    def test_store_evicts_oldest_responses_when_full(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=130)
+        self.cache.entries["TEST1"] = (110, {})
+        self.cache.entries["TEST2"] = (100, {})
+
+        self.cache._store("TEST3", {})
+
+        assert list(self.cache.entries) == ["TEST1", "TEST3"]
+
+    def test_store_evicts_expired_responses_when_full(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=200)
+        self.cache.entries["TEST1"] = (110, {})
+        self.cache.entries["TEST2"] = (100, {})
+
+        self.cache._store("TEST3", {})
+
+        assert list(self.cache.entries) == ["TEST3"]
+
+    def test_store_does_not_evict_when_cache_is_not_full(self, mocker: MockerFixture) -> None:
+        mocker.patch("time.time", return_value=200)
+        self.cache.entries["TEST1"] = (100, {})
+
+        self.cache._store("TEST2", {})
+
+        assert list(self.cache.entries) == ["TEST1", "TEST2"]
+
+
+@pytest.mark.parametrize(
+    ("first_name", "last_name", "expected_key"),
+    [
+        ("John", "Doe", "TEST:john:doe"),
+        ("  JOHN ", "van  Doe", "TEST:john:van doe"),
+        (None, None, "TEST::"),
+    ],
+)
+def test_get_cache_key_normalizes_names(
+    first_name: str | None, last_name: str | None, expected_key: str
+) -> None:
+    assert get_cache_key("test", first_name, last_name) == expected_key
+
+
+def test_get_cache_key_differs_for_other_passengers() -> None:
+    assert get_cache_key("TEST", "John", "Doe") != get_cache_key("TEST", "Jane", "Doe")
+
+
+def test_reservation_cache_uses_dict_without_manager() -> None:
+    cache = ReservationCache(None)
+    assert cache.entries == {}
@@ -1,18 +1,24 @@
+from __future__ import annotations
+
 import multiprocessing
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
 from unittest import mock
 
 import pytest
-from pytest_mock import MockerFixture
 
+from lib.browser_arbiter import BrowserPriority
 from lib.checkin_handler import CheckInHandler
 from lib.checkin_scheduler import CheckInScheduler
 from lib.config import AccountConfig, ReservationConfig
+from lib.cycle_cost import CycleCost, measure_cycle, record_request
 from lib.fare_checker import FareChecker
 from lib.notification_handler import NotificationHandler
 from lib.reservation_monitor import TOO_MANY_REQUESTS_CODE, AccountMonitor, ReservationMonitor
 from lib.utils import (
     CheckFaresOption,
+    CheckInEngineOption,
     DriverTimeoutError,
     FlightChangeError,
     LoginError,
@@ -20,6 +26,9 @@ from lib.utils import (
 )
 from lib.webdriver import WebDriver
 
+if TYPE_CHECKING:
+    from pytest_mock import MockerFixture
+
 
 @pytest.fixture
 def mock_lock(mocker: MockerFixture) -> None:
@@ -44,6 +53,15 @@ class TestReservationMonitor:
         self.monitor.start()
         mock_process_start.assert_called_once()
 
+    def test_start_starts_a_thread_with_asyncio_engine(self, mocker: MockerFixture) -> None:
+        mock_process_start = mocker.patch.object(multiprocessing.Process, "start")
+        mock_thread_start = mocker.patch.object(threading.Thread, "start")
+        self.monitor.config.check_in_engine = CheckInEngineOption.ASYNCIO
+
+        self.monitor.start()
+        mock_thread_start.assert_called_once()
+        mock_process_start.assert_not_called()
+
     def test_monitor_monitors(self, mocker: MockerFixture) -> None:
         mock_monitor = mocker.patch.object(ReservationMonitor, "_monitor")
 
@@ -78,6 +96,14 @@ class TestReservationMonitor:
 
         assert mock_smart_sleep.call_count == 2
 
+    def test_monitor_does_not_hold_lock_during_checks(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(ReservationMonitor, "_check", return_value=True)
+        self.monitor.lock = mock.MagicMock()
+
+        self.monitor._monitor()
+
+        self.monitor.lock.__enter__.assert_not_called()
+
     def test_monitor_monitors_once_if_retrieval_interval_is_zero(
         self, mocker: MockerFixture
     ) -> None:
@@ -90,6 +116,79 @@ class TestReservationMonitor:
         mock_check.assert_called_once()
         mock_smart_sleep.assert_not_called()
 
+    def test_monitor_waits_for_quiet_window_before_each_check(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(ReservationMonitor, "_smart_sleep")
+        mocker.patch.object(ReservationMonitor, "_check", side_effect=[False, True])
+
+        self.monitor.config.retrieval_interval = 1
+        self.monitor._monitor()
+
+        assert self.monitor.lock.wait_for_quiet_window.call_count == 2
+
+    def test_monitor_waits_for_start_delay_before_first_check(self, mocker: MockerFixture) -> None:
+        mock_sleep = mocker.patch("time.sleep")
+        mock_check = mocker.patch.object(ReservationMonitor, "_check", return_value=True)
+
+        self.monitor.start_delay = 30
+        self.monitor._monitor()
+
+        mock_sleep.assert_called_once_with(30)
+        mock_check.assert_called_once()
+
+    def test_monitor_records_next_check_in_when_staggered(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(ReservationMonitor, "_check", return_value=True)
+        mock_record_next_check_in = mocker.patch("lib.reservation_monitor.record_next_check_in")
+        departure_time = datetime(2000, 1, 2, 12)
+        self.monitor.checkin_scheduler.flights = [mock.Mock(departure_time=departure_time)]
+
+        self.monitor.phase = 0.5
+        self.monitor._monitor()
+
+        mock_record_next_check_in.assert_called_once_with(
+            self.monitor.config, departure_time - timedelta(days=1)
+        )
+
+    def test_monitor_updates_budget_plan_after_each_check(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(ReservationMonitor, "_check", return_value=True)
+        self.monitor.budget_planner = mock.Mock()
+        mock_update_budget_plan = mocker.patch.object(ReservationMonitor, "_update_budget_plan")
+
+        self.monitor._monitor()
+        mock_update_budget_plan.assert_called_once_with(mock.ANY, True)
+
+    def test_update_budget_plan_records_cycle_and_gets_plan(self) -> None:
+        self.monitor.budget_planner = mock.Mock()
+        self.monitor.budget_planner.get_plan.return_value = (7200, 2)
+        self.monitor.config.retrieval_interval = 3600
+        departure_time = datetime(2000, 1, 2, 12)
+        self.monitor.checkin_scheduler.flights = [mock.Mock(departure_time=departure_time)]
+        cycle_cost = CycleCost()
+
+        self.monitor._update_budget_plan(cycle_cost, False)
+
+        self.monitor.budget_planner.record_cycle.assert_called_once_with(
+            self.monitor.config, cycle_cost, 3600, departure_time
+        )
+        assert self.monitor.budget_interval == 7200
+        assert self.monitor.fare_check_every == 2
+
+    def test_update_budget_plan_removes_monitor_when_stopping(self) -> None:
+        self.monitor.budget_planner = mock.Mock()
+
+        self.monitor._update_budget_plan(CycleCost(), True)
+
+        self.monitor.budget_planner.remove_monitor.assert_called_once_with(self.monitor.config)
+        self.monitor.budget_planner.record_cycle.assert_not_called()
+
+    def test_monitor_does_not_record_next_check_in_without_phase(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(ReservationMonitor, "_check", return_value=True)
+        mock_record_next_check_in = mocker.patch("lib.reservation_monitor.record_next_check_in")
+
+        self.monitor._monitor()
+        mock_record_next_check_in.assert_not_called()
+
     def test_check_checks_reservations(self, mocker: MockerFixture) -> None:
         mock_refresh_headers = mocker.patch.object(CheckInScheduler, "refresh_headers")
         mock_schedule_reservations = mocker.patch.object(
@@ -160,6 +259,38 @@ class TestReservationMonitor:
 
         mock_fare_checker.assert_not_called()
 
+    def test_check_flight_fares_skips_cycles_planned_by_budget(self, mocker: MockerFixture) -> None:
+        mock_check_flight_price = mocker.patch.object(FareChecker, "check_flight_price")
+        self.monitor.checkin_scheduler.flights = [mock.Mock()]
+        self.monitor.config.check_fares = CheckFaresOption.SAME_FLIGHT
+        self.monitor.fare_check_every = 3
+
+        for _ in range(4):
+            self.monitor._check_flight_fares()
+
+        # Fares are checked on the first and fourth cycles
+        assert mock_check_flight_price.call_count == 2
+
+    def test_check_flight_fares_measures_fare_check_requests(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(
+            FareChecker, "check_flight_price", side_effect=lambda _: record_request()
+        )
+        self.monitor.checkin_scheduler.flights = [mock.Mock()]
+        self.monitor.config.check_fares = CheckFaresOption.SAME_FLIGHT
+
+        with measure_cycle() as cycle_cost:
+            self.monitor._check_flight_fares()
+
+        assert cycle_cost.fare_check_requests == 1
+        assert cycle_cost.requests == 0
+
+    def test_check_flight_fares_waits_for_quiet_window(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(FareChecker, "check_flight_price")
+        self.monitor.config.check_fares = CheckFaresOption.SAME_FLIGHT
+
+        self.monitor._check_flight_fares()
+        self.monitor.lock.wait_for_quiet_window.assert_called_once_with("fare checks")
+
     def test_check_flight_fares_checks_fares_on_all_flights(self, mocker: MockerFixture) -> None:
         test_flight = mocker.patch("lib.flight.Flight")
         mock_check_flight_price = mocker.patch.object(FareChecker, "check_flight_price")
@@ -196,6 +327,101 @@ class TestReservationMonitor:
 
         mock_sleep.assert_called_once_with(12 * 60 * 60)
 
+    def test_smart_sleep_does_not_sleep_a_negative_time(self, mocker: MockerFixture) -> None:
+        mock_sleep = mocker.patch("time.sleep")
+        mocker.patch(
+            "lib.reservation_monitor.get_current_time", return_value=datetime(1999, 12, 31)
+        )
+
+        self.monitor.config.retrieval_interval = 60 * 60
+        self.monitor._smart_sleep(datetime(1999, 12, 30, 12))
+
+        mock_sleep.assert_called_once_with(0)
+
+    def test_smart_sleep_uses_budget_interval_when_longer(self, mocker: MockerFixture) -> None:
+        mock_sleep = mocker.patch("time.sleep")
+        mocker.patch(
+            "lib.reservation_monitor.get_current_time", return_value=datetime(1999, 12, 31)
+        )
+
+        self.monitor.config.retrieval_interval = 60 * 60
+        self.monitor.budget_interval = 3 * 60 * 60
+        self.monitor._smart_sleep(datetime(1999, 12, 30, 23))
+
+        mock_sleep.assert_called_once_with(2 * 60 * 60)
+
+    def test_smart_sleep_aligns_to_phase(self, mocker: MockerFixture) -> None:
+        mock_sleep = mocker.patch("time.sleep")
+        mocker.patch(
+            "lib.reservation_monitor.get_current_time",
+            return_value=datetime(1999, 12, 30, 12, 20, tzinfo=timezone.utc),
+        )
+
+        self.monitor.config.retrieval_interval = 60 * 60
+        self.monitor.phase = 0.5
+        self.monitor._smart_sleep(datetime(1999, 12, 30, 12, 10, tzinfo=timezone.utc))
+
+        # The next check is on the half hour nearest to an hour after the previous check (13:30)
+        mock_sleep.assert_called_once_with(70 * 60)
+
+    def test_get_next_checkin_time_returns_earliest_checkin(self) -> None:
+        self.monitor.checkin_scheduler.flights = [
+            mock.Mock(departure_time=datetime(2000, 1, 3)),
+            mock.Mock(departure_time=datetime(2000, 1, 2)),
+        ]
+        assert self.monitor._get_next_checkin_time() == datetime(2000, 1, 1)
+
+    def test_get_next_checkin_time_returns_none_without_flights(self) -> None:
+        assert self.monitor._get_next_checkin_time() is None
+
+    def test_get_retrieval_interval_uses_retrieval_interval_without_tiers(self) -> None:
+        self.monitor.config.retrieval_interval = 24 * 60 * 60
+        self.monitor.checkin_scheduler.flights = [
+            mock.Mock(departure_time=datetime(1999, 12, 31, 1))
+        ]
+
+        assert self.monitor._get_retrieval_interval(datetime(1999, 12, 31)) == 24 * 60 * 60
+
+    def test_get_retrieval_interval_uses_retrieval_interval_without_flights(self) -> None:
+        self.monitor.config.retrieval_interval = 24 * 60 * 60
+        self.monitor.config.retrieval_interval_tiers = [(48 * 60 * 60, 60 * 60)]
+        self.monitor.checkin_scheduler.flights = []
+
+        assert self.monitor._get_retrieval_interval(datetime(1999, 12, 31)) == 24 * 60 * 60
+
+    @pytest.mark.parametrize(
+        ("departure_hours", "expected_interval_hours"),
+        [(1, 1), (48, 1), (49, 24), (336, 24), (337, 168), (1000, 168)],
+    )
+    def test_get_retrieval_interval_uses_tier_of_nearest_flight(
+        self, departure_hours: int, expected_interval_hours: int
+    ) -> None:
+        self.monitor.config.retrieval_interval = 168 * 60 * 60
+        self.monitor.config.retrieval_interval_tiers = [
+            (48 * 60 * 60, 60 * 60),
+            (336 * 60 * 60, 24 * 60 * 60),
+        ]
+
+        current_time = datetime(1999, 12, 31)
+        self.monitor.checkin_scheduler.flights = [
+            mock.Mock(departure_time=current_time + timedelta(hours=2000)),
+            mock.Mock(departure_time=current_time + timedelta(hours=departure_hours)),
+        ]
+
+        retrieval_interval = self.monitor._get_retrieval_interval(current_time)
+        assert retrieval_interval == expected_interval_hours * 60 * 60
+
+    def test_get_retrieval_interval_does_not_exceed_retrieval_interval(self) -> None:
+        self.monitor.config.retrieval_interval = 12 * 60 * 60
+        self.monitor.config.retrieval_interval_tiers = [(336 * 60 * 60, 24 * 60 * 60)]
+
+        current_time = datetime(1999, 12, 31)
+        self.monitor.checkin_scheduler.flights = [
+            mock.Mock(departure_time=current_time + timedelta(hours=100))
+        ]
+
+        assert self.monitor._get_retrieval_interval(current_time) == 12 * 60 * 60
+
     def test_stop_checkins_stops_all_checkins(self, mocker: MockerFixture) -> None:
         mock_checkin_handler = mocker.patch.object(CheckInHandler, "stop_check_in")
 
@@ -246,6 +472,83 @@ class TestAccountMonitor:
         mock_schedule_reservations.assert_not_called()
         mock_check_flight_fares.assert_not_called()
 
+    def test_schedule_reservations_skips_unchanged_reservations(
+        self, mocker: MockerFixture
+    ) -> None:
+        mock_process_reservations = mocker.patch.object(CheckInScheduler, "process_reservations")
+        mocker.patch.object(AccountMonitor, "_get_unchanged_reservations", return_value={"test2"})
+
+        reservations = [{"confirmationNumber": "test1"}, {"confirmationNumber": "test2"}]
+        self.monitor._schedule_reservations(reservations)
+
+        mock_process_reservations.assert_called_once_with(["test1", "test2"], {"test2"})
+
+    def test_get_unchanged_reservations_does_full_resync_on_first_check(self) -> None:
+        reservations = [{"confirmationNumber": "test1"}]
+
+        assert self.monitor._get_unchanged_reservations(reservations) == set()
+        assert self.monitor.last_full_resync == datetime(1999, 12, 31)
+        assert "test1" in self.monitor.trip_fingerprints
+
+    def test_get_unchanged_reservations_does_full_resync_when_interval_passes(self) -> None:
+        reservations = [{"confirmationNumber": "test1"}]
+        self.monitor.trip_fingerprints = {
+            "test1": self.monitor._get_trip_fingerprint(reservations[0], "")
+        }
+        self.monitor.checkin_scheduler.flights = [mock.Mock(confirmation_number="test1")]
+
+        self.monitor.config.full_resync_interval = 24 * 60 * 60
+        # The full resync happens slightly early to account for timing differences
+        self.monitor.last_full_resync = datetime(1999, 12, 30, 0, 0, 30)
+
+        assert self.monitor._get_unchanged_reservations(reservations) == set()
+        assert self.monitor.last_full_resync == datetime(1999, 12, 31)
+
+    def test_get_unchanged_reservations_returns_only_unchanged_scheduled_reservations(
+        self,
+    ) -> None:
+        old_reservations = [
+            {"confirmationNumber": "test1", "dates": "1"},
+            {"confirmationNumber": "test2", "dates": "1"},
+            {"confirmationNumber": "test3", "dates": "1"},
+        ]
+        self.monitor.trip_fingerprints = {
+            reservation["confirmationNumber"]: self.monitor._get_trip_fingerprint(reservation, "")
+            for reservation in old_reservations
+        }
+        # test3 has no scheduled flights, so it should be retrieved again
+        self.monitor.checkin_scheduler.flights = [
+            mock.Mock(confirmation_number="test1"),
+            mock.Mock(confirmation_number="test2"),
+        ]
+
+        self.monitor.config.full_resync_interval = 24 * 60 * 60
+        self.monitor.last_full_resync = datetime(1999, 12, 30, 12)
+
+        new_reservations = [
+            {"confirmationNumber": "test1", "dates": "1"},
+            {"confirmationNumber": "test2", "dates": "2"},
+            {"confirmationNumber": "test3", "dates": "1"},
+            {"confirmationNumber": "test4", "dates": "1"},
+        ]
+
+        assert self.monitor._get_unchanged_reservations(new_reservations) == {"test1"}
+        assert len(self.monitor.trip_fingerprints) == 4
+        assert self.monitor.last_full_resync == datetime(1999, 12, 30, 12)
+
+    def test_get_trip_fingerprint_changes_when_trip_changes(self) -> None:
+        fingerprint = self.monitor._get_trip_fingerprint({"confirmationNumber": "test1"}, "")
+
+        assert fingerprint == self.monitor._get_trip_fingerprint(
+            {"confirmationNumber": "test1"}, ""
+        )
+        assert fingerprint != self.monitor._get_trip_fingerprint(
+            {"confirmationNumber": "test1", "flights": "100"}, ""
+        )
+        assert fingerprint != self.monitor._get_trip_fingerprint(
+            {"confirmationNumber": "test1"}, fingerprint
+        )
+
     def test_get_reservations_skips_retrieval_on_driver_timeout(
         self, mocker: MockerFixture
     ) -> None:
@@ -294,6 +597,99 @@ class TestAccountMonitor:
         assert new_reservations == reservations
         assert not skip_scheduling
 
+    def test_fetch_reservations_uses_browser_pool_when_available(
+        self, mocker: MockerFixture
+    ) -> None:
+        mock_get_reservations = mocker.patch.object(WebDriver, "get_reservations")
+        self.monitor.browser_pool = mock.Mock()
+        self.monitor.browser_pool.get_reservations.return_value = [{"reservation": "test"}]
+
+        assert self.monitor._fetch_reservations() == [{"reservation": "test"}]
+        self.monitor.browser_pool.get_reservations.assert_called_once_with(self.monitor)
+        mock_get_reservations.assert_not_called()
+        self.monitor.lock.use.assert_called_once_with(BrowserPriority.ROUTINE)
+
+    def test_log_in_counts_browser_session(self) -> None:
+        self.monitor.browser_pool = mock.Mock()
+
+        with measure_cycle() as cycle_cost:
+            self.monitor._log_in()
+
+        assert cycle_cost.browser_sessions == 1
+
+    def test_fetch_reservations_locks_the_webdriver(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(WebDriver, "get_reservations", return_value=[{"reservation": "test"}])
+        self.monitor.lock = mock.MagicMock()
+
+        assert self.monitor._fetch_reservations() == [{"reservation": "test"}]
+        self.monitor.lock.use.assert_called_once_with(BrowserPriority.ROUTINE)
+
+    def test_fetch_reservations_stores_session_headers_after_logging_in(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(WebDriver, "get_reservations", return_value=[{"reservation": "test"}])
+        self.monitor.lock = mock.MagicMock()
+        self.monitor.checkin_scheduler.headers = {"cookie": "session"}
+
+        assert self.monitor._fetch_reservations() == [{"reservation": "test"}]
+        assert self.monitor.session_headers == {"cookie": "session"}
+
+    def test_fetch_reservations_uses_session_headers_without_logging_in(
+        self, mocker: MockerFixture
+    ) -> None:
+        mock_get_reservations = mocker.patch.object(WebDriver, "get_reservations")
+        mock_make_request = mocker.patch(
+            "lib.reservation_monitor.make_request",
+            return_value={
+                "upcomingTripsPage": [
+                    {"confirmationNumber": "TEST", "tripType": "FLIGHT"},
+                    {"confirmationNumber": "CAR", "tripType": "CAR"},
+                ]
+            },
+        )
+        self.monitor.session_headers = {"cookie": "session"}
+
+        reservations = self.monitor._fetch_reservations()
+
+        assert reservations == [{"confirmationNumber": "TEST", "tripType": "FLIGHT"}]
+        assert mock_make_request.call_args[0][2] == {"cookie": "session"}
+        assert self.monitor.checkin_scheduler.headers == {"cookie": "session"}
+        mock_get_reservations.assert_not_called()
+
+    @pytest.mark.parametrize("status_code", [401, 403, 500, None])
+    def test_fetch_reservations_logs_in_again_when_session_headers_fail(
+        self, mocker: MockerFixture, status_code: int | None
+    ) -> None:
+        mocker.patch(
+            "lib.reservation_monitor.make_request",
+            side_effect=RequestError("", status_code=status_code),
+        )
+        mock_get_reservations = mocker.patch.object(
+            WebDriver, "get_reservations", return_value=[{"reservation": "test"}]
+        )
+        self.monitor.lock = mock.MagicMock()
+        self.monitor.session_headers = {"cookie": "expired"}
+        self.monitor.checkin_scheduler.headers = {"cookie": "new"}
+
+        assert self.monitor._fetch_reservations() == [{"reservation": "test"}]
+        mock_get_reservations.assert_called_once()
+        assert self.monitor.session_headers == {"cookie": "new"}
+
+    def test_fetch_reservations_logs_in_again_when_upcoming_trips_are_missing(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("lib.reservation_monitor.make_request", return_value={})
+        mock_get_reservations = mocker.patch.object(
+            WebDriver, "get_reservations", return_value=[{"reservation": "test"}]
+        )
+        self.monitor.lock = mock.MagicMock()
+        self.monitor.session_headers = {"cookie": "expired"}
+        self.monitor.checkin_scheduler.headers = {"cookie": "new"}
+
+        assert self.monitor._fetch_reservations() == [{"reservation": "test"}]
+        mock_get_reservations.assert_called_once()
+        assert self.monitor.session_headers == {"cookie": "new"}
+
     def test_stop_monitoring_stops_checkins(self, mocker: MockerFixture) -> None:
         mock_stop_checkins = mocker.patch.object(AccountMonitor, "_stop_checkins")
         self.monitor._stop_monitoring()
@@ -0,0 +1,98 @@
+import json
+import stat
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lib.session_store import SessionStore
+
+SESSION = {"cookies": [{"name": "session", "value": "1"}], "local_storage": {}}
+
+
+@pytest.fixture(autouse=True)
+def sessions_directory(mocker: MockerFixture, tmp_path: Path) -> Path:
+    mocker.patch("lib.session_store.SESSIONS_DIRECTORY", tmp_path)
+    # Deriving the key is slow on purpose, which isn't needed for the tests
+    mocker.patch("lib.session_store.KDF_ITERATIONS", 1)
+    return tmp_path
+
+
+def test_session_store_does_not_reveal_username_in_file_name() -> None:
+    store = SessionStore("test_user", "password")
+    assert "test_user" not in store.path.name
+
+
+def test_load_returns_none_without_a_stored_session() -> None:
+    assert SessionStore("user", "password").load() is None
+
+
+def test_save_stores_encrypted_session_readable_by_owner_only() -> None:
+    store = SessionStore("user", "password")
+    store.save(SESSION)
+
+    contents = store.path.read_text()
+    assert "session" in json.loads(contents)
+    assert '"value": "1"' not in contents
+    assert stat.S_IMODE(store.path.stat().st_mode) == 0o600
+
+    assert store.load() == SESSION
+
+
+def test_load_returns_none_when_password_changes() -> None:
+    SessionStore("user", "password").save(SESSION)
+    assert SessionStore("user", "new_password").load() is None
+
+
+def test_load_returns_none_when_session_file_is_invalid() -> None:
+    store = SessionStore("user", "password")
+    store.path.write_text(json.dumps({"salt": "invalid", "session": "invalid"}))
+
+    assert store.load() is None
+
+
+def test_clear_removes_session_but_keeps_stats() -> None:
+    store = SessionStore("user", "password")
+    store.save(SESSION)
+    store.record_restore(True, 2)
+
+    store.clear()
+
+    assert store.load() is None
+    assert store.get_stats()["restores"] == 1
+
+
+def test_get_stats_returns_hit_rate_and_time_saved() -> None:
+    store = SessionStore("user", "password")
+    store.record_login(30)
+    store.record_login(20)
+    store.record_restore(True, 5)
+    store.record_restore(True, 3)
+    store.record_restore(False, 20)
+    store.record_restore(True, 4)
+
+    stats = store.get_stats()
+
+    assert stats["restores"] == 4
+    assert stats["hits"] == 3
+    assert stats["hit_rate"] == 0.75
+    # Average login of 25 seconds and average restore of 4 seconds
+    assert stats["time_saved"] == 3 * 21
+
+
+def test_get_stats_returns_no_time_saved_without_logins() -> None:
+    store = SessionStore("user", "password")
+    store.record_restore(True, 5)
+
+    stats = store.get_stats()
+
+    assert stats["hit_rate"] == 1
+    assert stats["time_saved"] == 0
+
+
+def test_write_ignores_errors(mocker: MockerFixture) -> None:
+    mocker.patch("tempfile.mkstemp", side_effect=OSError)
+    store = SessionStore("user", "password")
+    store.save(SESSION)
+
+    assert store.load() is None
@@ -0,0 +1,182 @@
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lib import stagger_planner
+from lib.config import AccountConfig, ReservationConfig
+from lib.stagger_planner import (
+    WARM_UP_SPACING_SECS,
+    StaggerPlanner,
+    get_jitter,
+    get_monitor_key,
+    get_next_check_time,
+    read_next_check_ins,
+    record_next_check_in,
+)
+
+
+@pytest.fixture(autouse=True)
+def state_file(tmp_path: Path, mocker: MockerFixture) -> Path:
+    path = tmp_path / "stagger_state.json"
+    mocker.patch.object(stagger_planner, "STAGGER_STATE_FILE", path)
+    return path
+
+
+def create_account(username: str) -> AccountConfig:
+    account = AccountConfig()
+    account.username = username
+    return account
+
+
+def create_reservation(
+    confirmation_number: str, first_name: str = "John", last_name: str = "Doe"
+) -> ReservationConfig:
+    reservation = ReservationConfig()
+    reservation.confirmation_number = confirmation_number
+    reservation.first_name = first_name
+    reservation.last_name = last_name
+    return reservation
+
+
+def test_get_monitor_key_does_not_reveal_the_identifier() -> None:
+    key = get_monitor_key(create_account("user"))
+    assert "user" not in key
+    assert key == get_monitor_key(create_account("user"))
+    assert key != get_monitor_key(create_reservation("TEST12"))
+
+
+def test_get_monitor_key_identifies_reservations_by_passenger() -> None:
+    key = get_monitor_key(create_reservation("TEST12"))
+    assert key == get_monitor_key(create_reservation("test12", " john ", "DOE"))
+    assert key != get_monitor_key(create_reservation("TEST12", "Jane"))
+
+
+def test_get_jitter_is_between_zero_and_one() -> None:
+    for identifier in ["user", "other", "TEST12"]:
+        jitter = get_jitter(get_monitor_key(create_account(identifier)))
+        assert 0 <= jitter < 1
+
+
+@pytest.mark.parametrize(
+    ("previous_time", "expected_time"),
+    [
+        # Aligned checks keep the interval exactly
+        (1800, 5400),
+        # Checks that drifted are moved to the nearest aligned time, earlier or later
+        (2400, 5400),
+        (1200, 5400),
+        (4200, 9000),
+        # The next check is never less than half an interval after the previous one
+        (3600, 5400),
+        (3601, 9000),
+        (0, 1800),
+    ],
+)
+def test_get_next_check_time_aligns_to_phase(previous_time: float, expected_time: float) -> None:
+    assert get_next_check_time(previous_time, 3600, 0.5) == expected_time
+
+
+@pytest.mark.parametrize("phase", [0, 0.1, 0.3, 0.7, 0.99])
+def test_get_next_check_time_keeps_at_least_half_an_interval(phase: float) -> None:
+    interval = 3 * 3600
+    for previous_time in range(946598400, 946598400 + interval, 97):
+        next_time = get_next_check_time(previous_time, interval, phase)
+        assert interval / 2 <= next_time - previous_time < interval * 1.5
+
+
+def test_stagger_planner_spreads_phases_over_interval() -> None:
+    configs = [create_account("user1"), create_account("user2"), create_reservation("TEST12")]
+    planner = StaggerPlanner(configs)
+
+    phases = sorted(planner.get_stagger(config)[1] for config in configs)
+    for index, phase in enumerate(phases):
+        # Each phase is within the first half of its share of the interval
+        assert index / 3 <= phase < (index + 0.5) / 3
+
+
+def test_stagger_planner_keeps_the_same_stagger_every_run() -> None:
+    configs = [create_account("user1"), create_account("user2")]
+    first_planner = StaggerPlanner(configs)
+    second_planner = StaggerPlanner(list(reversed(configs)))
+
+    for config in configs:
+        assert first_planner.get_stagger(config) == second_planner.get_stagger(config)
+
+
+def test_stagger_planner_starts_most_urgent_monitors_first(state_file: Path) -> None:
+    soon = create_account("soon")
+    later = create_account("later")
+    unknown = create_reservation("TEST12")
+    past = create_reservation("TEST34")
+
+    current_time = time.time()
+    state_file.write_text(
+        json.dumps(
+            {
+                get_monitor_key(soon): current_time + 60,
+                get_monitor_key(later): current_time + 3600,
+                get_monitor_key(past): current_time - 60,
+            }
+        )
+    )
+
+    planner = StaggerPlanner([unknown, later, past, soon])
+
+    assert planner.get_stagger(soon)[0] == 0
+    assert planner.get_stagger(later)[0] == WARM_UP_SPACING_SECS
+    # Monitors without an upcoming check-in go last
+    assert planner.get_stagger(unknown)[0] >= 2 * WARM_UP_SPACING_SECS
+    assert planner.get_stagger(past)[0] >= 2 * WARM_UP_SPACING_SECS
+
+
+def test_stagger_planner_does_not_delay_unknown_monitors() -> None:
+    planner = StaggerPlanner([])
+    assert planner.get_stagger(create_account("user")) == (0, 0)
+
+
+def test_read_next_check_ins_returns_empty_dict_on_invalid_file(state_file: Path) -> None:
+    assert read_next_check_ins() == {}
+
+    state_file.write_text("invalid")
+    assert read_next_check_ins() == {}
+
+    state_file.write_text("[]")
+    assert read_next_check_ins() == {}
+
+
+def test_record_next_check_in_records_check_in() -> None:
+    account = create_account("user")
+    checkin_time = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+    record_next_check_in(account, checkin_time)
+    assert read_next_check_ins() == {get_monitor_key(account): checkin_time.timestamp()}
+
+
+def test_record_next_check_in_removes_check_in_without_flights() -> None:
+    account = create_account("user")
+    other_account = create_account("other")
+    record_next_check_in(account, datetime(2000, 1, 1, tzinfo=timezone.utc))
+    record_next_check_in(other_account, datetime(2000, 1, 2, tzinfo=timezone.utc))
+
+    record_next_check_in(account, None)
+    assert list(read_next_check_ins()) == [get_monitor_key(other_account)]
+
+
+def test_record_next_check_in_does_not_write_unchanged_check_in(mocker: MockerFixture) -> None:
+    account = create_account("user")
+    checkin_time = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    record_next_check_in(account, checkin_time)
+
+    mock_mkstemp = mocker.patch("tempfile.mkstemp")
+    record_next_check_in(account, checkin_time)
+    mock_mkstemp.assert_not_called()
+
+
+def test_record_next_check_in_handles_write_errors(mocker: MockerFixture) -> None:
+    mocker.patch("tempfile.mkstemp", side_effect=OSError)
+    record_next_check_in(create_account("user"), datetime(2000, 1, 1, tzinfo=timezone.utc))
+    assert read_next_check_ins() == {}
@@ -10,9 +10,12 @@ import ntplib
 import pytest
 
 from lib import utils
+from lib.cycle_cost import measure_cycle
 from lib.utils import AirportCheckInError, RequestError
 
 if TYPE_CHECKING:
+    from pathlib import Path
+
     from pytest_mock import MockerFixture
     from requests_mock.mocker import Mocker as RequestMocker
 
@@ -79,6 +82,18 @@ def test_make_request_stops_early_for_special_southwest_code(
     assert mock_sleep.call_count == 0
 
 
+def test_make_request_raises_error_with_status_code(
+    requests_mock: RequestMocker, mocker: MockerFixture
+) -> None:
+    requests_mock.get(utils.BASE_URL + "test", status_code=403, reason="Forbidden")
+    mocker.patch("time.sleep")
+
+    with pytest.raises(RequestError) as err:
+        utils.make_request("GET", "test", {}, {}, max_attempts=1)
+
+    assert err.value.status_code == 403
+
+
 def test_make_request_does_not_sleep_randomly_on_failures_when_random_sleep_is_false(
     requests_mock: RequestMocker, mocker: MockerFixture
 ) -> None:
@@ -96,6 +111,18 @@ def test_make_request_does_not_sleep_randomly_on_failures_when_random_sleep_is_f
     mock_sleep.assert_has_calls(expected_calls)
 
 
+def test_make_request_counts_every_attempt_towards_current_cycle(
+    requests_mock: RequestMocker, mocker: MockerFixture
+) -> None:
+    mocker.patch("time.sleep")
+    requests_mock.get(utils.BASE_URL + "test", status_code=500, reason="error")
+
+    with measure_cycle() as cycle_cost, pytest.raises(RequestError):
+        utils.make_request("GET", "test", {}, {}, max_attempts=3, random_sleep=False)
+
+    assert cycle_cost.requests == 3
+
+
 def test_make_request_correctly_posts_data(requests_mock: RequestMocker) -> None:
     mock_post = requests_mock.post(
         utils.BASE_URL + "test", status_code=200, text='{"success": "post"}'
@@ -133,6 +160,28 @@ def test_make_request_handles_malformed_urls(requests_mock: RequestMocker) -> No
     assert mock_post.last_request.url == utils.BASE_URL + "test/test2"
 
 
+def test_atomic_write_json_writes_file_in_new_directory(tmp_path: Path) -> None:
+    path = tmp_path / "directory" / "test.json"
+    utils.atomic_write_json(path, {"test": 1})
+
+    assert json.loads(path.read_text()) == {"test": 1}
+    assert [file.name for file in path.parent.iterdir()] == ["test.json"]
+
+
+def test_atomic_write_json_keeps_old_file_and_removes_temporary_file_on_error(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    path = tmp_path / "test.json"
+    path.write_text('{"old": 1}')
+    mocker.patch("json.dump", side_effect=TypeError)
+
+    with pytest.raises(TypeError):
+        utils.atomic_write_json(path, {"new": 1})
+
+    assert json.loads(path.read_text()) == {"old": 1}
+    assert [file.name for file in tmp_path.iterdir()] == ["test.json"]
+
+
 def test_get_current_time_returns_a_datetime_from_ntp_server(mocker: MockerFixture) -> None:
     ntp_stats = ntplib.NTPStats()
     ntp_stats.tx_timestamp = 3155673599
@@ -1,12 +1,32 @@
+from __future__ import annotations
+
+import json
 import sys
-from typing import Any
+import threading
+from typing import TYPE_CHECKING, Any
 from unittest import mock
 
 import pytest
-from pytest_mock import MockerFixture
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from lib.display_manager import BASE_DISPLAY_NUMBER
+from lib.utils import BrowserLoadProfile, DriverTimeoutError, LoginError
+from lib.webdriver import (
+    BASE_DEBUGGING_PORT,
+    BROWSER_PROFILES_DIRECTORY,
+    HEADERS_URL,
+    INVALID_CREDENTIALS_CODE,
+    LEAN_BLOCKED_URLS,
+    LEAN_PAGE_LOAD_BUDGET_SECS,
+    LOGIN_URL,
+    TRIPS_URL,
+    WebDriver,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
 
-from lib.utils import DriverTimeoutError, LoginError
-from lib.webdriver import HEADERS_URL, INVALID_CREDENTIALS_CODE, LOGIN_URL, TRIPS_URL, WebDriver
+    from pytest_mock import MockerFixture
 
 
 @pytest.fixture(autouse=True)
@@ -14,9 +34,24 @@ def mock_chrome(mocker: MockerFixture) -> mock.Mock:
     return mocker.patch("lib.webdriver.Driver")
 
 
+@pytest.fixture(autouse=True)
+def phase_timings_directory(mocker: MockerFixture, tmp_path: Path) -> Path:
+    mocker.patch("lib.phase_timings.LOGS_DIRECTORY", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def mock_driver_cache(mocker: MockerFixture) -> mock.Mock:
+    mock_driver_cache = mocker.patch("lib.webdriver.DriverCache").return_value
+    mock_driver_cache.get.return_value = None
+    return mock_driver_cache
+
+
 @pytest.fixture
 def mock_account_monitor(mocker: MockerFixture) -> mock.Mock:
-    return mocker.patch("lib.reservation_monitor.AccountMonitor")
+    mock_account_monitor = mocker.patch("lib.reservation_monitor.AccountMonitor")
+    mock_account_monitor.config.persist_login_session = False
+    return mock_account_monitor
 
 
 class TestWebDriver:
@@ -72,12 +107,256 @@ class TestWebDriver:
         mock_chrome.add_cdp_listener.assert_called_once()
         mock_chrome.quit.assert_called_once()
 
+    def test_get_reservations_uses_restored_session(
+        self, mocker: MockerFixture, mock_chrome: mock.Mock, mock_account_monitor: mock.Mock
+    ) -> None:
+        mock_account_monitor.config.persist_login_session = True
+        mock_account_monitor.username = "user"
+        mock_account_monitor.password = "pass"
+        mock_session_store = mocker.patch("lib.webdriver.SessionStore")
+        mocker.patch.object(WebDriver, "_get_driver", return_value=mock_chrome)
+        mocker.patch.object(WebDriver, "_restore_session", return_value=["res1"])
+        mock_wait_for_login = mocker.patch.object(WebDriver, "_wait_for_login")
+
+        reservations = self.driver.get_reservations(mock_account_monitor)
+
+        assert reservations == ["res1"]
+        mock_session_store.assert_called_once_with("user", "pass")
+        mock_wait_for_login.assert_not_called()
+        mock_chrome.quit.assert_called_once()
+
+    def test_get_reservations_saves_session_after_logging_in(
+        self, mocker: MockerFixture, mock_chrome: mock.Mock, mock_account_monitor: mock.Mock
+    ) -> None:
+        mocker.patch("time.sleep")
+        mocker.patch("lib.webdriver.seleniumbase_actions.wait_for_element_not_visible")
+        mock_account_monitor.config.persist_login_session = True
+        mock_session_store = mocker.patch("lib.webdriver.SessionStore").return_value
+        mocker.patch.object(WebDriver, "_get_driver", return_value=mock_chrome)
+        mocker.patch.object(WebDriver, "_restore_session", return_value=None)
+        mocker.patch.object(WebDriver, "_wait_for_attribute")
+        mock_wait_for_login = mocker.patch.object(WebDriver, "_wait_for_login")
+        mocker.patch.object(WebDriver, "_fetch_reservations", return_value=["res1"])
+        mock_save_session = mocker.patch.object(WebDriver, "_save_session")
+
+        reservations = self.driver.get_reservations(mock_account_monitor)
+
+        assert reservations == ["res1"]
+        mock_wait_for_login.assert_called_once()
+        mock_session_store.record_login.assert_called_once()
+        mock_save_session.assert_called_once_with(
+            mock_chrome, mock_account_monitor, mock_session_store
+        )
+
+    def test_restore_session_does_not_restore_without_a_stored_session(
+        self, mock_chrome: mock.Mock, mock_account_monitor: mock.Mock
+    ) -> None:
+        mock_session_store = mock.Mock()
+        mock_session_store.load.return_value = None
+
+        assert (
+            self.driver._restore_session(mock_chrome, mock_account_monitor, mock_session_store)
+            is None
+        )
+        mock_chrome.execute_cdp_cmd.assert_not_called()
+        mock_session_store.record_restore.assert_not_called()
+
+    def test_restore_session_returns_reservations_from_restored_session(
+        self, mocker: MockerFixture, mock_chrome: mock.Mock, mock_account_monitor: mock.Mock
+    ) -> None:
+        mock_session_store = mock.Mock()
+        mock_session_store.load.return_value = {
+            "cookies": [{"name": "session", "value": "1"}],
+            "local_storage": {"key": "value"},
+            "session_storage": {},
+            "first_name": "John",
+            "last_name": "Doe",
+        }
+        mock_account_monitor.first_name = None
+        mocker.patch.object(WebDriver, "_wait_for_attribute")
+        mocker.patch.object(WebDriver, "_fetch_reservations", return_value=["res1"])
+        self.driver.trips_status_code = 200
+
+        reservations = self.driver._restore_session(
+            mock_chrome, mock_account_monitor, mock_session_store
+        )
+
+        assert reservations == ["res1"]
+        mock_chrome.execute_cdp_cmd.assert_called_once_with(
+            "Network.setCookies", {"cookies": [{"name": "session", "value": "1"}]}
+        )
+        mock_chrome.open.assert_called_once()
+        assert mock_session_store.record_restore.call_args[0][0] is True
+        mock_session_store.clear.assert_not_called()
+        assert mock_account_monitor.first_name == "John"
+        assert mock_account_monitor.last_name == "Doe"
+        assert "session_restore" in self.driver.phase_timer.phases
+
+    def test_restore_session_fails_when_headers_are_not_captured(
+        self, mocker: MockerFixture, mock_chrome: mock.Mock, mock_account_monitor: mock.Mock
+    ) -> None:
+        mock_session_store = mock.Mock()
+        mock_session_store.load.return_value = {
+            "cookies": [],
+            "local_storage": {},
+            "session_storage": {},
+        }
+        mocker.patch("lib.webdriver.SESSION_RESTORE_TIMEOUT_SECS", 0)
+        mock_fetch_reservations = mocker.patch.object(WebDriver, "_fetch_reservations")
+        self.driver._set_attribute("trips_request_id", "test_id")
+        self.driver.trips_status_code = 200
+        self.driver.checkin_scheduler.headers = {"test": "headers"}
+        assert not self.driver.headers_set
+
+        reservations = self.driver._restore_session(
+            mock_chrome, mock_account_monitor, mock_session_store
+        )
+
+        assert reservations is None
+        mock_fetch_reservations.assert_not_called()
+        assert self.driver.checkin_scheduler.headers == {"test": "headers"}
+        assert mock_session_store.record_restore.call_args[0][0] is False
+        mock_session_store.clear.assert_called_once()
+
+    @pytest.mark.parametrize(
+        ("status_code", "wait_error"), [(401, None), (None, DriverTimeoutError("timeout"))]
+    )
+    def test_restore_session_falls_back_to_login_when_session_expired(
+        self,
+        mocker: MockerFixture,
+        mock_chrome: mock.Mock,
+        mock_account_monitor: mock.Mock,
+        status_code: int | None,
+        wait_error: Exception | None,
+    ) -> None:
+        mock_session_store = mock.Mock()
+        mock_session_store.load.return_value = {
+            "cookies": [],
+            "local_storage": {},
+            "session_storage": {},
+        }
+        mocker.patch.object(WebDriver, "_wait_for_attribute", side_effect=wait_error)
+        mock_fetch_reservations = mocker.patch.object(WebDriver, "_fetch_reservations")
+        self.driver._set_attribute("trips_request_id", "test_id")
+        self.driver.trips_status_code = status_code
+
+        reservations = self.driver._restore_session(
+            mock_chrome, mock_account_monitor, mock_session_store
+        )
+
+        assert reservations is None
+        mock_fetch_reservations.assert_not_called()
+        assert mock_session_store.record_restore.call_args[0][0] is False
+        mock_session_store.clear.assert_called_once()
+        mock_chrome.execute_cdp_cmd.assert_any_call("Network.clearBrowserCookies", {})
+
+        # The page is reloaded for a full login
+        assert mock_chrome.open.call_count == 2
+        assert self.driver.trips_request_id is None
+        assert not self.driver.attribute_events["trips_request_id"].is_set()
+
+    def test_save_session_stores_cookies_storage_and_account_name(
+        self, mock_chrome: mock.Mock, mock_account_monitor: mock.Mock
+    ) -> None:
+        mock_session_store = mock.Mock()
+        mock_chrome.execute_cdp_cmd.return_value = {
+            "cookies": [
+                {"name": "a", "value": "1", "expires": 100, "session": False, "size": 2},
+                {"name": "b", "value": "2", "expires": -1, "session": True, "size": 2},
+            ]
+        }
+        mock_chrome.execute_script.return_value = {"local": {"key": "value"}, "session": {}}
+        mock_account_monitor.first_name = "John"
+        mock_account_monitor.last_name = "Doe"
+
+        self.driver._save_session(mock_chrome, mock_account_monitor, mock_session_store)
+
+        mock_session_store.save.assert_called_once_with(
+            {
+                "cookies": [
+                    {"name": "a", "value": "1", "expires": 100},
+                    {"name": "b", "value": "2"},
+                ],
+                "local_storage": {"key": "value"},
+                "session_storage": {},
+                "first_name": "John",
+                "last_name": "Doe",
+            }
+        )
+
+    def test_save_session_does_not_save_when_session_cannot_be_retrieved(
+        self, mock_chrome: mock.Mock, mock_account_monitor: mock.Mock
+    ) -> None:
+        mock_session_store = mock.Mock()
+        mock_chrome.execute_cdp_cmd.side_effect = WebDriverException()
+
+        self.driver._save_session(mock_chrome, mock_account_monitor, mock_session_store)
+        mock_session_store.save.assert_not_called()
+
     def test_get_driver_returns_a_webdriver_with_one_request(self, mock_chrome: mock.Mock) -> None:
         driver = self.driver._get_driver()
-        driver.add_cdp_listener.assert_called_once()
+        assert driver.add_cdp_listener.call_count == 2
         driver.open.assert_called_once()
 
         assert mock_chrome.call_args.kwargs.get("driver_version") == "mlatest"
+        assert mock_chrome.call_args.kwargs.get("page_load_strategy") is None
+        driver.set_page_load_timeout.assert_not_called()
+
+    def test_start_browser_caches_resolved_driver(
+        self, mock_chrome: mock.Mock, mock_driver_cache: mock.Mock
+    ) -> None:
+        mock_chrome.return_value.caps = {
+            "browserVersion": "130.0.1",
+            "chrome": {"chromedriverVersion": "130.0.2 (abc)"},
+        }
+
+        self.driver._start_browser()
+
+        assert mock_chrome.call_args.kwargs.get("driver_version") == "mlatest"
+        mock_driver_cache.store.assert_called_once_with(mock.ANY, "130.0.1", "130.0.2")
+
+    def test_start_browser_uses_cached_driver(
+        self, mock_chrome: mock.Mock, mock_driver_cache: mock.Mock
+    ) -> None:
+        mock_driver_cache.get.return_value = {"browser_version": "130.0.1"}
+
+        self.driver._start_browser()
+
+        mock_chrome.assert_called_once()
+        assert mock_chrome.call_args.kwargs.get("driver_version") == "keep"
+        mock_driver_cache.store.assert_not_called()
+
+    def test_start_browser_resolves_driver_again_when_cached_driver_fails(
+        self, mock_chrome: mock.Mock, mock_driver_cache: mock.Mock
+    ) -> None:
+        mock_driver_cache.get.return_value = {"browser_version": "130.0.1"}
+        mock_chrome.side_effect = [Exception, mock.MagicMock()]
+
+        self.driver._start_browser()
+
+        assert mock_chrome.call_count == 2
+        assert mock_chrome.call_args.kwargs.get("driver_version") == "mlatest"
+        mock_driver_cache.invalidate.assert_called_once()
+        mock_driver_cache.store.assert_called_once()
+
+    def test_get_driver_uses_lean_load_profile(self, mock_chrome: mock.Mock) -> None:
+        self.driver.load_profile = BrowserLoadProfile.LEAN
+
+        driver = self.driver._get_driver()
+
+        assert mock_chrome.call_args.kwargs.get("page_load_strategy") == "eager"
+        driver.execute_cdp_cmd.assert_called_with(
+            "Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS}
+        )
+        driver.set_page_load_timeout.assert_called_once_with(LEAN_PAGE_LOAD_BUDGET_SECS)
+
+    def test_get_driver_continues_when_page_load_budget_is_exceeded(
+        self, mock_chrome: mock.Mock
+    ) -> None:
+        mock_chrome.return_value.open.side_effect = TimeoutException
+
+        driver = self.driver._get_driver()
+        driver.open.assert_called_once()
 
     def test_get_driver_keeps_is_correctly_configured_in_docker(
         self, mocker: MockerFixture, mock_chrome: mock.Mock
@@ -90,12 +369,35 @@ class TestWebDriver:
         mock_start_display = mocker.patch.object(self.driver, "_start_display")
 
         driver = self.driver._get_driver()
-        driver.add_cdp_listener.assert_called_once()
+        assert driver.add_cdp_listener.call_count == 2
         driver.open.assert_called_once()
 
         assert mock_chrome.call_args.kwargs.get("driver_version") == "keep"
         mock_start_display.assert_called_once()
 
+    def test_get_instance_options_returns_nothing_without_a_browser_slot(self) -> None:
+        assert self.driver._get_instance_options() == {}
+
+    def test_get_instance_options_isolates_each_browser_slot(self) -> None:
+        self.driver.browser_slot = 2
+
+        options = self.driver._get_instance_options()
+
+        assert options["user_data_dir"] == str(BROWSER_PROFILES_DIRECTORY / "slot_2")
+        assert options["chromium_arg"] == f"--remote-debugging-port={BASE_DEBUGGING_PORT + 2}"
+
+    def test_get_instance_options_uses_slot_display_in_docker(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.webdriver.IS_DOCKER", True)
+        self.driver.browser_slot = 2
+
+        options = self.driver._get_instance_options()
+
+        chromium_args = options["chromium_arg"].split(",")
+        assert chromium_args == [
+            f"--remote-debugging-port={BASE_DEBUGGING_PORT + 2}",
+            f"--display=:{BASE_DISPLAY_NUMBER + 2}",
+        ]
+
     def test_headers_listener_sets_headers_when_correct_url(self, mocker: MockerFixture) -> None:
         mocker.patch.object(self.driver, "_get_needed_headers", return_value={"test": "headers"})
         data = {"params": {"request": {"url": HEADERS_URL, "headers": {}}}}
@@ -105,6 +407,28 @@ class TestWebDriver:
         assert self.driver.headers_set
         assert self.driver.checkin_scheduler.headers == {"test": "headers"}
 
+    def test_wait_for_attribute_times_the_wait(self) -> None:
+        self.driver.headers_set = True
+        self.driver._wait_for_attribute("headers_set")
+        assert "wait_headers_set" in self.driver.phase_timer.phases
+
+    def test_headers_listener_records_time_to_ready(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(self.driver, "_get_needed_headers", return_value={})
+        mocker.patch("time.monotonic", return_value=12.5)
+        self.driver.load_start_time = 10
+        data = {"params": {"request": {"url": HEADERS_URL, "headers": {}}}}
+
+        self.driver._headers_listener(data)
+
+        assert self.driver.time_to_ready == 2.5
+
+    def test_loading_finished_listener_counts_bytes_downloaded(self) -> None:
+        self.driver._loading_finished_listener({"params": {"encodedDataLength": 1000}})
+        self.driver._loading_finished_listener({"params": {"encodedDataLength": 24}})
+        self.driver._loading_finished_listener({"params": {}})
+
+        assert self.driver.bytes_downloaded == 1024
+
     def test_headers_listener_does_not_set_headers_when_wrong_url(self) -> None:
         data = {"params": {"request": {"url": "fake_url", "headers": {"User-Agent": "Chrome"}}}}
         self.driver._headers_listener(data)
@@ -120,9 +444,10 @@ class TestWebDriver:
         assert self.driver.login_request_id == "test_id"
 
     def test_login_listener_sets_trip_information(self) -> None:
-        data = {"params": {"response": {"url": TRIPS_URL}, "requestId": "test_id"}}
+        data = {"params": {"response": {"url": TRIPS_URL, "status": 200}, "requestId": "test_id"}}
         self.driver._login_listener(data)
 
+        assert self.driver.trips_status_code == 200
         assert self.driver.trips_request_id == "test_id"
 
     def test_login_listener_sets_no_information_when_wrong_url(self) -> None:
@@ -133,22 +458,21 @@ class TestWebDriver:
         assert self.driver.login_request_id is None
         assert self.driver.trips_request_id is None
 
-    def test_wait_for_attribute_waits_for_attribute_to_be_set(self, mocker: MockerFixture) -> None:
-        call_count = 0
+    def test_wait_for_attribute_returns_as_soon_as_attribute_is_set(self) -> None:
+        timer = threading.Timer(0.05, self.driver._set_attribute, ("headers_set", True))
+        timer.start()
 
-        def mock_sleep(_: int) -> None:
-            nonlocal call_count
-            call_count += 1
-            if call_count == 2:
-                self.driver.headers_set = True
+        self.driver._wait_for_attribute("headers_set")
+        timer.join()
 
-        mocker.patch("time.sleep", side_effect=mock_sleep)
+        assert self.driver.headers_set
 
-        self.driver._wait_for_attribute("headers_set")
-        assert call_count == 2
+    def test_wait_for_attribute_returns_when_attribute_is_already_set(self) -> None:
+        self.driver.trips_request_id = "test_id"
+        self.driver._wait_for_attribute("trips_request_id")
 
     def test_wait_for_attribute_raises_error_on_timeout(self, mocker: MockerFixture) -> None:
-        mocker.patch("time.sleep")
+        mocker.patch("lib.webdriver.WAIT_TIMEOUT_SECS", 0.01)
         with pytest.raises(DriverTimeoutError):
             self.driver._wait_for_attribute("headers_set")
 
@@ -279,10 +603,80 @@ class TestWebDriver:
         self, mocker: MockerFixture, mock_chrome: mock.Mock
     ) -> None:
         mock_stop_display = mocker.patch.object(self.driver, "_stop_display")
+        mock_unregister_browser = mocker.patch("lib.webdriver.unregister_browser")
         self.driver._quit_driver(mock_chrome)
 
         mock_chrome.quit.assert_called_once()
         mock_stop_display.assert_called_once()
+        mock_unregister_browser.assert_called_once_with(mock_chrome, None)
+
+    def test_create_driver_registers_browser(self, mocker: MockerFixture) -> None:
+        mock_register_browser = mocker.patch("lib.webdriver.register_browser")
+        driver = self.driver._create_driver(None, "mlatest")
+        mock_register_browser.assert_called_once_with(driver, None)
+
+    def test_quit_driver_reports_load_stats(
+        self, mocker: MockerFixture, mock_chrome: mock.Mock
+    ) -> None:
+        mocker.patch.object(self.driver, "_stop_display")
+        mock_logger = mocker.patch("lib.webdriver.logger")
+        self.driver.load_profile = BrowserLoadProfile.LEAN
+        self.driver.bytes_downloaded = 2048
+        self.driver.time_to_ready = 1.5
+
+        self.driver._quit_driver(mock_chrome)
+
+        mock_logger.debug.assert_any_call(
+            "Browser session downloaded %.1f KB and was ready in %s (%s load profile)",
+            2.0,
+            "1.50s",
+            "lean",
+        )
+
+    def test_quit_driver_writes_phase_timings(
+        self, mocker: MockerFixture, mock_chrome: mock.Mock, phase_timings_directory: Path
+    ) -> None:
+        mocker.patch.object(self.driver, "_stop_display")
+        self.driver.phase_timer.operation = "refresh_headers"
+
+        self.driver._quit_driver(mock_chrome)
+
+        timings_file = phase_timings_directory / "phase_timings.jsonl"
+        record = json.loads(timings_file.read_text())
+        assert record["operation"] == "refresh_headers"
+        assert list(record["phases"]) == ["quit"]
+
+    def test_get_driver_times_driver_start_and_page_open(self) -> None:
+        self.driver._get_driver()
+        assert list(self.driver.phase_timer.phases) == ["driver_start", "page_open"]
+
+    def test_time_phase_samples_browser_memory(self, mocker: MockerFixture) -> None:
+        mocker.patch("lib.phase_timings.get_process_tree_memory", return_value=1024)
+        self.driver.driver = mock.Mock(browser_pid=10)
+
+        with self.driver._time_phase("test_phase"):
+            pass
+
+        assert "test_phase" in self.driver.phase_timer.phases
+        assert self.driver.phase_timer.peak_memory == 1024
+
+    def test_quit_driver_keeps_browser_running_with_a_session(self, mock_chrome: mock.Mock) -> None:
+        self.driver.session = mock.Mock()
+        self.driver._quit_driver(mock_chrome)
+
+        mock_chrome.quit.assert_not_called()
+        self.driver.session.release.assert_called_once()
+
+    def test_get_driver_reuses_browser_from_session(self, mocker: MockerFixture) -> None:
+        mock_start_browser = mocker.patch.object(WebDriver, "_start_browser")
+        self.driver.session = mock.Mock()
+
+        driver = self.driver._get_driver()
+
+        assert driver == self.driver.session.get_driver.return_value
+        self.driver.session.get_driver.assert_called_once_with(self.driver._start_browser)
+        driver.open.assert_called_once()
+        mock_start_browser.assert_not_called()
 
     # Make sure start_display handles the virtual display both being alive and not
     @pytest.mark.parametrize("is_alive", [True, False])
@@ -295,6 +689,18 @@ class TestWebDriver:
         self.driver._start_display()
         mock_display.assert_called_once()
 
+    def test_start_display_leases_display_for_browser_slot(self, mocker: MockerFixture) -> None:
+        mock_display = mocker.patch("lib.webdriver.Display")
+        mock_get_display_manager = mocker.patch("lib.webdriver.get_display_manager")
+        self.driver.browser_slot = 1
+
+        self.driver._start_display()
+
+        mock_get_display_manager.return_value.lease.assert_called_once_with(1)
+        mock_display.assert_not_called()
+        # The leased display must not be stopped when the browser quits
+        assert self.driver.display is None
+
     def test_start_display_ignores_error_when_display_fails_to_start(
         self, mocker: MockerFixture
     ) -> None: